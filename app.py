@@ -1,12 +1,22 @@
 import streamlit as st 
 import os
-import json
+import time
+import numpy as np
 import pandas as pd
 import subprocess
 from data_fetcher import fetch_and_save_financials
 from chart_display import display_chart 
 from ccaExcel import write_to_excel
 from dcfModel import dcf_data, run_dcf_model
+from units import BILLIONS
+from comps_store import peer_frame
+from universe import SORT_COLUMNS, load_universe, query_universe, universe_sectors
+from schema import PARTIAL, UNUSABLE, validate_ticker, describe
+from bulk_ingest import ingest, WRITTEN
+from model_graph import load_model, set_param, evaluate
+from quote_service import get_quote, refresh_quotes
+from snapshots import load_snapshot
+from valuation import TERMINAL_GROWTH
 
 
 # === Page Setup ===
@@ -47,31 +57,96 @@ def generate_missing_data(ticker):
             st.error(f"Error generating comparable analysis: {e}")
 
 
+# === View Selection ===
+def open_company(ticker):
+    """Drill-down from the universe table into the single-company overview."""
+    st.session_state["selected_ticker"] = ticker
+    st.session_state["view"] = "Company"
+
+view = st.sidebar.radio("View", ["Company", "Universe"], key="view")
+
+# === Universe View ===
+if view == "Universe":
+    st.title("Universe Screen")
+    universe = load_universe()
+
+    if universe.empty:
+        st.info("No batch results yet. Run `python batch.py` to value the universe.")
+        st.stop()
+
+    filter_col1, filter_col2, filter_col3 = st.columns([1.2, 2, 1])
+    search = filter_col1.text_input("Search Ticker or Name")
+    sectors = filter_col2.multiselect("Sector", universe_sectors(universe))
+    min_upside = filter_col3.number_input("Min DCF Upside (%)", value=-100.0, step=5.0)
+
+    sort_col1, sort_col2, sort_col3, sort_col4 = st.columns([1.5, 1, 1, 1])
+    sort_label = sort_col1.selectbox("Sort By", list(SORT_COLUMNS))
+    ascending = sort_col2.radio("Order", ["Descending", "Ascending"], horizontal=True) == "Ascending"
+    page_size = sort_col3.selectbox("Rows per Page", [25, 50, 100], index=1)
+    page = sort_col4.number_input("Page", min_value=1, value=1, step=1)
+
+    # Filtering, sorting and slicing happen here; only the visible page reaches the browser
+    page_frame, total, page_count = query_universe(
+        universe, search=search.strip(), sectors=sectors,
+        min_upside=min_upside / 100 if min_upside > -100 else None,
+        sort_by=SORT_COLUMNS[sort_label], ascending=ascending, page=int(page), page_size=page_size
+    )
+    st.caption(f"{total:,} of {len(universe):,} companies — page {min(int(page), page_count)} of {page_count}")
+
+    st.dataframe(
+        page_frame,
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            "price": st.column_config.NumberColumn("Price", format="$%.2f"),
+            "market_cap": st.column_config.NumberColumn("Market Cap", format="$%.0f"),
+            "wacc": st.column_config.NumberColumn("WACC", format="%.4f"),
+            "dcf_price": st.column_config.NumberColumn("DCF Price", format="$%.2f"),
+            "ev_ebitda_price": st.column_config.NumberColumn("EV/EBITDA Price", format="$%.2f"),
+            "pe_price": st.column_config.NumberColumn("P/E Price", format="$%.2f"),
+            "dcf_upside": st.column_config.NumberColumn("DCF Upside", format="%.4f"),
+        },
+    )
+
+    if not page_frame.empty:
+        drill_col, button_col = st.columns([2, 1])
+        drill_ticker = drill_col.selectbox("Company", page_frame["ticker"].tolist(), label_visibility="collapsed")
+        button_col.button("Open Company Overview", on_click=open_company, args=(drill_ticker,))
+    st.stop()
+
+
 # === Top Buttons ===
 _, spacer, button_col = st.columns([4.5, 2, 2.5])
 from dcfModel import run_dcf_model  # make sure this import is at the top of your app.py
 
 with button_col:
     selected_action = st.selectbox("Select Analysis", ["Discounted Cash Flow Analysis", "Comparable Company Analysis"])
+    selected_period = "ttm" if st.radio("Financials Basis", ["Annual", "TTM"], horizontal=True) == "TTM" else "annual"
     
     if st.button("Run Analysis"):
         selected_ticker = st.session_state.get("selected_ticker")
 
+        validation = validate_ticker(selected_ticker, DATA_FOLDER) if selected_ticker else None
+
         if not selected_ticker:
             st.warning("Please fetch or upload a company's financials first.")
+        elif validation["status"] == UNUSABLE:
+            st.error(f"Cannot run analysis: {describe(validation)}")
         else:
+            if validation["status"] == PARTIAL:
+                st.warning(describe(validation))
             try:
                 if selected_action == "Discounted Cash Flow Analysis":
-                    dcf_data(selected_ticker)
+                    dcf_data(selected_ticker, period=selected_period)
                     st.success(f"DCF analysis completed. Log saved in log data/{selected_ticker}_calculation_data.txt")
-                    run_dcf_model(selected_ticker)
+                    run_dcf_model(selected_ticker, period=selected_period)
                     try:
-                        run_dcf_model(selected_ticker)
+                        run_dcf_model(selected_ticker, period=selected_period)
                         st.success(f"Excel updated with DCF results for {selected_ticker}")
                     except Exception as e:
                         st.error(f"Failed to run DCF analysis: {e}")
                 elif selected_action == "Comparable Company Analysis":
-                    write_to_excel(selected_ticker)
+                    write_to_excel(selected_ticker, period=selected_period)
                     st.success(f"CCA Excel updated for {selected_ticker}")
             except Exception as e:
                 st.error(f"Failed to run analysis: {e}")
@@ -111,29 +186,30 @@ with col1:
 # Upload JSON
 with col2:
     st.subheader("Upload Financials")
-    uploaded_file = st.file_uploader("Upload a financials JSON file", type="json", label_visibility="collapsed")
+    uploaded_files = st.file_uploader("Upload financials JSON files or a zip of them", type=["json", "zip"],
+                                      accept_multiple_files=True, label_visibility="collapsed")
 
-    if uploaded_file is not None:
+    if uploaded_files and st.button("Save Uploaded Financials"):
         try:
-            uploaded_data = json.load(uploaded_file)
-            required_keys = ["balance_sheet", "income_statement", "cash_flow", "overview", "quote"]
-
-            if all(key in uploaded_data for key in required_keys):
-                with st.form("upload_form", clear_on_submit=True):
-                    uploaded_ticker = st.text_input("Enter ticker for uploaded file").upper()
-                    submitted = st.form_submit_button("Save Uploaded Financials")
-                    if submitted and uploaded_ticker:
-                        save_path = os.path.join(DATA_FOLDER, f"{uploaded_ticker}_financials.json")
-                        with open(save_path, "w", encoding="utf-8") as f:
-                            json.dump(uploaded_data, f, indent=4)
-                        st.success(f"Uploaded data saved as {uploaded_ticker}_financials.json")
-                        st.session_state["selected_ticker"] = uploaded_ticker
-                        selected_ticker = uploaded_ticker
-                        generate_missing_data(uploaded_ticker)
-            else:
-                st.error("Uploaded file missing required keys.")
+            # Tickers come from each payload's overview.Symbol (or the file name)
+            with st.spinner(f"Ingesting {len(uploaded_files)} upload(s)..."):
+                results = ingest(uploaded_files, data_folder=DATA_FOLDER)
+            written = [r for r in results if r["status"] in WRITTEN]
+
+            if written:
+                st.success(f"Saved {len(written)} of {len(results)} files to {DATA_FOLDER}/")
+            if len(written) < len(results):
+                st.warning(f"{len(results) - len(written)} file(s) were not saved; see the status table.")
+            if len(results) > 1 or not written:
+                st.dataframe(pd.DataFrame(results)[["file", "ticker", "status", "message"]],
+                             use_container_width=True, hide_index=True)
+            if len(written) == 1:
+                uploaded_ticker = written[0]["ticker"]
+                st.session_state["selected_ticker"] = uploaded_ticker
+                selected_ticker = uploaded_ticker
+                generate_missing_data(uploaded_ticker)
         except Exception as e:
-            st.error(f"Error processing uploaded file: {e}")
+            st.error(f"Error processing uploaded files: {e}")
 
 
 # === Display Company Snapshot ===
@@ -146,59 +222,50 @@ if selected_ticker:
 
     if os.path.exists(json_path):
         try:
-            with open(json_path) as f:
-                financials = json.load(f)
-
-            overview = financials.get("overview", {})
-            quote = financials.get("quote", {}).get("Global Quote", {})
-
-            name = overview.get("Name", "N/A")
-            exchange = overview.get("Exchange", "N/A")
-            sector = overview.get("Sector", "N/A")
-
-            symbol = quote.get("01. symbol", "N/A")
-            open_price = quote.get("02. open", "N/A")
-            high = quote.get("03. high", "N/A")
-            low = quote.get("04. low", "N/A")
-            current_price = quote.get("05. price", "N/A")
-            volume = quote.get("06. volume", "N/A")
-            trading_day = quote.get("07. latest trading day", "N/A")
-            prev_close = quote.get("08. previous close", "N/A")
-            change = quote.get("09. change", "N/A")
-            change_percent = quote.get("10. change percent", "N/A")
-
-            income = financials.get("income_statement", {}).get("annualReports", [{}])[0]
-            balance = financials.get("balance_sheet", {}).get("annualReports", [{}])[0]
-
-            revenue = income.get("totalRevenue", "N/A")
-            net_income = income.get("netIncome", "N/A")
-            shares = balance.get("commonStockSharesOutstanding", "N/A")
+            # One precomputed row (snapshots.py) instead of parsing the financials file
+            snapshot = load_snapshot(selected_ticker, DATA_FOLDER)
+            # A quote refreshed since the statements were fetched (quote_service.py) replaces the saved one
+            live_quote = get_quote(selected_ticker, DATA_FOLDER)
+            if live_quote is not None and live_quote["fetched_at"] <= snapshot["source_mtime"]:
+                live_quote = None   # the statements (and their quote) are newer
+            if live_quote is not None:
+                snapshot = {**snapshot, **{k: v for k, v in live_quote.items() if k in snapshot and v == v}}
+
+            def shown(field, template="{:,.2f}"):
+                value = snapshot.get(field)
+                return "N/A" if value is None or value != value else template.format(value)
 
             # === Company Header and Chart Side-by-Side ===
             col_header, col_chart = st.columns([1, 1])
 
             with col_header:
-                st.subheader(name)
-                st.markdown(f"**Exchange:** {exchange} &nbsp;&nbsp; **Sector:** {sector} &nbsp;&nbsp; **Symbol:** {symbol}")
-                st.metric("Trading Date", trading_day)
+                st.subheader(shown("name", "{}"))
+                st.markdown(f"**Exchange:** {shown('exchange', '{}')} &nbsp;&nbsp; **Sector:** {shown('sector', '{}')} "
+                            f"&nbsp;&nbsp; **Symbol:** {selected_ticker}")
+                st.metric("Trading Date", shown("trading_day", "{}"))
 
                 col1, col2, col3 = st.columns(3)
-                col1.metric("Price", f"${float(current_price):,.2f}" if current_price != "N/A" else "N/A")
-                col2.metric("Previous Close", f"${float(prev_close):,.2f}" if prev_close != "N/A" else "N/A")
-                col3.metric("Change (%)", f"{change} ({change_percent})" if change != "N/A" else "N/A")
+                col1.metric("Price", shown("price", "${:,.2f}"))
+                col2.metric("Previous Close", shown("previous_close", "${:,.2f}"))
+                col3.metric("Change (%)", f"{shown('change', '{:+,.2f}')} ({shown('change_percent', '{:+.2f}%')})"
+                            if shown("change") != "N/A" else "N/A")
 
                 col4, col5, col6 = st.columns(3)
-                col4.metric("Open", f"${float(open_price):,.2f}" if open_price != "N/A" else "N/A")
-                col5.metric("High", f"${float(high):,.2f}" if high != "N/A" else "N/A")
-                col6.metric("Low", f"${float(low):,.2f}" if low != "N/A" else "N/A")
+                col4.metric("Open", shown("open", "${:,.2f}"))
+                col5.metric("High", shown("high", "${:,.2f}"))
+                col6.metric("Low", shown("low", "${:,.2f}"))
 
                 col7, col8, col9 = st.columns(3)
-                col7.metric("Volume", f"{int(volume):,}" if volume != "N/A" else "N/A")
-                col8.metric("Revenue (Latest)", f"${int(revenue):,}" if revenue != "N/A" else "N/A")
-                col9.metric("Net Income (Latest)", f"${int(net_income):,}" if net_income != "N/A" else "N/A")
+                col7.metric("Volume", shown("volume", "{:,.0f}"))
+                col8.metric("Revenue (Latest)", shown("revenue", "${:,.0f}"))
+                col9.metric("Net Income (Latest)", shown("net_income", "${:,.0f}"))
 
-                col10, _, _ = st.columns([1, 0.5, 1])
-                col10.metric("Shares Outstanding", f"{int(shares):,}" if shares != "N/A" else "N/A")
+                col10, _, col11 = st.columns([1, 0.5, 1])
+                col10.metric("Shares Outstanding", shown("shares_outstanding", "{:,.0f}"))
+                col11.button("Refresh Quote", on_click=refresh_quotes, args=([selected_ticker], DATA_FOLDER, 0))
+                if live_quote is not None:
+                    age_minutes = (time.time() - live_quote["fetched_at"]) / 60
+                    col11.caption(f"Quote from {live_quote['source']}, {age_minutes:,.0f} min ago")
 
             with col_chart:
                 display_chart(selected_ticker)
@@ -208,58 +275,112 @@ if selected_ticker:
             st.error(f"Error displaying overview: {e}")
 
 
+# === What-If DCF ===
+def what_if_model(ticker):
+    """The ticker's model graph, built once per session (and again only if its files change)."""
+    paths = [os.path.join(DATA_FOLDER, f"{ticker}_{kind}.json") for kind in ("financials", "comparable_analysis")]
+    stamp = tuple(os.stat(p).st_mtime_ns if os.path.exists(p) else None for p in paths)
+    cached = st.session_state.get("what_if")
+    if cached is None or cached["ticker"] != ticker or cached["stamp"] != stamp:
+        cached = {"ticker": ticker, "stamp": stamp, "model": load_model(ticker, DATA_FOLDER)}
+        st.session_state["what_if"] = cached
+    return cached["model"]
+
+
+if selected_ticker and os.path.exists(os.path.join(DATA_FOLDER, f"{selected_ticker}_financials.json")):
+    st.markdown("---")
+    st.markdown("## What-If DCF", unsafe_allow_html=True)
+    st.caption("Moving a slider recomputes only the parts of the model downstream of it; no files or Excel are touched.")
+
+    try:
+        model = what_if_model(selected_ticker)
+        historical = evaluate(model, "historical")
+        base_premium = evaluate(model, "size_premium_rate")
+
+        def default_pct(value, low, high):
+            """Slider start in %, clipped to the slider range (sliders reject out-of-range values)."""
+            return float(np.clip(round(float(value) * 100, 1), low, high)) if np.isfinite(value) else 0.0
+
+        col_growth, col_margin, col_terminal, col_premium = st.columns(4)
+        growth = col_growth.slider("Revenue Growth (%)", -20.0, 40.0, default_pct(historical["revenue_growth"], -20.0, 40.0), 0.1,
+                                   key=f"what_if_growth_{selected_ticker}")
+        margin = col_margin.slider("EBIT Margin (%)", -50.0, 60.0, default_pct(historical["ebit_margin"], -50.0, 60.0), 0.1,
+                                   key=f"what_if_margin_{selected_ticker}")
+        terminal = col_terminal.slider("Terminal Growth (%)", 0.0, 5.0, default_pct(TERMINAL_GROWTH, 0.0, 5.0), 0.1,
+                                       key=f"what_if_terminal_{selected_ticker}")
+        premium = col_premium.slider("Size Premium (%)", 0.0, 6.0, default_pct(base_premium, 0.0, 6.0), 0.05,
+                                     key=f"what_if_premium_{selected_ticker}")
+
+        set_param(model, "revenue_growth", growth / 100)
+        set_param(model, "ebit_margin", margin / 100)
+        set_param(model, "terminal_growth", terminal / 100)
+        set_param(model, "size_premium", premium / 100)
+
+        started = time.perf_counter()
+        value = evaluate(model)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        recomputed = model["recomputed"]
+        wacc_result = evaluate(model, "wacc")
+
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("WACC", f"{wacc_result['wacc']:.2%}")
+        col2.metric("Enterprise Value", f"${value['enterprise_value'] / BILLIONS:,.2f}B")
+        col3.metric("Price per Share", f"${value['price_per_share']:,.2f}")
+        col4.metric("Upside", f"{value['upside']:+.1%}" if np.isfinite(value["upside"]) else "N/A")
+        st.caption(f"Recomputed {', '.join(recomputed) or 'nothing'} in {elapsed_ms:.2f} ms")
+
+    except Exception as e:
+        st.error(f"Error building what-if model: {e}")
+
+
 # === Comparable Companies Overview ===
 st.markdown("---")
 st.markdown("## Comparable Company Overview", unsafe_allow_html=True)
 st.markdown("<div style='margin-top: 55px;'></div>", unsafe_allow_html=True)
 
-comp_path = os.path.join(DATA_FOLDER, f"{selected_ticker}_comparable_analysis.json")
-
-if os.path.exists(comp_path):
+# Peers come from the shared, memory-mapped comps store (one copy per process, not per session)
+if selected_ticker:
     try:
-        with open(comp_path, "r") as f:
-            comparable_data = json.load(f)
+        peer_metrics = peer_frame(selected_ticker, DATA_FOLDER)
 
-        peers = comparable_data.get("peers", {})
-        if not peers:
-            st.warning("No peer data found in comparable analysis file.")
+        if peer_metrics.empty:
+            if os.path.exists(os.path.join(DATA_FOLDER, f"{selected_ticker}_comparable_analysis.json")):
+                st.warning("No peer data found in comparable analysis file.")
         else:
-            for peer_symbol, peer_info in peers.items():
+            # Convert all peer metrics to display units ($B) in one pass
+            peer_metrics = peer_metrics.fillna({"price": 0, "market_cap": 0, "enterprise_value": 0,
+                                                "sales": 0, "ebitda": 0, "earnings": 0})
+            money_columns = ["market_cap", "enterprise_value", "sales", "ebitda", "earnings"]
+            peer_metrics[money_columns] = peer_metrics[money_columns] / BILLIONS
+
+            for peer_symbol, metrics in peer_metrics.iterrows():
                 col1, spacer, col2 = st.columns([1.6, 0.3, 3.8])
 
                 with col1:
-                    overview = peer_info.get("overview", {})
-                    company_name = overview.get("companyName", peer_symbol)
-                    image_url = overview.get("image", "")
-                    info_symbol = peer_symbol
-                    info_sector = overview.get("sector", "N/A")
-                    info_industry = overview.get("industry", "N/A")
-
                     html_block = f"""
                         <div style="text-align: center; margin-bottom: 10px;">
-                            <img src="{image_url}" style="width: 80px; margin-bottom: 10px;" />
-                            <h4 style="margin-bottom: 5px;">{company_name}</h4>
+                            <img src="{metrics['image']}" style="width: 80px; margin-bottom: 10px;" />
+                            <h4 style="margin-bottom: 5px;">{metrics['name']}</h4>
                         </div>
                         <div style="display: flex; justify-content: center; gap: 40px;">
-                            <div><strong>Symbol:</strong> {info_symbol}</div>
-                            <div><strong>Sector:</strong> {info_sector}</div>
-                            <div><strong>Industry:</strong> {info_industry}</div>
+                            <div><strong>Symbol:</strong> {peer_symbol}</div>
+                            <div><strong>Sector:</strong> {metrics['sector']}</div>
+                            <div><strong>Industry:</strong> {metrics['industry']}</div>
                         </div>
                     """
                     st.markdown(html_block, unsafe_allow_html=True)
 
                 with col2:
-                    metrics = peer_info.get("financial_metrics", {})
                     colA, colB, colC = st.columns(3)
 
-                    colA.metric("Price per Share", f"${metrics.get('Price ($/share)', 0):,.2f}")
-                    colB.metric("Market Cap", f"${metrics.get('Market Cap ($M)', 0)/1e9:,.2f}B")
-                    colC.metric("EV", f"${metrics.get('Enterprise Value ($M)', 0)/1e9:,.2f}B")
+                    colA.metric("Price per Share", f"${metrics['price']:,.2f}")
+                    colB.metric("Market Cap", f"${metrics['market_cap']:,.2f}B")
+                    colC.metric("EV", f"${metrics['enterprise_value']:,.2f}B")
 
                     colD, colE, colF = st.columns(3)
-                    colD.metric("Revenue", f"${metrics.get('Sales ($M)', 0)/1e9:,.2f}B")
-                    colE.metric("EBITDA", f"${metrics.get('EBITDA ($M)', 0)/1e9:,.2f}B")
-                    colF.metric("Net Income", f"${metrics.get('Earnings ($M)', 0)/1e9:,.2f}B")
+                    colD.metric("Revenue", f"${metrics['sales']:,.2f}B")
+                    colE.metric("EBITDA", f"${metrics['ebitda']:,.2f}B")
+                    colF.metric("Net Income", f"${metrics['earnings']:,.2f}B")
 
                 st.markdown("<div style='margin-bottom: 40px;'></div>", unsafe_allow_html=True)
                 st.markdown("---")
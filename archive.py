@@ -0,0 +1,332 @@
+import os
+import re
+import sys
+import json
+import zlib
+import sqlite3
+import datetime
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+try:
+    import zstandard as zstd
+except ImportError:  # optional; zlib with a preset dictionary is used instead
+    zstd = None
+
+DATA_FOLDER = "data"
+ENDPOINTS = ("financials", "chart", "comparable_analysis")    # data/{TICKER}_{endpoint}.json
+CODEC = "zstd" if zstd is not None else "zlib"
+DICT_SIZE = 32 * 1024            # zlib caps preset dictionaries at 32 KB
+ZSTD_LEVEL = 19
+ZLIB_LEVEL = 9
+FAST_LEVELS = {"zstd": 9, "zlib": 6}    # bulk writes: ~5× faster for rows ~10% larger
+MAX_SAMPLES = 5000               # records used to train a dictionary
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dictionaries (
+    dict_id INTEGER PRIMARY KEY,
+    endpoint TEXT NOT NULL,
+    codec TEXT NOT NULL,
+    data BLOB NOT NULL,
+    created TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS payloads (
+    ticker TEXT NOT NULL,
+    endpoint TEXT NOT NULL,
+    fetch_date TEXT NOT NULL,
+    codec TEXT NOT NULL,
+    dict_id INTEGER,
+    raw_size INTEGER NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS payload_key ON payloads (ticker, endpoint, fetch_date);
+"""
+
+# (archive path, dict_id) → dictionary bytes; dictionaries never change once written
+_dictionaries = {}
+_dictionary_lock = threading.Lock()
+
+
+def archive_path(data_folder=DATA_FOLDER):
+    return os.path.join(data_folder, "archive", "payloads.sqlite")
+
+
+@contextmanager
+def _connect(data_folder):
+    """One transaction on the archive; committed on success and always closed."""
+    path = archive_path(data_folder)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    connection = sqlite3.connect(path, timeout=30)
+    try:
+        connection.execute("PRAGMA journal_mode=WAL")   # readers do not block the writer
+        connection.executescript(SCHEMA)
+        with connection:
+            yield connection
+    finally:
+        connection.close()
+
+
+def _encode(payload):
+    return json.dumps(payload, separators=(",", ":")).encode("utf-8")
+
+
+# === Codecs ===
+def _compress(raw, codec, dictionary, level=None):
+    if codec == "zstd":
+        if zstd is None:
+            raise RuntimeError("zstandard is not installed")
+        dict_data = zstd.ZstdCompressionDict(dictionary) if dictionary else None
+        return zstd.ZstdCompressor(level=level or ZSTD_LEVEL, dict_data=dict_data).compress(raw)
+    level = level or ZLIB_LEVEL
+    compressor = zlib.compressobj(level, zdict=dictionary) if dictionary else zlib.compressobj(level)
+    return compressor.compress(raw) + compressor.flush()
+
+
+def _decompress(blob, codec, dictionary):
+    if codec == "zstd":
+        if zstd is None:
+            raise RuntimeError("zstandard is not installed; cannot read zstd-compressed payloads")
+        dict_data = zstd.ZstdCompressionDict(dictionary) if dictionary else None
+        return zstd.ZstdDecompressor(dict_data=dict_data).decompress(blob)
+    decompressor = zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+    return decompressor.decompress(blob) + decompressor.flush()
+
+
+# === Dictionaries ===
+def _sample_records(value, depth=0):
+    """
+    The repeated units of a payload: one statement report, one OHLC bar, one peer
+    overview. Their shared keys are what a dictionary captures.
+    """
+    if isinstance(value, dict):
+        if depth >= 3 or all(not isinstance(v, (dict, list)) for v in value.values()):
+            yield value
+            return
+        for v in value.values():
+            yield from _sample_records(v, depth + 1)
+    elif isinstance(value, list):
+        for v in value:
+            yield from _sample_records(v, depth + 1)
+
+
+def build_dictionary(payloads, codec=CODEC):
+    """
+    Trains a compression dictionary from sample payloads of one endpoint.
+
+    zstd: trained with zstandard.train_dictionary over the payloads' records.
+    zlib: one example record per record shape, most common shapes last (zlib matches
+    nearest data best), truncated to the 32 KB preset-dictionary limit.
+    """
+    records = [r for payload in payloads for r in _sample_records(payload)][:MAX_SAMPLES]
+    samples = [_encode(r) for r in records]
+    if not samples:
+        return b""
+    if codec == "zstd":
+        try:
+            return zstd.train_dictionary(DICT_SIZE, samples).as_bytes()
+        except zstd.ZstdError:
+            pass  # too few samples to train; fall back to a raw-content dictionary
+
+    shapes = Counter(tuple(r) if isinstance(r, dict) else () for r in records)
+    examples = {}
+    for record, sample in zip(records, samples):
+        examples.setdefault(tuple(record) if isinstance(record, dict) else (), sample)
+    ordered = sorted(shapes, key=lambda shape: shapes[shape])
+    return b"".join(examples[shape] for shape in ordered)[-DICT_SIZE:]
+
+
+def train_dictionary(endpoint, payloads=None, data_folder=DATA_FOLDER):
+    """
+    Stores a new dictionary for `endpoint`, trained on `payloads` or, by default, on
+    the latest archived payload of every ticker. New writes use the newest dictionary;
+    existing rows keep the one they were written with.
+    """
+    if payloads is None:
+        payloads = [load_payload(row["ticker"], endpoint, data_folder=data_folder)
+                    for row in list_payloads(endpoint=endpoint, latest=True, data_folder=data_folder)]
+    dictionary = build_dictionary(payloads)
+    if not dictionary:
+        return None
+    with _connect(data_folder) as connection:
+        cursor = connection.execute(
+            "INSERT INTO dictionaries (endpoint, codec, data, created) VALUES (?, ?, ?, ?)",
+            (endpoint, CODEC, dictionary, datetime.datetime.now().isoformat(timespec="seconds")))
+        return cursor.lastrowid
+
+
+def _latest_dictionary(connection, endpoint):
+    row = connection.execute("SELECT dict_id, data FROM dictionaries WHERE endpoint = ? AND codec = ? "
+                             "ORDER BY dict_id DESC LIMIT 1", (endpoint, CODEC)).fetchone()
+    return (row[0], row[1]) if row else (None, None)
+
+
+def latest_dictionary(endpoint, data_folder=DATA_FOLDER):
+    """(dict_id, dictionary bytes) new writes for `endpoint` use, or (None, None)."""
+    with _connect(data_folder) as connection:
+        return _latest_dictionary(connection, endpoint)
+
+
+def _dictionary(connection, data_folder, dict_id):
+    if dict_id is None:
+        return None
+    key = (archive_path(data_folder), dict_id)
+    with _dictionary_lock:
+        if key not in _dictionaries:
+            _dictionaries[key] = connection.execute("SELECT data FROM dictionaries WHERE dict_id = ?",
+                                                    (dict_id,)).fetchone()[0]
+        return _dictionaries[key]
+
+
+# === Write / read ===
+def compress_payload(payload, dict_id=None, dictionary=None, fast=False):
+    """
+    (codec, dict_id, raw_size, blob) for one payload. Pure CPU work with no archive
+    access, so callers can compress in worker processes and store rows in batches.
+    `fast` uses FAST_LEVELS instead of the maximum compression level.
+    """
+    raw = _encode(payload)
+    return CODEC, dict_id, len(raw), _compress(raw, CODEC, dictionary, FAST_LEVELS[CODEC] if fast else None)
+
+
+def store_compressed(rows, data_folder=DATA_FOLDER):
+    """
+    Stores many compress_payload() results in one transaction.
+    `rows` are (ticker, endpoint, fetch_date, codec, dict_id, raw_size, blob) tuples.
+    """
+    rows = [(ticker.upper(), *rest) for ticker, *rest in rows]
+    with _connect(data_folder) as connection:
+        connection.executemany(
+            "INSERT OR REPLACE INTO payloads (ticker, endpoint, fetch_date, codec, dict_id, raw_size, data) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+    return len(rows)
+
+
+def archive_payload(ticker, endpoint, payload, fetch_date=None, data_folder=DATA_FOLDER):
+    """
+    Compresses one payload into the archive under (ticker, endpoint, fetch_date).
+    A second archive on the same date replaces the first.
+
+    Parameters:
+    - ticker: Ticker symbol
+    - endpoint: One of ENDPOINTS (or any provider endpoint name)
+    - payload: The decoded JSON payload
+    - fetch_date: 'YYYY-MM-DD' (defaults to today)
+    """
+    fetch_date = fetch_date or datetime.date.today().isoformat()
+    dict_id, dictionary = latest_dictionary(endpoint, data_folder)
+    store_compressed([(ticker, endpoint, fetch_date, *compress_payload(payload, dict_id, dictionary))], data_folder)
+    return fetch_date
+
+
+def load_payload(ticker, endpoint, fetch_date=None, data_folder=DATA_FOLDER):
+    """
+    The payload archived for (ticker, endpoint) on or before `fetch_date` (latest if None),
+    or None. Only that one row is read and decompressed.
+    """
+    query = "SELECT codec, dict_id, data FROM payloads WHERE ticker = ? AND endpoint = ?"
+    params = [ticker.upper(), endpoint]
+    if fetch_date:
+        query += " AND fetch_date <= ?"
+        params.append(fetch_date)
+    query += " ORDER BY fetch_date DESC LIMIT 1"
+
+    with _connect(data_folder) as connection:
+        row = connection.execute(query, params).fetchone()
+        if row is None:
+            return None
+        codec, dict_id, blob = row
+        dictionary = _dictionary(connection, data_folder, dict_id)
+    return json.loads(_decompress(blob, codec, dictionary))
+
+
+def list_payloads(ticker=None, endpoint=None, latest=False, data_folder=DATA_FOLDER):
+    """Index rows (ticker, endpoint, fetch_date, codec, raw_size, stored_size); no payload is read."""
+    query = ("SELECT ticker, endpoint, MAX(fetch_date) AS fetch_date, codec, raw_size, length(data) FROM payloads"
+             if latest else
+             "SELECT ticker, endpoint, fetch_date, codec, raw_size, length(data) FROM payloads")
+    clauses, params = [], []
+    if ticker:
+        clauses.append("ticker = ?")
+        params.append(ticker.upper())
+    if endpoint:
+        clauses.append("endpoint = ?")
+        params.append(endpoint)
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    query += " GROUP BY ticker, endpoint" if latest else ""
+    query += " ORDER BY ticker, endpoint, fetch_date"
+
+    with _connect(data_folder) as connection:
+        rows = connection.execute(query, params).fetchall()
+    columns = ["ticker", "endpoint", "fetch_date", "codec", "raw_size", "stored_size"]
+    return [dict(zip(columns, row)) for row in rows]
+
+
+# === Import existing data files ===
+def import_data_folder(data_folder=DATA_FOLDER, train=True):
+    """
+    Archives every data/{TICKER}_{endpoint}.json under its file date. With `train`, a
+    dictionary is first trained per endpoint that does not have one yet.
+    Returns the number of payloads archived.
+    """
+    pattern = re.compile(rf"^(.+)_({'|'.join(ENDPOINTS)})\.json$")
+    files = {}
+    for name in sorted(os.listdir(data_folder)):
+        match = pattern.match(name)
+        if match:
+            files.setdefault(match.group(2), []).append((match.group(1), os.path.join(data_folder, name)))
+
+    count = 0
+    for endpoint, entries in files.items():
+        payloads = []
+        for ticker, path in entries:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    payloads.append((ticker, path, json.load(f)))
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Skipping {path}: {e}")
+
+        if train:
+            with _connect(data_folder) as connection:
+                has_dictionary = _latest_dictionary(connection, endpoint)[0] is not None
+            if not has_dictionary:
+                train_dictionary(endpoint, [payload for _, _, payload in payloads], data_folder)
+
+        for ticker, path, payload in payloads:
+            fetch_date = datetime.date.fromtimestamp(os.stat(path).st_mtime).isoformat()
+            archive_payload(ticker, endpoint, payload, fetch_date, data_folder)
+            count += 1
+    return count
+
+
+def archive_stats(data_folder=DATA_FOLDER):
+    """Payload count, raw (compact JSON) bytes and stored bytes per endpoint."""
+    with _connect(data_folder) as connection:
+        rows = connection.execute("SELECT endpoint, COUNT(*), SUM(raw_size), SUM(length(data)) "
+                                  "FROM payloads GROUP BY endpoint ORDER BY endpoint").fetchall()
+    return [{"endpoint": e, "payloads": n, "raw_bytes": raw, "stored_bytes": stored} for e, n, raw, stored in rows]
+
+
+# === Entry point when script is called directly ===
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    if command == "import":
+        print(f"✅ Archived {import_data_folder()} payloads to {archive_path()} ({CODEC})")
+    elif command == "train" and len(sys.argv) > 2:
+        dict_id = train_dictionary(sys.argv[2])
+        print(f"✅ Trained dictionary {dict_id} for {sys.argv[2]}" if dict_id else "⚠️ Nothing archived to train on.")
+    elif command == "get" and len(sys.argv) > 3:
+        payload = load_payload(sys.argv[2], sys.argv[3], sys.argv[4] if len(sys.argv) > 4 else None)
+        if payload is None:
+            print("❌ Not archived.")
+            sys.exit(1)
+        print(json.dumps(payload, indent=4))
+    elif command == "stats":
+        for row in archive_stats():
+            ratio = row["raw_bytes"] / row["stored_bytes"] if row["stored_bytes"] else 0
+            print(f"{row['endpoint']:<22} {row['payloads']:>6} payloads  {row['raw_bytes'] / 1024:>10,.0f} KB raw  "
+                  f"{row['stored_bytes'] / 1024:>8,.0f} KB stored  ({ratio:.1f}x)")
+    else:
+        print("Usage: python archive.py [import | train ENDPOINT | get TICKER ENDPOINT [YYYY-MM-DD] | stats]")
+        sys.exit(1)
@@ -0,0 +1,86 @@
+import os
+import re
+import sys
+import json
+import datetime
+import numpy as np
+from units import PERCENT
+
+# One JSON file per assumptions version, named by the date it takes effect (YYYY-MM-DD.json)
+ASSUMPTIONS_FOLDER = "assumptions"
+_VERSION_FILE = re.compile(r"^(\d{4}-\d{2}-\d{2})\.json$")
+
+# path → {"mtime", "assumptions"}; each version is parsed once per process
+_assumptions_cache = {}
+
+
+def assumption_versions(folder=ASSUMPTIONS_FOLDER):
+    """Available versions (effective dates), oldest first."""
+    if not os.path.isdir(folder):
+        return []
+    return sorted(m.group(1) for m in map(_VERSION_FILE.match, os.listdir(folder)) if m)
+
+
+def load_assumptions(as_of=None, folder=ASSUMPTIONS_FOLDER):
+    """
+    Market assumptions in effect on `as_of` (a date or 'YYYY-MM-DD'; latest if None):
+    the newest version dated on or before it, or the oldest one for earlier dates.
+
+    Returns a dict with version, risk_free_rate, equity_risk_premium, marginal_tax_rate
+    (fractions) and the size-premium table as arrays: size_floor (ascending market cap
+    floors, $) and size_premium (fractions).
+    """
+    versions = assumption_versions(folder)
+    if not versions:
+        raise FileNotFoundError(f"No assumption files (YYYY-MM-DD.json) in {folder}/")
+    version = versions[-1]
+    if as_of is not None:
+        as_of = str(as_of)[:10]
+        eligible = [v for v in versions if v <= as_of]
+        version = eligible[-1] if eligible else versions[0]
+
+    path = os.path.join(folder, f"{version}.json")
+    mtime = os.stat(path).st_mtime_ns
+    cached = _assumptions_cache.get(path)
+    if cached is not None and cached["mtime"] == mtime:
+        return cached["assumptions"]
+
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    floors = np.asarray(raw["size_premium"]["market_cap_floor"], dtype=float)
+    premiums = np.asarray(raw["size_premium"]["premium_pct"], dtype=float) * PERCENT
+    order = np.argsort(floors, kind="stable")
+    assumptions = {
+        "version": version,
+        "risk_free_rate": float(raw["risk_free_rate"]),
+        "equity_risk_premium": float(raw["equity_risk_premium"]),
+        "marginal_tax_rate": float(raw["marginal_tax_rate"]),
+        "size_floor": floors[order],
+        "size_premium": premiums[order],
+    }
+    _assumptions_cache[path] = {"mtime": mtime, "assumptions": assumptions}
+    return assumptions
+
+
+def size_premium(market_caps, assumptions=None):
+    """
+    Size premium (fraction) for any number of market caps in one searchsorted over the
+    bracket floors: a cap falls in the bracket with the highest floor ≤ cap.
+    Missing, negative or below-table caps get 0.
+    """
+    assumptions = assumptions or load_assumptions()
+    caps = np.asarray(market_caps, dtype=float)
+    bracket = np.searchsorted(assumptions["size_floor"], caps, side="right") - 1
+    valid = ~np.isnan(caps) & (bracket >= 0)
+    return np.where(valid, assumptions["size_premium"][np.clip(bracket, 0, None)], 0.0)
+
+
+# === Entry point when script is called directly ===
+if __name__ == "__main__":
+    as_of = sys.argv[1] if len(sys.argv) > 1 else datetime.date.today().isoformat()
+    table = load_assumptions(as_of)
+    print(f"📅 Assumptions {table['version']} (as of {as_of})")
+    print(f"Risk-free rate: {table['risk_free_rate']:.2%}   ERP: {table['equity_risk_premium']:.2%}   "
+          f"Marginal tax rate: {table['marginal_tax_rate']:.2%}")
+    for floor, premium in zip(table["size_floor"], table["size_premium"]):
+        print(f"  Market cap ≥ ${floor:>17,.0f} → size premium {premium:.2%}")
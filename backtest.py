@@ -0,0 +1,306 @@
+import os
+import sys
+import json
+import pickle
+import hashlib
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from units import comps_metrics_frame, to_float_array
+from valuation import extract_dcf_inputs, stack_inputs, dcf_value, multiples_value
+
+DATA_FOLDER = "data"
+CACHE_FOLDER = os.path.join(DATA_FOLDER, "cache", "backtest")
+
+# Alpha Vantage does not return filing dates, so a filing is treated as public a fixed
+# number of days after fiscal year end (10-K deadline for large accelerated filers).
+FILING_LAG_DAYS = 90
+HORIZONS = {"1m": 21, "3m": 63, "6m": 126, "12m": 252}  # trading days
+SPLIT_TOLERANCE = 0.1    # share-count jumps within 10% of a whole ratio (2:1, 20:1, 1:10) are read as splits
+CACHE_VERSION = 2        # bump when a stage's output changes meaning; older cache files are ignored
+
+DEFAULT_PARAMS = {
+    "wacc": 0.09,
+    "terminal_growth": 0.02,
+    "frequency": "QE",
+    "filing_lag_days": FILING_LAG_DAYS,
+}
+
+
+# === Stage cache ===
+def _digest(*parts):
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def _file_fingerprint(path):
+    stat = os.stat(path)
+    return [os.path.basename(path), stat.st_size, stat.st_mtime_ns]
+
+
+def _cached(stage, key, compute):
+    """
+    Returns the stored result of `stage` for `key`, computing and storing it on a miss.
+    Keys fold in the inputs of every upstream stage, so a parameter change only
+    invalidates the stages that depend on it.
+    """
+    os.makedirs(CACHE_FOLDER, exist_ok=True)
+    path = os.path.join(CACHE_FOLDER, f"{stage}_v{CACHE_VERSION}_{key}.pkl")
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    result = compute()
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(result, f)
+    os.replace(tmp_path, path)
+    return result
+
+
+# === Inputs ===
+def load_prices(ticker, data_folder=DATA_FOLDER):
+    """Daily closes from {ticker}_chart.json as (datetime64[D] dates, float closes)."""
+    with open(os.path.join(data_folder, f"{ticker}_chart.json"), "r") as f:
+        bars = json.load(f)
+    dates = np.array([bar["Date"] for bar in bars], dtype="datetime64[D]")
+    closes = np.array([bar["Close"] for bar in bars], dtype=float)
+    order = np.argsort(dates)
+    return dates[order], closes[order]
+
+
+def rebalance_dates(price_dates, frequency="QE"):
+    """
+    Last trading day of each complete period (e.g. "ME", "QE") within the price history;
+    the period the history ends in is left out, since its last bar is not a period end.
+    """
+    index = pd.DatetimeIndex(price_dates.astype("datetime64[ns]"))
+    last_days = pd.Series(index, index=index).resample(frequency).last().dropna()
+    last_days = last_days[last_days.index <= index[-1]]
+    return np.array(last_days.values, dtype="datetime64[D]")
+
+
+def filing_epochs(financials, filing_lag_days=FILING_LAG_DAYS):
+    """
+    Fiscal year ends (ascending) and the date each annual filing became available.
+    Every rebalance date maps to one epoch: the latest filing public on that date.
+    """
+    fiscal_dates = sorted({r["fiscalDateEnding"] for r in financials.get("income_statement", {}).get("annualReports", [])})
+    fiscal = np.array(fiscal_dates, dtype="datetime64[D]")
+    return fiscal, fiscal + np.timedelta64(filing_lag_days, "D")
+
+
+def split_factors(financials, fiscal):
+    """
+    Multiplier putting the share count reported on each fiscal date on the basis of the
+    chart's closes, which yfinance adjusts for every split up to the download.
+
+    Splits are read from jumps in the reported share count between consecutive balance
+    sheets (annual and quarterly reports) that lie within SPLIT_TOLERANCE of a whole
+    ratio; buybacks and issuance never come close. A filing's factor is the product of
+    the splits reported after it. The overview's SharesOutstanding is left out: for
+    multi-class issuers (GOOGL) it counts one class only and would read as a reverse split.
+    """
+    balance = financials.get("balance_sheet", {})
+    reports = balance.get("annualReports", []) + balance.get("quarterlyReports", [])
+    counts = {r["fiscalDateEnding"]: r.get("commonStockSharesOutstanding") for r in reports if "fiscalDateEnding" in r}
+    dates = np.array(sorted(counts), dtype="datetime64[D]")
+    shares = to_float_array([counts[str(date)] for date in dates])
+    usable = np.isfinite(shares) & (shares > 0)
+    dates, shares = dates[usable], shares[usable]
+
+    ratio = shares[1:] / shares[:-1]
+    magnitude = np.maximum(ratio, 1 / ratio)
+    whole = np.round(magnitude)
+    is_split = (whole >= 2) & (np.abs(magnitude - whole) <= SPLIT_TOLERANCE * whole)
+    split_dates = dates[1:][is_split]
+    split_ratios = np.where(ratio >= 1, whole, 1 / whole)[is_split]
+
+    factors = np.ones(len(fiscal))
+    for date, split_ratio in zip(split_dates, split_ratios):
+        factors[fiscal < date] *= split_ratio
+    return factors
+
+
+def _epoch_inputs(ticker, financials_path, filing_lag_days):
+    """Stage 1: point-in-time DCF inputs, one row per filing epoch (shares on the chart's split basis)."""
+    with open(financials_path, "r") as f:
+        financials = json.load(f)
+    fiscal, available = filing_epochs(financials, filing_lag_days)
+    inputs = [extract_dcf_inputs(financials, latest_fiscal_date=str(date)) for date in fiscal]
+    if not inputs:
+        return {"fiscal": fiscal, "available": available, "inputs": None}
+    inputs = stack_inputs(inputs)
+    # Per-share values are compared with split-adjusted closes, so count shares the same way
+    inputs["shares_outstanding"] = inputs["shares_outstanding"] * split_factors(financials, fiscal)
+    return {"fiscal": fiscal, "available": available, "inputs": inputs}
+
+
+def _peer_multiples_at(dates, peers, data_folder, filing_lag_days):
+    """
+    Point-in-time median EV/EBITDA and P/E across peers that have both a stored
+    financials file and price history. Returns two (n_dates,) arrays (NaN if none).
+    """
+    ev_ebitda, pe = [], []
+    for peer in peers:
+        financials_path = os.path.join(data_folder, f"{peer}_financials.json")
+        chart_path = os.path.join(data_folder, f"{peer}_chart.json")
+        if not (os.path.exists(financials_path) and os.path.exists(chart_path)):
+            continue
+        epochs = _epoch_inputs(peer, financials_path, filing_lag_days)
+        if epochs["inputs"] is None:
+            continue
+        price_dates, closes = load_prices(peer, data_folder)
+        epoch = np.searchsorted(epochs["available"], dates, side="right") - 1
+        bar = np.searchsorted(price_dates, dates, side="right") - 1
+        valid = (epoch >= 0) & (bar >= 0)
+        epoch, bar = np.maximum(epoch, 0), np.maximum(bar, 0)
+
+        inputs = epochs["inputs"]
+        market_cap = closes[bar] * inputs["shares_outstanding"][epoch]
+        ev = market_cap + inputs["total_debt"][epoch] - np.nan_to_num(inputs["cash"][epoch])
+        with np.errstate(invalid="ignore", divide="ignore"):
+            peer_ev_ebitda = np.where(valid, ev / inputs["ebitda"][epoch, -1], np.nan)
+            peer_pe = np.where(valid, market_cap / inputs["net_income"][epoch, -1], np.nan)
+        ev_ebitda.append(np.where(peer_ev_ebitda > 0, peer_ev_ebitda, np.nan))
+        pe.append(np.where(peer_pe > 0, peer_pe, np.nan))
+
+    if not ev_ebitda:
+        return np.full(len(dates), np.nan), np.full(len(dates), np.nan)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN columns → NaN
+        return np.nanmedian(np.vstack(ev_ebitda), axis=0), np.nanmedian(np.vstack(pe), axis=0)
+
+
+# === Per-ticker backtest ===
+def backtest_ticker(ticker, params=None, data_folder=DATA_FOLDER):
+    """
+    Point-in-time backtest for one ticker. For each rebalance date only filings public
+    on that date are used; DCF and multiples valuations are computed for all dates in
+    one vectorized call and compared with subsequent price returns.
+    Returns a DataFrame with one row per rebalance date.
+    """
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    financials_path = os.path.join(data_folder, f"{ticker}_financials.json")
+    chart_path = os.path.join(data_folder, f"{ticker}_chart.json")
+    comp_path = os.path.join(data_folder, f"{ticker}_comparable_analysis.json")
+
+    # Stage 1: point-in-time inputs (depends on the statements and the filing lag only)
+    inputs_key = _digest(ticker, _file_fingerprint(financials_path), params["filing_lag_days"])
+    epochs = _cached("inputs", inputs_key,
+                     lambda: _epoch_inputs(ticker, financials_path, params["filing_lag_days"]))
+
+    price_dates, closes = load_prices(ticker, data_folder)
+    dates = rebalance_dates(price_dates, params["frequency"])
+    epoch = np.searchsorted(epochs["available"], dates, side="right") - 1
+    keep = epoch >= 0
+    dates, epoch = dates[keep], epoch[keep]
+    if epochs["inputs"] is None or not len(dates):
+        return pd.DataFrame()
+
+    # Stage 2: valuation (depends on stage 1 plus the valuation parameters)
+    peers = []
+    if os.path.exists(comp_path):
+        with open(comp_path, "r") as f:
+            peers = list(comps_metrics_frame(json.load(f)).index)
+
+    def compute_valuation():
+        dated_inputs = {k: v[epoch] for k, v in epochs["inputs"].items()}
+        dcf = dcf_value(dated_inputs, params["wacc"], params["terminal_growth"])
+        peer_ev_ebitda, peer_pe = _peer_multiples_at(dates, peers, data_folder, params["filing_lag_days"])
+        net_debt = dated_inputs["total_debt"] - np.nan_to_num(dated_inputs["cash"])
+        multiples = multiples_value(dated_inputs["ebitda"][:, -1], dated_inputs["net_income"][:, -1],
+                                    net_debt, dated_inputs["shares_outstanding"], peer_ev_ebitda, peer_pe)
+        return {"dcf_price": dcf["price_per_share"], **multiples,
+                "fiscal_date": dated_inputs["fiscal_date"]}
+
+    peer_files = [os.path.join(data_folder, f"{peer}_{kind}.json") for peer in peers for kind in ("financials", "chart")]
+    valuation_key = _digest(inputs_key, _file_fingerprint(chart_path),
+                            [_file_fingerprint(path) for path in peer_files if os.path.exists(path)],
+                            params["wacc"], params["terminal_growth"], params["frequency"])
+    values = _cached("valuation", valuation_key, compute_valuation)
+
+    # Stage 3: evaluation against subsequent returns (cheap; always recomputed)
+    bar = np.searchsorted(price_dates, dates, side="right") - 1
+    price = closes[bar]
+    frame = pd.DataFrame({
+        "ticker": ticker,
+        "date": dates,
+        "fiscal_date": values["fiscal_date"],
+        "price": price,
+        "dcf_price": values["dcf_price"],
+        "ev_ebitda_price": values["ev_ebitda_price"],
+        "pe_price": values["pe_price"],
+    })
+    with np.errstate(invalid="ignore", divide="ignore"):
+        frame["dcf_upside"] = frame["dcf_price"] / price - 1
+        frame["multiples_upside"] = frame["ev_ebitda_price"] / price - 1
+    for label, days in HORIZONS.items():
+        ahead = bar + days
+        future = np.where(ahead < len(closes), closes[np.minimum(ahead, len(closes) - 1)], np.nan)
+        frame[f"return_{label}"] = future / price - 1
+    return frame
+
+
+def _backtest_worker(args):
+    ticker, params, data_folder = args
+    try:
+        return backtest_ticker(ticker, params, data_folder)
+    except (OSError, KeyError, ValueError) as e:
+        print(f"⚠️ Backtest skipped for {ticker}: {e}")
+        return pd.DataFrame()
+
+
+def run_backtest(tickers, params=None, data_folder=DATA_FOLDER, max_workers=None):
+    """Runs backtest_ticker across tickers in a process pool and concatenates the results."""
+    jobs = [(ticker, params, data_folder) for ticker in tickers]
+    if max_workers == 1 or len(jobs) <= 1:
+        frames = [_backtest_worker(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            frames = list(pool.map(_backtest_worker, jobs))
+    frames = [f for f in frames if not f.empty]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def summarize_backtest(results):
+    """
+    Rank correlation (Spearman) between implied upside and each forward return, and
+    the hit rate: share of dates where the sign of upside matched the sign of the return.
+    """
+    rows = []
+    for signal in ["dcf_upside", "multiples_upside"]:
+        for label in HORIZONS:
+            column = f"return_{label}"
+            pairs = results[[signal, column]].replace([np.inf, -np.inf], np.nan).dropna()
+            if len(pairs) < 3:
+                continue
+            ranks = pairs.rank()
+            rows.append({
+                "signal": signal,
+                "horizon": label,
+                "observations": len(pairs),
+                "rank_correlation": ranks[signal].corr(ranks[column]),
+                "hit_rate": float((np.sign(pairs[signal]) == np.sign(pairs[column])).mean()),
+            })
+    return pd.DataFrame(rows)
+
+
+def available_tickers(data_folder=DATA_FOLDER):
+    return sorted(f.replace("_financials.json", "") for f in os.listdir(data_folder)
+                  if f.endswith("_financials.json")
+                  and os.path.exists(os.path.join(data_folder, f.replace("_financials.json", "_chart.json"))))
+
+
+# === Entry point when script is called directly ===
+if __name__ == "__main__":
+    tickers = [t.upper() for t in sys.argv[1:]] or available_tickers()
+    results = run_backtest(tickers)
+    if results.empty:
+        print("No backtest results.")
+        sys.exit(1)
+
+    os.makedirs("calculation data", exist_ok=True)
+    output_path = os.path.join("calculation data", "backtest_results.csv")
+    results.to_csv(output_path, index=False)
+    print(summarize_backtest(results).to_string(index=False))
+    print(f"\n✅ Backtest results saved to {output_path}")
@@ -0,0 +1,222 @@
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from schema import partition_tickers, describe
+from units import to_float_array
+from valuation import extract_dcf_inputs, stack_inputs, dcf_value, peer_multiples, multiples_value
+from wacc import peer_table, peer_table_from_frame, batch_wacc, with_betas
+from comps_store import ensure_comps_store, peer_frame
+from storage import atomic_write_json
+from assumptions import load_assumptions, size_premium
+from projection import load_projected
+from quote_service import get_quotes, repriced_market_cap, MAX_AGE_SECONDS
+
+DATA_FOLDER = "data"
+RESULTS_PATH = os.path.join(DATA_FOLDER, "batch_results.json")
+DEFAULT_WACC = 0.09  # used when a ticker has no usable peers
+RETRY_DELAY_SECONDS = 60  # Alpha Vantage throttles per minute; back off before refetching
+
+
+def _load_ticker(args):
+    """Worker: parse one ticker's files and extract everything the valuation stage needs."""
+    ticker, data_folder = args
+    financials = load_projected(os.path.join(data_folder, f"{ticker}_financials.json"), "dcf")
+
+    overview = financials.get("overview", {})
+    quote = financials.get("quote", {}).get("Global Quote", {})
+    record = {
+        "ticker": ticker,
+        "name": overview.get("Name", ticker),
+        "sector": overview.get("Sector", "N/A"),
+        "industry": overview.get("Industry", "N/A"),
+        "price": to_float_array([quote.get("05. price")])[0],
+        "market_cap": to_float_array([overview.get("MarketCapitalization")])[0],
+    }
+
+    multiples = {"ev_ebitda": np.nan, "pe": np.nan}
+    peers = peer_table({"peers": {}})
+    comps = peer_frame(ticker, data_folder)
+    if len(comps):
+        multiples = peer_multiples(comps)
+        peers = peer_table_from_frame(comps)
+        record["peers"] = list(comps.index)
+
+    return record, extract_dcf_inputs(financials), multiples, peers
+
+
+def _apply_live_quotes(records, data_folder):
+    """Prices (and market caps) from fresh quote_service quotes replace those saved with the statements."""
+    quotes = get_quotes([record["ticker"] for record in records], data_folder, max_age=MAX_AGE_SECONDS)
+    for record in records:
+        quote = quotes.get(record["ticker"])
+        if quote is not None:
+            record["market_cap"] = float(repriced_market_cap(record["market_cap"], record["price"], quote["price"],
+                                                             quote.get("market_cap", np.nan)))
+            record["price"] = quote["price"]
+
+
+def value_tickers(tickers, wacc=None, data_folder=DATA_FOLDER, max_workers=None, as_of=None, beta_source="provider",
+                  live_quotes=False):
+    """
+    Valuation stage: files are parsed in a process pool, then every ticker's WACC and
+    DCF / multiples values are computed in single vectorized calls.
+    Pass `wacc` to override the peer-derived discount rate, `as_of` to use the market
+    assumptions in effect on that date (default: latest). With beta_source="regression",
+    peers that have a stored chart use their Blume-adjusted regression beta
+    (returns_analytics.py, over bars up to `as_of`) instead of the provider's. With `live_quotes`, fresh quotes
+    from quote_service.py replace the prices saved with the statements, so results move
+    with every quote refresh. Returns one dict per ticker.
+    """
+    if not tickers:
+        return []
+    # Refresh the shared comps store once up front; workers then only map it read-only
+    ensure_comps_store(tickers, data_folder)
+    jobs = [(ticker, data_folder) for ticker in tickers]
+    if max_workers == 1 or len(jobs) == 1:
+        loaded = [_load_ticker(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            loaded = list(pool.map(_load_ticker, jobs, chunksize=max(1, len(jobs) // 32)))
+
+    records = [record for record, _, _, _ in loaded]
+    if live_quotes:
+        _apply_live_quotes(records, data_folder)
+    inputs = stack_inputs([inputs for _, inputs, _, _ in loaded])
+    if wacc is None:
+        peer_tables = [peers for _, _, _, peers in loaded]
+        if beta_source == "regression":
+            from returns_analytics import returns_analytics
+            peer_tickers = sorted({t for table in peer_tables for t in table.index})
+            betas = returns_analytics(peer_tickers, data_folder=data_folder, as_of=as_of)["adjusted_beta"]
+            betas = betas.dropna().to_dict()
+            peer_tables = [with_betas(table, betas) for table in peer_tables]
+        assumptions = load_assumptions(as_of)
+        premiums = size_premium([record["market_cap"] for record in records], assumptions)
+        wacc = batch_wacc(peer_tables, inputs["tax_rate"], inputs["cost_of_debt"], premiums, assumptions)["wacc"]
+        wacc = np.where(np.isnan(wacc), DEFAULT_WACC, wacc)
+    wacc = np.broadcast_to(np.asarray(wacc, dtype=float), (len(records),))
+
+    dcf = dcf_value(inputs, wacc)
+    net_debt = inputs["total_debt"] - np.nan_to_num(inputs["cash"])
+    multiples = multiples_value(inputs["ebitda"][:, -1], inputs["net_income"][:, -1], net_debt,
+                                inputs["shares_outstanding"],
+                                [m["ev_ebitda"] for _, _, m, _ in loaded], [m["pe"] for _, _, m, _ in loaded])
+
+    for i, record in enumerate(records):
+        price = record["price"]
+        record.update({
+            "fiscal_date": inputs["fiscal_date"][i],
+            "revenue": inputs["revenue"][i, -1],
+            "ebitda": inputs["ebitda"][i, -1],
+            "net_income": inputs["net_income"][i, -1],
+            "tax_rate": inputs["tax_rate"][i],
+            "cost_of_debt": inputs["cost_of_debt"][i],
+            "total_debt": inputs["total_debt"][i],
+            "cash": inputs["cash"][i],
+            "shares_outstanding": inputs["shares_outstanding"][i],
+            "peer_ev_ebitda": loaded[i][2].get("ev_ebitda", np.nan),
+            "peer_ev_sales": loaded[i][2].get("ev_sales", np.nan),
+            "peer_pe": loaded[i][2].get("pe", np.nan),
+            "wacc": wacc[i],
+            "enterprise_value": dcf["enterprise_value"][i],
+            "dcf_price": dcf["price_per_share"][i],
+            "ev_ebitda_price": multiples["ev_ebitda_price"][i],
+            "pe_price": multiples["pe_price"][i],
+            "dcf_upside": dcf["price_per_share"][i] / price - 1 if price else np.nan,
+        })
+    return records
+
+
+def _refetch(tickers):
+    from data_fetcher import fetch_and_save_financials
+    for ticker in tickers:
+        try:
+            fetch_and_save_financials(ticker)
+        except Exception as e:
+            print(f"⚠️ Refetch failed for {ticker}: {e}")
+
+
+def run_batch(tickers, refetch=True, excel=False, max_retries=2, retry_delay=RETRY_DELAY_SECONDS,
+              wacc=None, data_folder=DATA_FOLDER, max_workers=None, as_of=None, backend=None,
+              beta_source="provider", live_quotes=False):
+    """
+    Screens a list of tickers. Each ticker is validated once up front: unusable ones
+    are skipped, throttled ones are re-queued for a refetch (with backoff), and only
+    the rest reach the valuation stage and, optionally, the Excel export.
+    `as_of` selects the market assumptions version (see assumptions.py), `beta_source`
+    the peer betas and `live_quotes` the price overlay (see value_tickers). `backend`
+    (threads | processes | queue) runs valuation and export through executor.run_stage,
+    in chunks that can be spread over worker nodes; None keeps the in-process pool.
+    """
+    plan = partition_tickers(tickers, data_folder)
+
+    for attempt in range(1, max_retries + 1):
+        if not refetch or not plan["requeue"]:
+            break
+        print(f"🔁 Re-queueing {len(plan['requeue'])} throttled ticker(s), attempt {attempt}")
+        time.sleep(retry_delay * attempt)
+        _refetch(plan["requeue"])
+        retry = partition_tickers(plan["requeue"], data_folder)
+        plan["run"] += retry["run"]
+        plan["skip"] += retry["skip"]
+        plan["requeue"] = retry["requeue"]
+        plan["results"].update(retry["results"])
+    plan["skip"] += plan["requeue"]
+
+    for ticker in plan["skip"]:
+        print(f"⏭️ Skipping {describe(plan['results'][ticker])}")
+
+    if backend is None:
+        results = value_tickers(plan["run"], wacc, data_folder, max_workers, as_of, beta_source, live_quotes)
+    else:
+        from executor import run_stage
+        ensure_comps_store(plan["run"], data_folder)  # once here, not in every worker
+        results = run_stage("valuation", plan["run"], backend, data_folder,
+                            {"wacc": wacc, "as_of": as_of, "beta_source": beta_source, "live_quotes": live_quotes},
+                            max_workers=max_workers)
+    for record in results:
+        validation = plan["results"][record["ticker"]]
+        record["status"] = validation["status"]
+        record["missing"] = validation["missing"] + validation["missing_optional"]
+
+    if excel and backend is not None:
+        from executor import run_stage
+        run_stage("export", plan["run"], backend, data_folder, max_workers=max_workers)
+    elif excel:
+        from dcfModel import dcf_data
+        for ticker in plan["run"]:
+            try:
+                dcf_data(ticker)
+            except Exception as e:
+                print(f"❌ Excel export failed for {ticker}: {e}")
+
+    return results, plan
+
+
+def save_results(results, path=RESULTS_PATH):
+    def clean(value):
+        if isinstance(value, (float, np.floating)):
+            return None if np.isnan(value) or np.isinf(value) else float(value)
+        return value
+
+    atomic_write_json(path, [{k: clean(v) for k, v in record.items()} for record in results])
+    return path
+
+
+def available_tickers(data_folder=DATA_FOLDER):
+    return sorted(f.replace("_financials.json", "") for f in os.listdir(data_folder) if f.endswith("_financials.json"))
+
+
+# === Entry point when script is called directly ===
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    tickers = [t.upper() for t in args] or available_tickers()
+    as_of = next((a.split("=", 1)[1] for a in sys.argv[1:] if a.startswith("--as-of=")), None)
+    backend = next((a.split("=", 1)[1] for a in sys.argv[1:] if a.startswith("--backend=")), None)
+    beta_source = next((a.split("=", 1)[1] for a in sys.argv[1:] if a.startswith("--beta=")), "provider")
+    results, plan = run_batch(tickers, refetch="--no-fetch" not in sys.argv, excel="--excel" in sys.argv, as_of=as_of,
+                              backend=backend, beta_source=beta_source, live_quotes="--live-quotes" in sys.argv)
+    path = save_results(results)
+    print(f"✅ {len(results)} valued, {len(plan['skip'])} skipped. Results saved to {path}")
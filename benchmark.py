@@ -0,0 +1,378 @@
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import subprocess
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+import numpy as np
+from replay_server import start_replay_server, seed_from_fixtures
+
+DATA_FOLDER = "data"
+BENCHMARK_FOLDER = "benchmark data"
+HISTORY_PATH = os.path.join(BENCHMARK_FOLDER, "history.jsonl")
+CCA_TEMPLATE = os.path.join("models", "Comparable Company Analysis Model.xlsm")
+
+FIXTURE_TICKERS = ["AAPL", "GOOGL", "META", "MSFT", "SNAP", "TSLA"]
+FIXTURE_KINDS = ["financials", "comparable_analysis", "chart"]
+
+DEFAULT_SIZES = [6, 1000, 10000]
+DEFAULT_REPEAT = 3              # best-of-N; universes above 1k tickers run once
+DEFAULT_LATENCY = 0.05          # seconds the replay server waits before each response
+REGRESSION_THRESHOLD = 0.20     # flag stages more than 20% slower than the previous run
+
+# Stages dominated by per-file I/O or network waits are timed on a sample of the universe
+STAGE_SAMPLE = {"chart": 500, "excel": 25, "fetch": 10, "dcf_model": 200}
+
+def source_ticker(ticker):
+    """Fixture a synthetic ticker was generated from ("AAPL_17" → "AAPL")."""
+    return ticker.split("_")[0]
+
+
+# === Synthetic universes ===
+def build_universe(size, data_folder=DATA_FOLDER):
+    """
+    Creates a folder of `size` tickers generated from the six fixtures. Files are
+    hard-linked (copied where links are unsupported), so large universes cost no disk.
+    Returns (folder, tickers).
+    """
+    folder = os.path.join(BENCHMARK_FOLDER, f"universe_{size}")
+    os.makedirs(folder, exist_ok=True)
+    tickers = []
+    for i in range(size):
+        source = FIXTURE_TICKERS[i % len(FIXTURE_TICKERS)]
+        ticker = source if size <= len(FIXTURE_TICKERS) else f"{source}_{i // len(FIXTURE_TICKERS)}"
+        for kind in FIXTURE_KINDS:
+            src = os.path.join(data_folder, f"{source}_{kind}.json")
+            dst = os.path.join(folder, f"{ticker}_{kind}.json")
+            if os.path.exists(dst) or not os.path.exists(src):
+                continue
+            try:
+                os.link(src, dst)
+            except OSError:
+                shutil.copyfile(src, dst)
+        tickers.append(ticker)
+    return folder, tickers
+
+
+# === Stages ===
+# Each stage does its setup (untimed) and returns (run, items): `run` is the timed
+# callable and `items` the number of tickers it processes. Returning None skips the stage.
+def _fixture_payloads(kind, data_folder=DATA_FOLDER):
+    payloads = {}
+    for ticker in FIXTURE_TICKERS:
+        with open(os.path.join(data_folder, f"{ticker}_{kind}.json"), "r") as f:
+            payloads[ticker] = json.load(f)
+    return payloads
+
+
+def stage_json_load(tickers, folder, options):
+    def run():
+        for ticker in tickers:
+            with open(os.path.join(folder, f"{ticker}_financials.json"), "r") as f:
+                json.load(f)
+    return run, len(tickers)
+
+
+def stage_json_project(tickers, folder, options):
+    from projection import load_projected
+
+    def run():
+        for ticker in tickers:
+            load_projected(os.path.join(folder, f"{ticker}_financials.json"), "dcf")
+    return run, len(tickers)
+
+
+def stage_dcf_extract(tickers, folder, options):
+    """The vectorized pipeline's extractor (valuation.extract_dcf_inputs); see dcf_model for the app's."""
+    from valuation import extract_dcf_inputs
+    payloads = _fixture_payloads("financials")
+
+    def run():
+        for ticker in tickers:
+            extract_dcf_inputs(payloads[source_ticker(ticker)])
+    return run, len(tickers)
+
+
+def stage_dcf_model(tickers, folder, options):
+    """
+    The legacy extraction the app and the Excel export run (dcfModel.run_dcf_model), with
+    the workbook write left out and its prints discarded. It reads data/ directly, so each
+    synthetic ticker runs the fixture it was generated from.
+    """
+    try:
+        import dcfModel
+    except ImportError as e:  # dcfExcel needs xlwings
+        print(f"⚠️ Skipping dcf_model stage: {e}")
+        return None
+    sample = [source_ticker(ticker) for ticker in tickers[:STAGE_SAMPLE["dcf_model"]]]
+
+    def run():
+        write_to_excel = dcfModel.write_to_excel
+        dcfModel.write_to_excel = lambda *args, **kwargs: None
+        try:
+            with redirect_stdout(io.StringIO()):
+                for ticker in sample:
+                    dcfModel.run_dcf_model(ticker)
+        finally:
+            dcfModel.write_to_excel = write_to_excel
+    return run, len(sample)
+
+
+def stage_dcf_value(tickers, folder, options):
+    from valuation import extract_dcf_inputs, stack_inputs, dcf_value
+    payloads = _fixture_payloads("financials")
+    extracted = {ticker: extract_dcf_inputs(payload) for ticker, payload in payloads.items()}
+    inputs = stack_inputs([extracted[source_ticker(ticker)] for ticker in tickers])
+    return lambda: dcf_value(inputs, 0.09), len(tickers)
+
+
+def stage_comps_metrics(tickers, folder, options):
+    from comparable_company_analysis import calculate_financial_metrics
+    from units import comps_metrics_frame
+    from valuation import peer_multiples
+    from wacc import peer_table, batch_wacc, _peer_stats_cache
+    payloads = _fixture_payloads("comparable_analysis")
+
+    def run():
+        _peer_stats_cache.clear()
+        tables = []
+        for ticker in tickers:
+            comp_data = payloads[source_ticker(ticker)]
+            for peer in comp_data.get("peers", {}).values():
+                calculate_financial_metrics(peer["financials"])
+            peer_multiples(comps_metrics_frame(comp_data))
+            tables.append(peer_table(comp_data))
+        batch_wacc(tables, 0.21, 0.04)
+    return run, len(tickers)
+
+
+def stage_batch_valuation(tickers, folder, options):
+    from batch import value_tickers
+    from wacc import _peer_stats_cache
+
+    def run():
+        _peer_stats_cache.clear()
+        value_tickers(tickers, data_folder=folder)
+    return run, len(tickers)
+
+
+def stage_chart(tickers, folder, options):
+    try:
+        from chart_display import load_chart_frame, melt_chart
+    except ImportError as e:
+        print(f"⚠️ Skipping chart stage: {e}")
+        return None
+    sample = tickers[:STAGE_SAMPLE["chart"]]
+
+    def run():
+        for ticker in sample:
+            melt_chart(load_chart_frame(ticker, folder), ["Open", "High", "Low", "Close"])
+    return run, len(sample)
+
+
+def stage_excel(tickers, folder, options):
+    """Fills one CCA sheet per ticker in a copy of the template, the cells ccaExcel writes."""
+    try:
+        import openpyxl
+    except ImportError as e:
+        print(f"⚠️ Skipping excel stage: {e}")
+        return None
+    from units import comps_metrics_frame, to_float_array
+    financials = _fixture_payloads("financials")
+    comparables = _fixture_payloads("comparable_analysis")
+    sample = tickers[:STAGE_SAMPLE["excel"]]
+    output_path = os.path.join(folder, "benchmark_export.xlsm")
+
+    def run():
+        wb = openpyxl.load_workbook(CCA_TEMPLATE, keep_vba=True)
+        for ticker in sample:
+            data = financials[source_ticker(ticker)]
+            sheet = wb.copy_worksheet(wb["CCA"])
+            sheet.title = f"{ticker}_CCA"
+            sheet["C4"] = data.get("overview", {}).get("Name", "")
+            latest_income = max(data["income_statement"]["annualReports"], key=lambda r: r["fiscalDateEnding"])
+            sheet["C24"], sheet["C25"], sheet["C26"] = to_float_array(
+                [latest_income.get("ebitda"), latest_income.get("ebit"), latest_income.get("netIncome")]).tolist()
+
+            peer_metrics = comps_metrics_frame(comparables[source_ticker(ticker)]).head(5)
+            for row, (peer, metrics) in enumerate(peer_metrics.iterrows(), start=11):
+                sheet[f"B{row}"] = peer
+                for column, name in zip("CDEGHIJ", ["price", "market_cap", "enterprise_value", "sales",
+                                                     "ebitda", "ebit", "earnings"]):
+                    sheet[f"{column}{row}"] = None if np.isnan(metrics[name]) else float(metrics[name])
+        wb.save(output_path)
+    return run, len(sample)
+
+
+def stage_fetch(tickers, folder, options):
+    import data_fetcher
+    import providers
+    sample = tickers[:STAGE_SAMPLE["fetch"]]
+    output_folder = os.path.join(folder, "fetched")
+
+    def run():
+        original_urls = dict(providers.BASE_URLS)
+        providers.BASE_URLS.update({name: f"{options['provider_url']}/{name}" for name in original_urls})
+        try:
+            with redirect_stdout(io.StringIO()):
+                for ticker in sample:
+                    data_fetcher.fetch_and_save_financials(ticker, api_key="benchmark", output_folder=output_folder,
+                                                           providers=("alphavantage", "fmp"))
+        finally:
+            providers.BASE_URLS.update(original_urls)
+    return run, len(sample)
+
+
+STAGES = {
+    "json_load": stage_json_load,
+    "json_project": stage_json_project,
+    "dcf_extract": stage_dcf_extract,
+    "dcf_model": stage_dcf_model,
+    "dcf_value": stage_dcf_value,
+    "comps_metrics": stage_comps_metrics,
+    "batch_valuation": stage_batch_valuation,
+    "chart": stage_chart,
+    "excel": stage_excel,
+    "fetch": stage_fetch,
+}
+
+
+# === Runner ===
+def time_stage(stage, tickers, folder, options):
+    """Best-of-N wall time of one stage. Returns a result dict, or None if skipped."""
+    prepared = STAGES[stage](tickers, folder, options)
+    if prepared is None:
+        return None
+    run, items = prepared
+    repeat = options["repeat"] if len(tickers) <= 1000 else 1
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    return {"seconds": best, "items": items, "per_item_ms": best / items * 1000 if items else None}
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, stages=None, repeat=DEFAULT_REPEAT, latency=DEFAULT_LATENCY):
+    """
+    Times every stage on every universe size. Returns a history record:
+    {"timestamp", "commit", "python", "params", "results": {size: {stage: {...}}}}
+    """
+    stages = stages or list(STAGES)
+    options = {"repeat": repeat, "latency": latency}
+    server = None
+    if "fetch" in stages:
+        # Replay server seeded from the fixtures; synthetic tickers resolve to their source
+        server, options["provider_url"] = start_replay_server(seed_from_fixtures(), latency=latency)
+
+    results = {}
+    try:
+        for size in sizes:
+            folder, tickers = build_universe(size)
+            try:
+                results[str(size)] = {}
+                for stage in stages:
+                    result = time_stage(stage, tickers, folder, options)
+                    if result is not None:
+                        results[str(size)][stage] = result
+                        print(f"⏱️ {size:>6} tickers  {stage:<16} {result['seconds']:9.3f}s"
+                              f"  ({result['per_item_ms']:.3f} ms/ticker over {result['items']})")
+            finally:
+                shutil.rmtree(folder, ignore_errors=True)
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "params": {"repeat": repeat, "latency": latency},
+        "results": results,
+    }
+
+
+# === History ===
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def load_history(path=HISTORY_PATH):
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def append_history(record, path=HISTORY_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+    return path
+
+
+def compare_runs(current, previous, threshold=REGRESSION_THRESHOLD):
+    """
+    Per (size, stage) change in wall time versus an earlier record. Stages that depend
+    on the replay server's latency are only compared when the latency matches.
+    """
+    rows = []
+    same_latency = current["params"].get("latency") == previous["params"].get("latency")
+    for size, stages in current["results"].items():
+        for stage, result in stages.items():
+            before = previous["results"].get(size, {}).get(stage)
+            if before is None or (stage == "fetch" and not same_latency) or not before["seconds"]:
+                continue
+            change = result["seconds"] / before["seconds"] - 1
+            rows.append({"size": size, "stage": stage, "previous": before["seconds"],
+                         "current": result["seconds"], "change": change, "regression": change > threshold})
+    return rows
+
+
+def _option(name, default):
+    """Value of a "--name=value" command-line option."""
+    for arg in sys.argv[1:]:
+        if arg.startswith(f"--{name}="):
+            return arg.split("=", 1)[1]
+    return default
+
+
+# === Entry point when script is called directly ===
+if __name__ == "__main__":
+    sizes = [int(s) for s in _option("sizes", ",".join(map(str, DEFAULT_SIZES))).split(",")]
+    stages = [s for s in _option("stages", "").split(",") if s] or None
+    unknown = [s for s in stages or [] if s not in STAGES]
+    if unknown:
+        print(f"Unknown stage(s): {', '.join(unknown)}. Available: {', '.join(STAGES)}")
+        sys.exit(1)
+
+    history = load_history()
+    record = run_benchmarks(sizes, stages, int(_option("repeat", DEFAULT_REPEAT)),
+                            float(_option("latency", DEFAULT_LATENCY)))
+
+    regressions = []
+    if history:
+        previous = history[-1]
+        print(f"\n📊 Compared with {previous['commit']} ({previous['timestamp']})")
+        for row in compare_runs(record, previous):
+            flag = "❌" if row["regression"] else "✅"
+            print(f"{flag} {row['size']:>6} {row['stage']:<16} {row['previous']:9.3f}s → {row['current']:9.3f}s"
+                  f"  ({row['change']:+.1%})")
+            if row["regression"]:
+                regressions.append(row)
+
+    if "--no-save" not in sys.argv:
+        print(f"\n✅ Results appended to {append_history(record)}")
+    if regressions and "--check" in sys.argv:
+        print(f"❌ {len(regressions)} stage(s) regressed by more than {REGRESSION_THRESHOLD:.0%}")
+        sys.exit(1)
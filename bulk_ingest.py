@@ -0,0 +1,310 @@
+import os
+import re
+import sys
+import json
+import time
+import codecs
+import zipfile
+import datetime
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from schema import VALID, PARTIAL, UNUSABLE, validate_financials, describe
+from storage import atomic_write_bytes, ticker_lock
+from archive import latest_dictionary, compress_payload, store_compressed
+from snapshots import snapshot_row, store_snapshots
+
+try:
+    import orjson
+except ImportError:  # optional; json parses the same payloads, only slower
+    orjson = None
+
+DATA_FOLDER = "data"
+BATCH_SIZE = 100                        # files written (and archived in one transaction) per batch
+MAX_ENTRY_BYTES = 64 * 1024 * 1024      # larger entries are rejected, not read (zip bombs)
+SERIAL_BELOW = 8                        # fewer entries than this are processed without a pool
+TOO_LARGE = f"Larger than {MAX_ENTRY_BYTES // (1024 * 1024)} MB"
+
+REQUIRED_KEYS = ["balance_sheet", "income_statement", "cash_flow", "overview", "quote"]
+STATEMENTS = ("income_statement", "balance_sheet", "cash_flow")
+REPORT_LISTS = ("annualReports", "quarterlyReports")
+TICKER_PATTERN = re.compile(r"^[A-Z0-9][A-Z0-9.\-]{0,11}$")   # also keeps file names inside data/
+FILE_TICKER = re.compile(r"^([A-Za-z0-9.\-]+?)(?:_financials)?\.json$")
+
+# Per-file statuses besides schema's VALID / PARTIAL / UNUSABLE
+INVALID = "invalid"         # not JSON, not an object, required keys or ticker missing
+DUPLICATE = "duplicate"     # a file earlier in the same ingest already supplied this ticker
+WRITTEN = (VALID, PARTIAL)
+
+
+# === Entries ===
+def _skippable(name):
+    """Folders and macOS resource-fork entries inside zips."""
+    base = os.path.basename(name)
+    return name.endswith("/") or name.startswith("__MACOSX/") or base.startswith("._") or base.startswith(".")
+
+
+def _zip_entries(archive, label):
+    for info in archive.infolist():
+        if _skippable(info.filename) or not info.filename.lower().endswith(".json"):
+            continue
+        name = f"{label}:{info.filename}"
+        if info.file_size > MAX_ENTRY_BYTES:
+            yield name, None, TOO_LARGE
+            continue
+        with archive.open(info) as f:
+            yield name, f.read(), None
+
+
+def _zip_source(source, name):
+    try:
+        with zipfile.ZipFile(source) as archive:
+            yield from _zip_entries(archive, name)
+    except zipfile.BadZipFile as e:
+        yield name, None, f"Unreadable zip: {e}"
+
+
+def iter_entries(sources):
+    """
+    Yields (name, raw bytes, problem) for every JSON file in `sources`, one at a time:
+    file paths, folders (not recursive), .zip archives, or uploaded file objects with .name
+    and .read() (Streamlit UploadedFile). Entries that cannot be read (over MAX_ENTRY_BYTES,
+    corrupt zips) yield raw None and the problem; otherwise problem is None.
+    """
+    for source in sources:
+        name = getattr(source, "name", source)
+        if hasattr(source, "read"):
+            if name.lower().endswith(".zip"):
+                yield from _zip_source(source, name)
+            else:
+                yield name, source.read(), None
+        elif os.path.isdir(source):
+            yield from iter_entries(sorted(os.path.join(source, f) for f in os.listdir(source)
+                                           if f.lower().endswith((".json", ".zip")) and not _skippable(f)))
+        elif name.lower().endswith(".zip"):
+            yield from _zip_source(source, name)
+        elif os.path.getsize(source) > MAX_ENTRY_BYTES:
+            yield name, None, TOO_LARGE
+        else:
+            with open(source, "rb") as f:
+                yield name, f.read(), None
+
+
+# === Worker: parse, validate, normalize ===
+def infer_ticker(payload, name):
+    """overview.Symbol, else the file name ("AAPL.json", "AAPL_financials.json"); None if neither is usable."""
+    overview = payload.get("overview")
+    candidates = [overview.get("Symbol")] if isinstance(overview, dict) else []
+    match = FILE_TICKER.match(os.path.basename(name.split(":")[-1]))
+    candidates.append(match.group(1) if match else None)
+    for candidate in candidates:
+        if isinstance(candidate, str) and TICKER_PATTERN.match(candidate.strip().upper()):
+            return candidate.strip().upper()
+    return None
+
+
+def normalize_financials(payload, ticker):
+    """
+    Puts a payload in the shape the pipeline expects, in place: statement reports
+    newest first (the projections read the first n), statement symbols set to the
+    ticker (the TTM cache keys on them). Returns True if anything changed.
+    """
+    changed = False
+    for statement in STATEMENTS:
+        block = payload.get(statement)
+        if not isinstance(block, dict) or "error" in block:
+            continue
+        if block.get("symbol") != ticker:
+            block["symbol"] = ticker
+            changed = True
+        for key in REPORT_LISTS:
+            reports = block.get(key)
+            if not isinstance(reports, list):
+                continue
+            dates = [r.get("fiscalDateEnding", "") if isinstance(r, dict) else "" for r in reports]
+            if any(earlier < later for earlier, later in zip(dates, dates[1:])):
+                block[key] = sorted(reports, key=lambda r: r.get("fiscalDateEnding", "") if isinstance(r, dict) else "",
+                                    reverse=True)
+                changed = True
+    return changed
+
+
+def _parse(raw):
+    raw = raw[len(codecs.BOM_UTF8):] if raw.startswith(codecs.BOM_UTF8) else raw
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+
+def _serialize(payload):
+    # json.dumps(indent=...) falls back to the pure-Python encoder (~30× slower); keep to C encoders
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_INDENT_2)
+    return json.dumps(payload).encode("utf-8")
+
+
+def prepare_entry(args):
+    """
+    Worker: everything CPU-bound for one file. Returns a status dict and, for files to
+    write, the bytes to store and the compressed archive row.
+    """
+    name, raw, problem, dictionary = args
+    result = {"file": name, "ticker": None, "status": INVALID, "message": ""}
+    if problem is not None:
+        result["message"] = problem
+        return result
+    try:
+        payload = _parse(raw)
+    except ValueError as e:
+        result["message"] = f"Not valid JSON: {e}"
+        return result
+    if not isinstance(payload, dict):
+        result["message"] = "Payload is not a JSON object"
+        return result
+
+    missing = [key for key in REQUIRED_KEYS if key not in payload]
+    if missing:
+        result["message"] = f"Missing required keys: {', '.join(missing)}"
+        return result
+    ticker = infer_ticker(payload, name)
+    if ticker is None:
+        result["message"] = "No ticker in overview.Symbol or the file name"
+        return result
+    result["ticker"] = ticker
+
+    validation = validate_financials(payload)
+    result["status"] = validation["status"]
+    result["message"] = describe(validation)
+    if validation["status"] == UNUSABLE:
+        return result
+
+    # Unchanged payloads are stored byte for byte; only normalized ones are re-serialized
+    if normalize_financials(payload, ticker):
+        raw = _serialize(payload)
+    result["data"] = raw
+    result["snapshot"] = snapshot_row(ticker, payload)
+    if dictionary is not None:
+        result["archive_row"] = compress_payload(payload, *dictionary, fast=True)
+    return result
+
+
+def _prepared(entries, dictionary, max_workers):
+    """prepare_entry() results in entry order, with at most a few entries in flight per worker."""
+    entries = iter(entries)
+    head = [entry for _, entry in zip(range(SERIAL_BELOW), entries)]
+    if len(head) < SERIAL_BELOW or max_workers == 1:
+        for entry in head:
+            yield prepare_entry((*entry, dictionary))
+        for entry in entries:
+            yield prepare_entry((*entry, dictionary))
+        return
+
+    workers = max_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        limit = 4 * workers
+        pending = deque()
+        for entry in head:
+            pending.append(pool.submit(prepare_entry, (*entry, dictionary)))
+        for entry in entries:
+            if len(pending) >= limit:
+                yield pending.popleft().result()
+            pending.append(pool.submit(prepare_entry, (*entry, dictionary)))
+        while pending:
+            yield pending.popleft().result()
+
+
+# === Writer ===
+def _write_batch(batch, data_folder, fetch_date):
+    rows, snapshots = [], []
+    for result in batch:
+        ticker = result["ticker"]
+        path = os.path.join(data_folder, f"{ticker}_financials.json")
+        with ticker_lock(ticker, data_folder):
+            atomic_write_bytes(path, result.pop("data"))
+        if "archive_row" in result:
+            rows.append((ticker, "financials", fetch_date, *result.pop("archive_row")))
+        snapshots.append(dict(result.pop("snapshot"), source_mtime=os.stat(path).st_mtime))
+        result["path"] = path
+    if rows:
+        store_compressed(rows, data_folder)
+    store_snapshots(snapshots, data_folder)
+
+
+def ingest(sources, data_folder=DATA_FOLDER, max_workers=None, batch_size=BATCH_SIZE, archive=True, progress=None):
+    """
+    Bulk-ingests *_financials.json payloads from files, folders, zips or uploads.
+
+    Entries are streamed to a process pool that parses, validates (schema.py) and
+    normalizes them and infers each ticker from overview.Symbol. Usable payloads are
+    written to data/{TICKER}_financials.json in batches of `batch_size`, each file
+    atomically under its ticker lock, and archived and snapshotted (snapshots.py) in
+    one transaction per batch.
+    The first file seen for a ticker wins; later ones are reported as duplicates.
+
+    Parameters:
+    - sources: Paths (files, folders, .zip) and/or uploaded file objects
+    - archive: Also store each payload in the compressed payload archive
+    - progress: Optional callback(result) called as each file's status is known
+
+    Returns one {"file", "ticker", "status", "message"[, "path"]} dict per file.
+    """
+    os.makedirs(data_folder, exist_ok=True)
+    dictionary = latest_dictionary("financials", data_folder) if archive else None
+    fetch_date = datetime.date.today().isoformat()
+    results, batch, seen = [], [], set()
+
+    for result in _prepared(iter_entries(sources), dictionary, max_workers):
+        if result["status"] in WRITTEN:
+            if result["ticker"] in seen:
+                result.update(status=DUPLICATE, message=f"{result['ticker']} already ingested from an earlier file")
+                result.pop("data", None)
+                result.pop("archive_row", None)
+                result.pop("snapshot", None)
+            else:
+                seen.add(result["ticker"])
+                batch.append(result)
+        results.append(result)
+        if progress is not None:
+            progress(result)
+        if len(batch) >= batch_size:
+            _write_batch(batch, data_folder, fetch_date)
+            batch = []
+    if batch:
+        _write_batch(batch, data_folder, fetch_date)
+    return results
+
+
+def summarize(results):
+    """Count of files per status."""
+    counts = {}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    return counts
+
+
+def _option(name, default):
+    """Value of a "--name=value" command-line option."""
+    for arg in sys.argv[1:]:
+        if arg.startswith(f"--{name}="):
+            return arg.split("=", 1)[1]
+    return default
+
+
+# === Entry point when script is called directly ===
+if __name__ == "__main__":
+    # python bulk_ingest.py dump.zip more_files/ AAPL.json [--workers=N] [--batch=N] [--no-archive]
+    sources = [a for a in sys.argv[1:] if not a.startswith("--")]
+    if not sources:
+        print("Usage: python bulk_ingest.py FILE|FOLDER|ZIP [...] [--workers=N] [--batch=N] [--no-archive]")
+        sys.exit(1)
+    workers = _option("workers", None)
+
+    def report(result):
+        if result["status"] not in WRITTEN:
+            print(f"⚠️ {result['file']}: {result['status']} — {result['message']}")
+
+    started = time.perf_counter()
+    results = ingest(sources, max_workers=int(workers) if workers else None,
+                     batch_size=int(_option("batch", BATCH_SIZE)), archive="--no-archive" not in sys.argv,
+                     progress=report)
+    counts = summarize(results)
+    written = sum(counts.get(status, 0) for status in WRITTEN)
+    print(f"✅ Ingested {written} of {len(results)} files in {time.perf_counter() - started:.2f}s "
+          f"({', '.join(f'{status}: {n}' for status, n in sorted(counts.items()))})")
@@ -1,8 +1,11 @@
 import json
 import xlwings as xw
 import time
+from units import comps_metrics_frame
+from ttm import with_ttm_reports
+from projection import load_projected
 
-def write_to_excel(symbol):
+def write_to_excel(symbol, period="annual"):
     input_json_path = f"data/{symbol}_comparable_analysis.json"
     financials_json_path = f"data/{symbol}_financials.json"
     base_sheet_name = "CCA"
@@ -13,8 +16,11 @@ def write_to_excel(symbol):
     with open(input_json_path, "r") as f:
         data = json.load(f)
 
-    with open(financials_json_path, "r") as f:
-        financials = json.load(f)
+    financials = load_projected(financials_json_path, "cca_ttm" if period == "ttm" else "cca")
+
+    # TTM: latest trailing-twelve-month window in place of the latest annual report
+    if period == "ttm":
+        financials = with_ttm_reports(financials)
 
     # === Open Excel Workbook ===
     app = xw.App(visible=False)
@@ -69,20 +75,23 @@ def write_to_excel(symbol):
         def write_company_metrics(sheet, row, name, metrics):
             sheet.range(f"B{row}:J{row}").clear_contents()
             sheet.range(f"B{row}").value = name
-            sheet.range(f"C{row}").value = metrics.get("Price ($/share)", "")
-            sheet.range(f"D{row}").value = metrics.get("Market Cap ($M)", "")
-            sheet.range(f"E{row}").value = metrics.get("Enterprise Value ($M)", "")
-            sheet.range(f"G{row}").value = metrics.get("Sales ($M)", "")
-            sheet.range(f"H{row}").value = metrics.get("EBITDA ($M)", "")
-            sheet.range(f"I{row}").value = metrics.get("EBIT ($M)", "")
-            sheet.range(f"J{row}").value = metrics.get("Earnings ($M)", "")
+            sheet.range(f"C{row}").value = metrics["price"]
+            sheet.range(f"D{row}").value = metrics["market_cap"]
+            sheet.range(f"E{row}").value = metrics["enterprise_value"]
+            sheet.range(f"G{row}").value = metrics["sales"]
+            sheet.range(f"H{row}").value = metrics["ebitda"]
+            sheet.range(f"I{row}").value = metrics["ebit"]
+            sheet.range(f"J{row}").value = metrics["earnings"]
 
         # === Write Peer Companies (up to 5) Starting from Row 11 ===
+        # Metrics are in raw dollars, which is what the template expects; NaN → blank cell
+        peer_metrics = comps_metrics_frame(data).astype(object)
+        peer_metrics = peer_metrics.where(peer_metrics.notna(), "")
         row = 11
-        for i, (peer, peer_data) in enumerate(data["peers"].items()):
+        for i, peer in enumerate(peer_metrics.index):
             if i >= 5:
                 break
-            write_company_metrics(sheet, row, peer, peer_data["financial_metrics"])
+            write_company_metrics(sheet, row, peer, peer_metrics.loc[peer])
             row += 1
 
         wb.save()
@@ -5,15 +5,31 @@ import altair as alt
 
 DATA_FOLDER = "data"
 
+def load_chart_frame(ticker, data_folder=DATA_FOLDER):
+    """Reads {ticker}_chart.json into a DataFrame with flat OHLC columns and a parsed Date."""
+    ohlc_df = pd.read_json(os.path.join(data_folder, f"{ticker}_chart.json"))
+    ohlc_df.columns = [col[0] if isinstance(col, tuple) else col for col in ohlc_df.columns]
+    ohlc_df.rename(columns={"('Date', '')": "Date"}, inplace=True)
+    ohlc_df["Date"] = pd.to_datetime(ohlc_df["Date"])
+    return ohlc_df
+
+
+def melt_chart(ohlc_df, metrics):
+    """Long format (Date, Metric, Price) for the selected OHLC columns, as Altair expects."""
+    return ohlc_df.melt(
+        id_vars="Date",
+        value_vars=metrics,
+        var_name="Metric",
+        value_name="Price"
+    )
+
+
 def display_chart(ticker):
     ohlc_path = os.path.join(DATA_FOLDER, f"{ticker}_chart.json")
 
     if os.path.exists(ohlc_path):
         try:
-            ohlc_df = pd.read_json(ohlc_path)
-            ohlc_df.columns = [col[0] if isinstance(col, tuple) else col for col in ohlc_df.columns]
-            ohlc_df.rename(columns={"('Date', '')": "Date"}, inplace=True)
-            ohlc_df["Date"] = pd.to_datetime(ohlc_df["Date"])
+            ohlc_df = load_chart_frame(ticker)
 
             metrics_to_plot = st.multiselect(
                 "Metrics", ["Open", "High", "Low", "Close"],
@@ -22,12 +38,7 @@ def display_chart(ticker):
             )
 
             if metrics_to_plot:
-                melted_df = ohlc_df.melt(
-                    id_vars="Date", 
-                    value_vars=metrics_to_plot, 
-                    var_name="Metric", 
-                    value_name="Price"
-                )
+                melted_df = melt_chart(ohlc_df, metrics_to_plot)
 
                 chart = alt.Chart(melted_df).mark_line().encode(
                     x=alt.X("Date:T", title="Date"),
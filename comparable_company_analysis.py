@@ -3,35 +3,42 @@ import sys
 import requests
 import json
 from dotenv import load_dotenv
+from ttm import fmp_ttm_statement
+from comps_store import update_comps_store
+from storage import atomic_write_json, fetch_once
+from archive import archive_payload
 
 # === Load API keys from keys.env ===
 load_dotenv("keys.env")
 
-# === Read ticker from command-line ===
-if len(sys.argv) < 2:
-    print("Ticker symbol not provided.")
-    sys.exit(1)
-
-symbol = sys.argv[1].upper()
-
 # === Configuration ===
 base_folder = "data"
-os.makedirs(base_folder, exist_ok=True)
-output_json_path = os.path.join(base_folder, f"{symbol}_comparable_analysis.json")
 
 fmp_api_key = os.getenv("FMP_API_KEY")
 openai_api_key = os.getenv("OPENAI_API_KEY")
 
-def fetch_fmp_financials(ticker):
+# Provider endpoints; point these at replay_server.py for offline runs
+fmp_base_url = os.getenv("FMP_BASE_URL", "https://financialmodelingprep.com")
+openai_base_url = os.getenv("OPENAI_BASE_URL", "https://api.openai.com")
+
+def fetch_fmp_financials(ticker, period="annual"):
     financials = {}
 
-    income_url = f"https://financialmodelingprep.com/api/v3/income-statement/{ticker}?limit=1&apikey={fmp_api_key}"
-    financials['income_statement'] = requests.get(income_url).json()[0]
+    if period == "ttm":
+        # Sum the last four quarters for flows; take the latest quarter's balance sheet
+        income_url = f"{fmp_base_url}/api/v3/income-statement/{ticker}?period=quarter&limit=4&apikey={fmp_api_key}"
+        financials['income_statement'] = fmp_ttm_statement(requests.get(income_url).json(), "income_statement")
 
-    balance_url = f"https://financialmodelingprep.com/api/v3/balance-sheet-statement/{ticker}?limit=1&apikey={fmp_api_key}"
-    financials['balance_sheet'] = requests.get(balance_url).json()[0]
+        balance_url = f"{fmp_base_url}/api/v3/balance-sheet-statement/{ticker}?period=quarter&limit=1&apikey={fmp_api_key}"
+        financials['balance_sheet'] = requests.get(balance_url).json()[0]
+    else:
+        income_url = f"{fmp_base_url}/api/v3/income-statement/{ticker}?limit=1&apikey={fmp_api_key}"
+        financials['income_statement'] = requests.get(income_url).json()[0]
 
-    profile_url = f"https://financialmodelingprep.com/api/v3/profile/{ticker}?apikey={fmp_api_key}"
+        balance_url = f"{fmp_base_url}/api/v3/balance-sheet-statement/{ticker}?limit=1&apikey={fmp_api_key}"
+        financials['balance_sheet'] = requests.get(balance_url).json()[0]
+
+    profile_url = f"{fmp_base_url}/api/v3/profile/{ticker}?apikey={fmp_api_key}"
     profile_response = requests.get(profile_url).json()
     financials['overview'] = profile_response[0] if profile_response else {}
 
@@ -65,21 +72,16 @@ def calculate_financial_metrics(financials):
 
     return {
         "Price ($/share)": price,
-        "Market Cap ($M)": market_cap,
-        "Enterprise Value ($M)": ev,
-        "Sales ($M)": sales,
-        "EBITDA ($M)": ebitda,
-        "EBIT ($M)": ebit,
-        "Earnings ($M)": earnings
-    }
-
-def fetch_peers_from_openai(target_company, market_cap_usd):
-    url = "https://api.openai.com/v1/chat/completions"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {openai_api_key}"
+        "Market Cap ($)": market_cap,
+        "Enterprise Value ($)": ev,
+        "Sales ($)": sales,
+        "EBITDA ($)": ebitda,
+        "EBIT ($)": ebit,
+        "Earnings ($)": earnings
     }
 
+def openai_peer_payload(target_company, market_cap_usd):
+    """Chat completion request asking for peers of a target within ±50% of its market cap."""
     min_cap = market_cap_usd * 0.5
     max_cap = market_cap_usd * 1.5
 
@@ -92,14 +94,21 @@ def fetch_peers_from_openai(target_company, market_cap_usd):
     f"No commentary, no markdown, no code formatting — just the raw JSON array."
     )
 
-
-
-    payload = {
+    return {
         "model": "gpt-4o-mini",
         "messages": [{"role": "user", "content": prompt}],
         "temperature": 0.3
     }
 
+def fetch_peers_from_openai(target_company, market_cap_usd):
+    url = f"{openai_base_url}/v1/chat/completions"
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {openai_api_key}"
+    }
+
+    payload = openai_peer_payload(target_company, market_cap_usd)
+
     response = requests.post(url, headers=headers, json=payload)
     response_json = response.json()
 
@@ -115,49 +124,79 @@ def fetch_peers_from_openai(target_company, market_cap_usd):
     except Exception as e:
         raise Exception(f"Failed to fetch peers from OpenAI: {e}\nResponse: {response_json}")
 
-# === Step 1: Fetch Target Financials ===
-target_financials = fetch_fmp_financials(symbol)
-
-sector = target_financials['overview'].get("sector", "Unknown")
-industry = target_financials['overview'].get("industry", "Unknown")
-target_market_cap = get_value_safe(target_financials['overview'], "mktCap")
-
-target_metrics = calculate_financial_metrics(target_financials)
+def run_comparable_analysis(symbol, period="annual", output_folder=base_folder):
+    """
+    Fetches target and peer financials, computes comps metrics and saves
+    {symbol}_comparable_analysis.json. Returns the output path.
+
+    Concurrent runs for the same ticker (threads or processes) share one run: see storage.fetch_once.
+    """
+    os.makedirs(output_folder, exist_ok=True)
+    output_json_path = os.path.join(output_folder, f"{symbol}_comparable_analysis.json")
+    return fetch_once(symbol, "comparable_analysis", output_json_path,
+                      lambda: _build_comparable_analysis(symbol, period, output_folder, output_json_path),
+                      output_folder)
+
+def _build_comparable_analysis(symbol, period, output_folder, output_json_path):
+    # === Step 1: Fetch Target Financials ===
+    target_financials = fetch_fmp_financials(symbol, period)
+
+    sector = target_financials['overview'].get("sector", "Unknown")
+    industry = target_financials['overview'].get("industry", "Unknown")
+    target_market_cap = get_value_safe(target_financials['overview'], "mktCap")
+
+    target_metrics = calculate_financial_metrics(target_financials)
+
+    print(f"✅ {symbol} Sector: {sector}, Industry: {industry}, Market Cap: {target_market_cap:,.0f}")
+
+    # === Step 2: Fetch Peers from OpenAI ===
+    peers = fetch_peers_from_openai(symbol, target_market_cap)
+    print(f"✅ Peers fetched from OpenAI for {symbol}: {peers}")
+
+    # === Step 3: Fetch & Calculate Financial Metrics for Peers ===
+    peer_data = {}
+
+    for peer in peers:
+        peer_financials = fetch_fmp_financials(peer, period)
+        peer_metrics = calculate_financial_metrics(peer_financials)
+
+        peer_data[peer] = {
+            "financial_metrics": peer_metrics,
+            "overview": peer_financials['overview'],
+            "financials": peer_financials
+        }
+
+    # === Step 4: Save Comparable Analysis ===
+    comparable_analysis = {
+        "target": {
+            "ticker": symbol,
+            "period": period,
+            "industry": industry,
+            "sector": sector,
+            "market_cap": target_market_cap,
+            "financial_metrics": target_metrics,
+            "overview": target_financials['overview'],
+            "financials": target_financials
+        },
+        "peers": peer_data
+    }
 
-print(f"✅ {symbol} Sector: {sector}, Industry: {industry}, Market Cap: {target_market_cap:,.0f}")
+    atomic_write_json(output_json_path, comparable_analysis)
+    archive_payload(symbol, "comparable_analysis", comparable_analysis, data_folder=output_folder)
 
-# === Step 2: Fetch Peers from OpenAI ===
-peers = fetch_peers_from_openai(symbol, target_market_cap)
-print(f"✅ Peers fetched from OpenAI for {symbol}: {peers}")
+    print(f"\n✅ Comparable Analysis saved to: {output_json_path}")
 
-# === Step 3: Fetch & Calculate Financial Metrics for Peers ===
-peer_data = {}
+    # Publish to the shared comps store; running dashboards pick it up on their next read
+    update_comps_store([symbol], output_folder)
+    return output_json_path
 
-for peer in peers:
-    peer_financials = fetch_fmp_financials(peer)
-    peer_metrics = calculate_financial_metrics(peer_financials)
 
-    peer_data[peer] = {
-        "financial_metrics": peer_metrics,
-        "overview": peer_financials['overview'],
-        "financials": peer_financials
-    }
+# === Entry point when script is called directly ===
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Ticker symbol not provided.")
+        sys.exit(1)
 
-# === Step 4: Save Comparable Analysis ===
-comparable_analysis = {
-    "target": {
-        "ticker": symbol,
-        "industry": industry,
-        "sector": sector,
-        "market_cap": target_market_cap,
-        "financial_metrics": target_metrics,
-        "overview": target_financials['overview'],
-        "financials": target_financials
-    },
-    "peers": peer_data
-}
-
-with open(output_json_path, "w") as f:
-    json.dump(comparable_analysis, f, indent=4)
-
-print(f"\n✅ Comparable Analysis saved to: {output_json_path}")
+    symbol = sys.argv[1].upper()
+    period = sys.argv[2].lower() if len(sys.argv) > 2 else "annual"  # "annual" or "ttm"
+    run_comparable_analysis(symbol, period)
@@ -0,0 +1,274 @@
+import os
+import io
+import sys
+import json
+import time
+import threading
+import numpy as np
+import pandas as pd
+from units import comps_metrics_frame, to_float_array
+from storage import atomic_write_bytes, atomic_write_text, file_lock
+
+DATA_FOLDER = "data"
+POINTER_FILE = "CURRENT"        # names the live version file; replaced atomically
+KEEP_VERSIONS = 2               # older version files are removed after a rebuild
+STORE_LOCK = "comps-store"      # storage.file_lock name serialising writers
+
+# Only what the dashboard and the valuation stage read; the embedded FMP statements
+# (most of a *_comparable_analysis.json) are left out. Text widths are minimums: each
+# version is written with every text field as wide as its longest value.
+TEXT_FIELDS = [("target", 12), ("peer", 12), ("name", 80), ("sector", 48), ("industry", 64), ("image", 160)]
+RANK_FIELD = ("rank", "i4")     # peer order within the target's file
+NUMBER_FIELDS = ["price", "market_cap", "enterprise_value", "sales", "ebitda", "ebit", "earnings",
+                 "beta", "pretax_income", "tax_expense", "source_mtime"]
+PLACEHOLDER_RANK = -1           # a target without peers keeps one such row (no peer) to record its file mtime
+
+
+def _store_dtype(widths=None):
+    widths = widths or {}
+    return np.dtype([(name, f"U{max(width, widths.get(name, 0))}") for name, width in TEXT_FIELDS]
+                    + [RANK_FIELD] + [(name, "f8") for name in NUMBER_FIELDS])
+
+
+DTYPE = _store_dtype()
+
+# store folder → {"version", "rows" (read-only memmap)}; one per process,
+# shared by every Streamlit session and every call in a worker
+_loaded = {}
+_load_lock = threading.Lock()
+
+
+def store_folder(data_folder=DATA_FOLDER):
+    return os.path.join(data_folder, "cache", "comps")
+
+
+def _comp_path(ticker, data_folder):
+    return os.path.join(data_folder, f"{ticker}_comparable_analysis.json")
+
+
+def rows_from_comparable(comp_data, target=None, source_mtime=np.nan):
+    """
+    Projects one *_comparable_analysis.json payload into store rows (one per peer, or a
+    single PLACEHOLDER_RANK row if it has none). `target` defaults to the payload's own
+    ticker; pass the file's ticker to key by that.
+    """
+    target = target or comp_data.get("target", {}).get("ticker", "")
+    metrics = comps_metrics_frame(comp_data)
+    peers = comp_data.get("peers", {})
+    tickers = list(metrics.index)
+    if not tickers:
+        rows = np.zeros(1, dtype=_store_dtype({"target": len(target)}))
+        rows["target"] = target
+        rows["rank"] = PLACEHOLDER_RANK
+        for name in NUMBER_FIELDS:
+            rows[name] = np.nan
+        rows["source_mtime"] = source_mtime
+        return rows
+    overviews = [peers[t].get("overview", {}) for t in tickers]
+    income = [peers[t].get("financials", {}).get("income_statement", {}) for t in tickers]
+
+    text = {
+        "target": [target] * len(tickers),
+        "peer": tickers,
+        "name": [o.get("companyName") or t for o, t in zip(overviews, tickers)],
+        "sector": [o.get("sector") or "N/A" for o in overviews],
+        "industry": [o.get("industry") or "N/A" for o in overviews],
+        "image": [o.get("image") or "" for o in overviews],
+    }
+    rows = np.zeros(len(tickers), dtype=_store_dtype({name: max(map(len, values)) for name, values in text.items()}))
+    for name, values in text.items():
+        rows[name] = values
+    rows["rank"] = np.arange(len(tickers))
+    for name in metrics.columns:
+        rows[name] = metrics[name].to_numpy()
+    rows["beta"] = to_float_array([o.get("beta") for o in overviews])
+    rows["pretax_income"] = to_float_array([i.get("incomeBeforeTax") for i in income])
+    rows["tax_expense"] = to_float_array([i.get("incomeTaxExpense") for i in income])
+    rows["source_mtime"] = source_mtime
+    return rows
+
+
+# === Build / update ===
+def _concatenate(parts):
+    """Joins row arrays whose text fields may differ in width, at the widest of each."""
+    parts = [part for part in parts if len(part)]
+    if not parts:
+        return np.zeros(0, dtype=DTYPE)
+    widths = {name: max(part.dtype[name].itemsize // 4 for part in parts) for name, _ in TEXT_FIELDS}
+    dtype = _store_dtype(widths)
+    return np.concatenate([np.asarray(part).astype(dtype) for part in parts])
+
+
+def _write_version(rows, data_folder):
+    """Writes a new version file, then repoints CURRENT at it in one atomic rename."""
+    folder = store_folder(data_folder)
+    os.makedirs(folder, exist_ok=True)
+    rows = np.sort(rows, order=["target", "rank"])
+    version = f"comps-{time.time_ns()}.npy"
+
+    buffer = io.BytesIO()
+    np.save(buffer, rows)
+    atomic_write_bytes(os.path.join(folder, version), buffer.getvalue())
+    atomic_write_text(os.path.join(folder, POINTER_FILE), version)
+
+    # Readers that still map an old version keep it open; on Windows removal may fail
+    old_versions = sorted(f for f in os.listdir(folder) if f.startswith("comps-") and f.endswith(".npy"))
+    for name in old_versions[:-KEEP_VERSIONS]:
+        try:
+            os.remove(os.path.join(folder, name))
+        except OSError:
+            pass
+    return version
+
+
+def _read_rows(tickers, data_folder):
+    parts = []
+    for ticker in tickers:
+        path = _comp_path(ticker, data_folder)
+        if not os.path.exists(path):
+            continue
+        try:
+            with open(path, "r") as f:
+                parts.append(rows_from_comparable(json.load(f), ticker, os.stat(path).st_mtime))
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Skipping comps for {ticker}: {e}")
+    return _concatenate(parts)
+
+
+def build_comps_store(data_folder=DATA_FOLDER):
+    """Rebuilds the store from every *_comparable_analysis.json in data_folder."""
+    tickers = sorted(f.replace("_comparable_analysis.json", "") for f in os.listdir(data_folder)
+                     if f.endswith("_comparable_analysis.json"))
+    with file_lock(STORE_LOCK, data_folder):
+        return _write_version(_read_rows(tickers, data_folder), data_folder)
+
+
+def update_comps_store(tickers, data_folder=DATA_FOLDER):
+    """
+    Replaces the rows of `tickers` (as targets) with their current files and publishes a new version.
+    Read-modify-write runs under the store lock so concurrent updates do not drop each other's rows.
+    """
+    with file_lock(STORE_LOCK, data_folder):
+        current = load_comps_store(data_folder)
+        keep = current[~np.isin(current["target"], list(tickers))] if len(current) else current
+        return _write_version(_concatenate([keep, _read_rows(tickers, data_folder)]), data_folder)
+
+
+def ensure_comps_store(tickers, data_folder=DATA_FOLDER):
+    """Brings the rows of `tickers` up to date in one rebuild, if any file is newer than the store."""
+    rows = load_comps_store(data_folder)
+    stored = dict(zip(rows["target"].tolist(), rows["source_mtime"].tolist())) if len(rows) else {}
+    stale = []
+    for ticker in tickers:
+        path = _comp_path(ticker, data_folder)
+        if os.path.exists(path) and stored.get(ticker, -1) < os.stat(path).st_mtime:
+            stale.append(ticker)
+    if stale:
+        update_comps_store(stale, data_folder)
+    return stale
+
+
+def apply_quotes(quotes, data_folder=DATA_FOLDER):
+    """
+    Reprices peer rows from quote_service records ({ticker: {"price", "market_cap", ...}})
+    without re-reading any file: price, market cap (quoted, else scaled by the price move)
+    and enterprise value (moved by the change in market cap). Publishes a new version only
+    if a row changed; returns the number of rows repriced.
+    """
+    from quote_service import repriced_market_cap
+    with file_lock(STORE_LOCK, data_folder):
+        rows = np.array(load_comps_store(data_folder))
+        if not len(rows):
+            return 0
+        peers = rows["peer"].tolist()
+        prices = np.array([quotes[p]["price"] if p in quotes else np.nan for p in peers])
+        changed = np.isfinite(prices) & (prices != rows["price"])
+        if not changed.any():
+            return 0
+        quoted = np.array([quotes[p].get("market_cap", np.nan) if p in quotes else np.nan for p in peers])
+        market_cap = repriced_market_cap(rows["market_cap"], rows["price"], prices, quoted)
+        rows["enterprise_value"][changed] += market_cap[changed] - rows["market_cap"][changed]
+        rows["market_cap"][changed] = market_cap[changed]
+        rows["price"][changed] = prices[changed]
+        _write_version(rows, data_folder)
+        return int(changed.sum())
+
+
+# === Read ===
+def store_version(data_folder=DATA_FOLDER):
+    """Name of the current version file (None before the first build); changes on every publish."""
+    try:
+        with open(os.path.join(store_folder(data_folder), POINTER_FILE), "r") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def load_comps_store(data_folder=DATA_FOLDER):
+    """
+    The current store as a read-only memory-mapped structured array (sorted by target).
+    Re-mapped only when CURRENT names a new version, so a finished comps run is picked
+    up by the next call while earlier callers keep a consistent snapshot.
+    """
+    folder = store_folder(data_folder)
+    version = store_version(data_folder)
+    if version is None:
+        return np.zeros(0, dtype=DTYPE)
+
+    cached = _loaded.get(folder)
+    if cached is not None and cached["version"] == version:
+        return cached["rows"]
+
+    with _load_lock:
+        cached = _loaded.get(folder)
+        if cached is not None and cached["version"] == version:
+            return cached["rows"]
+        try:
+            rows = np.load(os.path.join(folder, version), mmap_mode="r")
+        except (OSError, ValueError):
+            return cached["rows"] if cached is not None else np.zeros(0, dtype=DTYPE)
+        _loaded[folder] = {"version": version, "rows": rows}
+        return rows
+
+
+def _target_slice(rows, ticker):
+    if not len(rows):
+        return 0, 0
+    return np.searchsorted(rows["target"], ticker, side="left"), np.searchsorted(rows["target"], ticker, side="right")
+
+
+def peer_rows(ticker, data_folder=DATA_FOLDER):
+    """Peer rows of one target, found by binary search; refreshed first if its file changed."""
+    rows = load_comps_store(data_folder)
+    if not ticker:
+        return rows[:0]
+    start, end = _target_slice(rows, ticker)
+    path = _comp_path(ticker, data_folder)
+    if os.path.exists(path) and (end == start or rows["source_mtime"][start] < os.stat(path).st_mtime):
+        update_comps_store([ticker], data_folder)
+        rows = load_comps_store(data_folder)
+        start, end = _target_slice(rows, ticker)
+    if end - start == 1 and rows["rank"][start] == PLACEHOLDER_RANK:
+        start = end
+    return rows[start:end]
+
+
+def peer_frame(ticker, data_folder=DATA_FOLDER):
+    """
+    Peers of `ticker` as a DataFrame indexed by peer ticker: the comps_metrics_frame
+    columns (raw $) plus name, sector, industry, image, beta, pretax_income and tax_expense.
+    """
+    rows = peer_rows(ticker, data_folder)
+    frame = pd.DataFrame({name: np.asarray(rows[name]) for name in rows.dtype.names if name not in ("target", "peer", "rank")},
+                         index=pd.Index(np.asarray(rows["peer"]).tolist(), name="ticker"))
+    return frame.drop(columns="source_mtime")
+
+
+# === Entry point when script is called directly ===
+if __name__ == "__main__":
+    folder = sys.argv[1] if len(sys.argv) > 1 else DATA_FOLDER
+    version = build_comps_store(folder)
+    rows = load_comps_store(folder)
+    print(f"✅ Comps store {version}: {np.sum(rows['rank'] != PLACEHOLDER_RANK)} peer rows for "
+          f"{len(np.unique(rows['target']))} targets "
+          f"({rows.nbytes / 1024:,.0f} KB)")
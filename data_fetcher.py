@@ -1,50 +1,61 @@
 import os
-import json
-import requests
 from dotenv import load_dotenv
+from schema import UNUSABLE, validate_financials, describe
+from providers import DEFAULT_PROVIDERS, fetch_financials
+from storage import atomic_write_json, fetch_once
+from archive import archive_payload
+from snapshots import write_snapshot
 
 # === Load API key from keys.env ===
 load_dotenv("keys.env")
 alpha_vantage_key = os.getenv("ALPHA_VANTAGE_API_KEY")
 
-def fetch_and_save_financials(symbol: str, api_key=alpha_vantage_key, output_folder="data"):
+def fetch_and_save_financials(symbol: str, api_key=alpha_vantage_key, output_folder="data",
+                              providers=DEFAULT_PROVIDERS, hedge_after=None):
     """
     Fetches financial statements and metadata for a given ticker using Alpha Vantage API
-    and saves them into a single JSON file.
+    (failing over to the other providers when it throttles or errors) and saves them
+    into a single JSON file.
 
     Parameters:
     - symbol: Ticker symbol (e.g., 'GOOGL')
     - api_key: Your Alpha Vantage API key (defaults to env)
     - output_folder: Directory where the JSON file will be saved
+    - providers: Provider names in order of preference (see providers.py)
+    - hedge_after: Seconds before a slow provider is hedged with the next one (None = no hedging)
+
+    Concurrent calls for the same ticker (threads or processes) share one fetch: see storage.fetch_once.
+    Raises ValueError if no provider replied and there is no earlier file to keep.
     """
     os.makedirs(output_folder, exist_ok=True)
-
-    urls = {
-        "balance_sheet": f"https://www.alphavantage.co/query?function=BALANCE_SHEET&symbol={symbol}&apikey={api_key}",
-        "income_statement": f"https://www.alphavantage.co/query?function=INCOME_STATEMENT&symbol={symbol}&apikey={api_key}",
-        "cash_flow": f"https://www.alphavantage.co/query?function=CASH_FLOW&symbol={symbol}&apikey={api_key}",
-        "overview": f"https://www.alphavantage.co/query?function=OVERVIEW&symbol={symbol}&apikey={api_key}",
-        "quote": f"https://www.alphavantage.co/query?function=GLOBAL_QUOTE&symbol={symbol}&apikey={api_key}"
-    }
-
-    financial_data = {}
-
-    for data_type, url in urls.items():
-        response = requests.get(url)
-        if response.status_code == 200:
-            data = response.json()
-            if "Information" in data or "Note" in data:
-                print(f"⚠️ API limit reached or data unavailable for {symbol} - {data_type}")
-                financial_data[data_type] = {"error": data.get("Information", data.get("Note", "Unknown error"))}
-            else:
-                financial_data[data_type] = data
-        else:
-            print(f"Failed to fetch {data_type} for {symbol}")
-            financial_data[data_type] = {"error": "Failed to fetch"}
-
     output_file = os.path.join(output_folder, f"{symbol.upper()}_financials.json")
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(financial_data, f, indent=4)
+    return fetch_once(symbol, "financials", output_file,
+                      lambda: _fetch_and_save(symbol, api_key, output_file, providers, hedge_after),
+                      output_folder)
+
+def _fetch_and_save(symbol, api_key, output_file, providers, hedge_after):
+    financial_data, attempts = fetch_financials(symbol, providers, hedge_after, {"alphavantage": api_key})
+    for attempt in attempts:
+        print(f"📡 {attempt['provider']}: {attempt['validation']['status']} in {attempt['seconds']:.2f}s")
+    if financial_data is None:
+        # No provider replied at all: an empty file would hide the errors from the scheduler,
+        # while a missing one stays re-queueable (schema.validate_ticker)
+        errors = [error for attempt in attempts for error in attempt["validation"]["errors"]]
+        if os.path.exists(output_file):
+            print(f"⚠️ Keeping existing {output_file}; no provider returned financials for {symbol}.")
+            return output_file
+        raise ValueError(f"No provider returned financials for {symbol}: {'; '.join(errors) or 'no reply'}")
+
+    # Validate once at ingest so bad payloads are classified before any model stage runs
+    validation = validate_financials(financial_data)
+    print(f"🔎 {describe(dict(validation, ticker=symbol.upper()))}")
+    if validation["status"] == UNUSABLE and os.path.exists(output_file):
+        print(f"⚠️ Keeping existing {output_file}; the new payload for {symbol} is unusable.")
+        return output_file
+
+    atomic_write_json(output_file, financial_data)
+    archive_payload(symbol, "financials", financial_data, data_folder=os.path.dirname(output_file) or ".")
+    write_snapshot(symbol.upper(), financial_data, os.path.dirname(output_file) or ".")
 
     print(f"✅ Financials saved to {output_file}")
     return output_file
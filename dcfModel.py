@@ -1,13 +1,20 @@
 import json
+import numpy as np
 import pandas as pd
 import requests
 from dcfExcel import write_to_excel
+from units import comps_metrics_frame, to_float_array
+from ttm import with_ttm_reports
+from schema import UNUSABLE, validate_financials
+from projection import load_projected
+from wacc import compute_wacc
+from assumptions import load_assumptions, size_premium as size_premium_lookup
 from contextlib import redirect_stdout
 import os
 from contextlib import redirect_stdout
 import os
 
-def dcf_data(ticker: str):
+def dcf_data(ticker: str, period: str = "annual"):
     # Prepare folder and file
     output_dir = "calculation data"
     os.makedirs(output_dir, exist_ok=True)
@@ -16,16 +23,25 @@ def dcf_data(ticker: str):
     # Redirect all print output to the file
     with open(log_file_path, "w", encoding="utf-8") as f:
         with redirect_stdout(f):
-            run_dcf_model(ticker)  # your main logic is moved to a helper function
+            run_dcf_model(ticker, period=period)  # your main logic is moved to a helper function
 
 
-def run_dcf_model(ticker: str):
+def run_dcf_model(ticker: str, period: str = "annual"):
     
     json_file_path = f"data/{ticker}_financials.json"
     comp_file_path = f"data/{ticker}_comparable_analysis.json"
 
-    with open(json_file_path, "r") as f:
-        financials = json.load(f)
+    # Only the latest annual reports (plus recent quarters for TTM) are parsed into memory
+    financials = load_projected(json_file_path, "dcf_ttm" if period == "ttm" else "dcf")
+
+    # Fail fast on unusable payloads (provider error stubs, missing statements) before any work
+    validation = validate_financials(financials)
+    if validation["status"] == UNUSABLE:
+        raise ValueError(f"{ticker} financials are unusable — missing: {', '.join(validation['missing'])}")
+
+    # TTM: swap annual reports for trailing-twelve-month windows built from quarterlies
+    if period == "ttm":
+        financials = with_ttm_reports(financials)
 
     with open(comp_file_path, "r") as f:
         comp_data = json.load(f)
@@ -40,6 +56,7 @@ def run_dcf_model(ticker: str):
 
 
     # === CORPORATE TAX RATE ===
+    income_before_tax = tax_expense = None
     try:
         income_before_tax = float(latest_report["incomeBeforeTax"])
         tax_expense = float(latest_report["incomeTaxExpense"])
@@ -55,58 +72,22 @@ def run_dcf_model(ticker: str):
 
     # === DISPLAY CORPORATE TAX RATE ===
     print("🏛️ Corporate Tax Rate Calculation:")
-    print(f"Income Before Tax: ${income_before_tax:,.0f}")
-    print(f"Income Tax Expense: ${tax_expense:,.0f}")
-    print(f"Tax Rate = {tax_expense:,.0f} ÷ {income_before_tax:,.0f} = {tax_rate_corp:.2%}\n")
-
-    def get_size_premium_from_json(financials):
-        """
-        Automatically fetches the market cap from financials JSON and returns the estimated size premium.
-        """
-        try:
-            market_cap_str = financials["overview"]["MarketCapitalization"]
-            market_cap = float(market_cap_str)
-        except (KeyError, ValueError):
-            print("Market Capitalization not available or invalid.")
-            return 0.0
-
-        # Market cap brackets in USD (Duff & Phelps)
-        brackets = [
-            (float('inf'), 264_000_000_000),
-            (264_000_000_000, 51_900_000_000),
-            (51_900_000_000, 20_600_000_000),
-            (20_600_000_000, 11_700_000_000),
-            (11_700_000_000, 7_700_000_000),
-            (7_700_000_000, 4_500_000_000),
-            (4_500_000_000, 2_550_000_000),
-            (2_550_000_000, 1_100_000_000),
-            (1_100_000_000, 500_000_000),
-            (500_000_000, 0)
-        ]
-
-        size_premiums = [
-            0.00,
-            0.20,
-            0.45,
-            0.70,
-            0.95,
-            1.20,
-            1.65,
-            2.25,
-            3.25,
-            5.00
-        ]
-
-        for i, (upper, lower) in enumerate(brackets):
-            if lower <= market_cap < upper:
-                premium = size_premiums[i]
-                print(f"🏷️ Market Cap: ${market_cap:,.0f} → Size Premium: {premium:.2f}%")
-                return premium
-
-        print("⚠️ Market cap did not match any bracket. Defaulting to 0.00%.")
-        return 0.0
-
-    size_premium = get_size_premium_from_json(financials)
+    if tax_rate_corp is not None:
+        print(f"Income Before Tax: ${income_before_tax:,.0f}")
+        print(f"Income Tax Expense: ${tax_expense:,.0f}")
+        print(f"Tax Rate = {tax_expense:,.0f} ÷ {income_before_tax:,.0f} = {tax_rate_corp:.2%}\n")
+    else:
+        print("Tax Rate: Data not available.\n")
+
+    # === SIZE PREMIUM (market-cap bracket from the dated assumptions table) ===
+    assumptions = load_assumptions()
+    market_cap = to_float_array([financials.get("overview", {}).get("MarketCapitalization")])[0]
+    size_premium = float(size_premium_lookup([market_cap], assumptions)[0])
+    if np.isnan(market_cap):
+        print("Market Capitalization not available or invalid.")
+    else:
+        print(f"🏷️ Market Cap: ${market_cap:,.0f} → Size Premium: {size_premium:.2%} "
+              f"(assumptions {assumptions['version']})")
 
 
     # === NET SALES (Latest Year: 2024A) ===
@@ -114,6 +95,7 @@ def run_dcf_model(ticker: str):
         revenue_2024 = float(latest_report["totalRevenue"])
         print(f"🟢 2024A Net Sales (Total Revenue): ${revenue_2024:,.0f}\n")
     except (KeyError, ValueError):
+        revenue_2024 = None
         print("🟢 2024A Net Sales: Data not available.\n")
 
     # === NET SALES (3 years back, 2 years back, 1 year back) ===
@@ -194,16 +176,16 @@ def run_dcf_model(ticker: str):
     import pandas as pd
 
     # === PARSE PEER METRICS ===
+    # Comps metrics are stored in raw dollars; convert the whole peer set once.
+    peer_frame = comps_metrics_frame(comp_data)
+    peer_frame["market_debt"] = peer_frame["enterprise_value"] - peer_frame["market_cap"]  # EV - Equity = Debt (simplified)
+
     peer_summary = []
 
     for peer_ticker, peer in comp_data["peers"].items():
         name = peer.get("overview", {}).get("companyName", "N/A")
         beta = peer.get("overview", {}).get("beta", "N/A")
         
-        # Financial Metrics
-        market_cap_m = peer.get("financial_metrics", {}).get("Market Cap ($M)", 0)
-        enterprise_value_m = peer.get("financial_metrics", {}).get("Enterprise Value ($M)", 0)
-        
         # Income Statement data for Tax Rate
         income_statement = peer.get("financials", {}).get("income_statement", {})
         income_before_tax = income_statement.get("incomeBeforeTax", 0)
@@ -215,16 +197,12 @@ def run_dcf_model(ticker: str):
         else:
             tax_rate = "N/A"  # In case of zero or missing data
 
-        # Market value calculations
-        market_equity = market_cap_m * 1_000_000
-        market_debt = (enterprise_value_m - market_cap_m) * 1_000_000  # EV - Equity = Debt (simplified)
-
         peer_summary.append({
             "Ticker": peer_ticker,
             "Company Name": name,
             "Beta (Leveraged)": beta,
-            "Market Value of Equity ($)": round(market_equity, 2),
-            "Market Value of Debt ($)": round(market_debt, 2),
+            "Market Value of Equity ($)": round(float(peer_frame.at[peer_ticker, "market_cap"]), 2),
+            "Market Value of Debt ($)": round(float(peer_frame.at[peer_ticker, "market_debt"]), 2),
             "Tax Rate": tax_rate  # Add Tax Rate
         })
 
@@ -258,18 +236,26 @@ def run_dcf_model(ticker: str):
             return 0.0
 
     interest_expense = safe_float(financials['income_statement']['annualReports'][0].get('interestExpense'))
-    long_term_debt = float(financials['balance_sheet']['annualReports'][0]['longTermDebt'])  # Long-term Debt
+    long_term_debt = safe_float(financials['balance_sheet']['annualReports'][0].get('longTermDebt'))  # Long-term Debt
 
-    # Calculate the Cost of Debt (Rd)
-    cost_of_debt = interest_expense / long_term_debt
+    # Calculate the Cost of Debt (Rd); no long-term debt → no meaningful Rd
+    cost_of_debt = interest_expense / long_term_debt if long_term_debt > 0 else 0.0
 
     # Calculate the After-Tax Cost of Debt
-    after_tax_cost_of_debt = cost_of_debt * (1 - tax_rate_corp)
+    after_tax_cost_of_debt = cost_of_debt * (1 - (tax_rate_corp or 0.0))
 
     # Output the results
     print(f"\n🔴 Cost of Debt (Rd): {cost_of_debt:.2%}")
     print(f"🔴 After-Tax Cost of Debt: {after_tax_cost_of_debt:.2%}")
 
+    # === WACC (all peers, Hamada unlever / relever) ===
+    wacc_result = compute_wacc(comp_data, tax_rate_corp or 0.0, cost_of_debt, size_premium, assumptions)
+    print(f"\n🧮 WACC from {wacc_result['peer_count']:.0f} peer(s):")
+    print(f"Median / Mean Unlevered Beta: {wacc_result['median_unlevered_beta']:.3f} / {wacc_result['mean_unlevered_beta']:.3f}")
+    print(f"Relevered Beta: {wacc_result['relevered_beta']:.3f}")
+    print(f"Cost of Equity (incl. size premium): {wacc_result['cost_of_equity']:.2%}")
+    print(f"WACC: {wacc_result['wacc']:.2%}")
+
 
     # === CAPITAL EXPENDITURES (CAPEX): 2024A to 3 years back ===
     print("\n🏗️ Capital Expenditures (Capex):")
@@ -407,7 +393,7 @@ def run_dcf_model(ticker: str):
 
 
 
-def dcf_data(ticker: str):
+def dcf_data(ticker: str, period: str = "annual"):
     # Prepare folder and file
     output_dir = "calculation data"
     os.makedirs(output_dir, exist_ok=True)
@@ -416,7 +402,7 @@ def dcf_data(ticker: str):
     # Redirect all print output to the file
     with open(log_file_path, "w", encoding="utf-8") as f:
         with redirect_stdout(f):
-            run_dcf_model(ticker)  # your main logic is moved to a helper function
+            run_dcf_model(ticker, period=period)  # your main logic is moved to a helper function
 
 
 
@@ -0,0 +1,161 @@
+import sys
+import time
+import numpy as np
+import pandas as pd
+from units import to_float_array
+
+DEFAULT_PREMIUMS = [0.10, 0.20, 0.30, 0.40, 0.50]      # offer premium over the target's price
+DEFAULT_CASH_MIXES = [0.0, 0.25, 0.50, 1.0]            # share of the purchase price paid in cash
+DEFAULT_DEBT_RATE = 0.06        # pre-tax financing rate when the acquirer has no usable cost of debt
+DEFAULT_TAX_RATE = 0.21
+MAX_CELLS = 250_000             # acquirer × target × scenario cells per chunk (cache-sized chunks run fastest)
+
+COMPANY_FIELDS = ["price", "shares_outstanding", "net_income", "tax_rate", "cost_of_debt", "dcf_price"]
+
+
+def company_arrays(records):
+    """
+    Deal inputs from valuation records (batch.value_tickers / batch_results.json rows):
+    {"ticker": [...], field: (n,) float array} for COMPANY_FIELDS.
+    """
+    records = list(records.to_dict("records") if isinstance(records, pd.DataFrame) else records)
+    arrays = {"ticker": [r["ticker"] for r in records]}
+    for field in COMPANY_FIELDS:
+        arrays[field] = to_float_array([r.get(field) for r in records])
+    return arrays
+
+
+def deal_matrix(acquirers, targets, premiums=DEFAULT_PREMIUMS, cash_mixes=DEFAULT_CASH_MIXES, synergies=0.0):
+    """
+    Pro-forma EPS accretion / dilution for every acquirer × target × premium × cash mix,
+    as broadcast arrays shaped (A, T, P, M).
+
+    Offer = target price × (1 + premium). The stock portion issues acquirer shares at its
+    current price; the cash portion is debt-financed at the acquirer's cost of debt, after
+    tax. Pro-forma EPS = (NI_a + NI_t + synergies × (1 − t) − financing cost) / (S_a + new shares).
+
+    Parameters:
+    - acquirers, targets: company_arrays() dicts
+    - premiums, cash_mixes: Scenario grids, as fractions
+    - synergies: Pre-tax run-rate synergies ($), scalar or broadcastable to (A, T)
+
+    Returns a dict with accretion, pro_forma_eps, offer_price, purchase_price,
+    new_shares, breakeven_synergies (pre-tax $ that make the deal EPS-neutral; 0 if
+    already accretive) and premium_to_dcf (offer vs the target's DCF value).
+    Pairs of a company with itself are NaN.
+    """
+    a = {k: np.asarray(v, dtype=float)[:, None, None, None] for k, v in acquirers.items() if k != "ticker"}
+    t = {k: np.asarray(v, dtype=float)[None, :, None, None] for k, v in targets.items() if k != "ticker"}
+    premium = np.asarray(premiums, dtype=float)[None, None, :, None]
+    cash = np.asarray(cash_mixes, dtype=float)[None, None, None, :]
+    synergies = np.asarray(synergies, dtype=float)
+    if synergies.ndim == 2:
+        synergies = synergies[:, :, None, None]
+
+    tax = np.where(np.isnan(a["tax_rate"]), DEFAULT_TAX_RATE, np.clip(a["tax_rate"], 0, 1))
+    debt_rate = np.where(np.isnan(a["cost_of_debt"]) | (a["cost_of_debt"] <= 0), DEFAULT_DEBT_RATE, a["cost_of_debt"])
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        offer_price = t["price"] * (1 + premium)
+        purchase_price = offer_price * t["shares_outstanding"]
+        new_shares = (1 - cash) * purchase_price / a["price"]
+        financing_cost = cash * purchase_price * debt_rate * (1 - tax)
+        standalone_eps = a["net_income"] / a["shares_outstanding"]
+        pro_forma_shares = a["shares_outstanding"] + new_shares
+        combined_income = a["net_income"] + t["net_income"] - financing_cost
+        pro_forma_eps = (combined_income + synergies * (1 - tax)) / pro_forma_shares
+        accretion = (pro_forma_eps - standalone_eps) / np.abs(standalone_eps)  # sign-correct for loss-makers
+        breakeven = np.maximum((standalone_eps * pro_forma_shares - combined_income) / (1 - tax), 0)
+        premium_to_dcf = offer_price / t["dcf_price"] - 1
+        premium_to_dcf = np.where(t["dcf_price"] > 0, premium_to_dcf, np.nan)
+
+    self_pair = (np.array(acquirers["ticker"], dtype=object)[:, None]
+                 == np.array(targets["ticker"], dtype=object)[None, :])[:, :, None, None]
+    shape = np.broadcast_shapes(accretion.shape, (len(acquirers["ticker"]), len(targets["ticker"]),
+                                                  len(premiums), len(cash_mixes)))
+
+    def out(values):
+        return np.where(self_pair, np.nan, np.broadcast_to(values, shape))
+
+    return {
+        "accretion": out(accretion),
+        "pro_forma_eps": out(pro_forma_eps),
+        "offer_price": out(offer_price),
+        "purchase_price": out(purchase_price),
+        "new_shares": out(new_shares),
+        "breakeven_synergies": out(breakeven),
+        "premium_to_dcf": out(premium_to_dcf),
+    }
+
+
+def _slice(arrays, start, end):
+    return {k: v[start:end] for k, v in arrays.items()}
+
+
+def iter_deal_matrix(acquirers, targets, premiums=DEFAULT_PREMIUMS, cash_mixes=DEFAULT_CASH_MIXES,
+                     synergies=0.0, max_cells=MAX_CELLS):
+    """
+    deal_matrix() in target chunks of at most `max_cells` cells, for grids that do not fit
+    in memory at once. Yields (target_start, target_end, result) with result shaped
+    (A, end − start, P, M). Per-pair `synergies` must then be scalar.
+    """
+    per_target = max(1, len(acquirers["ticker"]) * len(premiums) * len(cash_mixes))
+    step = max(1, max_cells // per_target)
+    for start in range(0, len(targets["ticker"]), step):
+        end = min(start + step, len(targets["ticker"]))
+        yield start, end, deal_matrix(acquirers, _slice(targets, start, end), premiums, cash_mixes, synergies)
+
+
+def screen_deals(acquirers, targets, premiums=DEFAULT_PREMIUMS, cash_mixes=DEFAULT_CASH_MIXES, synergies=0.0,
+                 max_cells=MAX_CELLS):
+    """
+    One row per acquirer × target pair summarising its scenario grid: worst / best
+    accretion (with the premium and cash mix of the best), share of accretive scenarios,
+    the largest synergies needed to break even, and the premium to DCF at the first premium.
+    Computed chunk by chunk, so only the (A, T) summary is ever held for the full grid.
+    """
+    premiums, cash_mixes = np.asarray(premiums, dtype=float), np.asarray(cash_mixes, dtype=float)
+    parts = []
+    for start, end, result in iter_deal_matrix(acquirers, targets, premiums, cash_mixes, synergies, max_cells):
+        accretion = result["accretion"].reshape(*result["accretion"].shape[:2], -1)
+        has_value = ~np.all(np.isnan(accretion), axis=-1)
+        best = np.argmax(np.where(np.isnan(accretion), -np.inf, accretion), axis=-1)
+        with np.errstate(invalid="ignore"):
+            part = {
+                "acquirer": np.repeat(acquirers["ticker"], end - start),
+                "target": np.tile(targets["ticker"][start:end], len(acquirers["ticker"])),
+                "min_accretion": np.where(has_value, np.nanmin(np.where(np.isnan(accretion), np.inf, accretion), -1), np.nan),
+                "max_accretion": np.where(has_value, np.take_along_axis(accretion, best[..., None], -1)[..., 0], np.nan),
+                "best_premium": np.where(has_value, premiums[best // len(cash_mixes)], np.nan),
+                "best_cash_mix": np.where(has_value, cash_mixes[best % len(cash_mixes)], np.nan),
+                "accretive_share": np.where(has_value, np.mean(accretion > 0, axis=-1), np.nan),
+                "max_breakeven_synergies": np.where(
+                    has_value, np.nanmax(np.where(np.isnan(accretion), -np.inf,
+                                                  result["breakeven_synergies"].reshape(accretion.shape)), -1), np.nan),
+                "premium_to_dcf": result["premium_to_dcf"][:, :, 0, 0],
+            }
+        parts.append(pd.DataFrame({k: np.ravel(v) for k, v in part.items()}))
+    if not parts:
+        return pd.DataFrame(columns=["acquirer", "target"])
+    frame = pd.concat(parts, ignore_index=True)
+    return frame[frame["acquirer"] != frame["target"]].sort_values(["acquirer", "target"]).reset_index(drop=True)
+
+
+# === Entry point when script is called directly ===
+if __name__ == "__main__":
+    # python deal_screen.py AAPL,MSFT [TARGET ...]   (targets default to every ticker in data/)
+    from batch import value_tickers, available_tickers
+    if len(sys.argv) < 2:
+        print("Usage: python deal_screen.py ACQUIRER[,ACQUIRER...] [TARGET ...]")
+        sys.exit(1)
+    acquirer_tickers = [t.upper() for t in sys.argv[1].split(",")]
+    target_tickers = [t.upper() for t in sys.argv[2:]] or available_tickers()
+    records = {r["ticker"]: r for r in value_tickers(sorted(set(acquirer_tickers + target_tickers)))}
+
+    started = time.perf_counter()
+    screen = screen_deals(company_arrays([records[t] for t in acquirer_tickers if t in records]),
+                          company_arrays([records[t] for t in target_tickers if t in records]))
+    print(f"⏱️ {len(screen)} pairs × {len(DEFAULT_PREMIUMS) * len(DEFAULT_CASH_MIXES)} scenarios "
+          f"in {time.perf_counter() - started:.3f}s")
+    with pd.option_context("display.width", 160, "display.max_columns", 20, "display.float_format", "{:.3f}".format):
+        print(screen.sort_values("max_accretion", ascending=False).to_string(index=False))
@@ -0,0 +1,388 @@
+import os
+import sys
+import time
+import pickle
+import socket
+import sqlite3
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+DATA_FOLDER = "data"
+QUEUE_PATH = os.path.join(DATA_FOLDER, "cache", "queue", "tasks.sqlite")
+BACKENDS = ("serial", "threads", "processes", "queue")
+
+DEFAULT_CHUNK_SIZE = {"fetch": 1, "comps": 1, "valuation": 100, "export": 1}
+LEASE_SECONDS = 120         # a claimed task returns to the queue if its worker stops heartbeating
+POLL_SECONDS = 0.2
+MAX_ATTEMPTS = 3
+
+QUEUE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    key TEXT PRIMARY KEY,
+    stage TEXT NOT NULL,
+    task BLOB NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result BLOB,
+    error TEXT,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS task_status ON tasks (status, lease_until);
+"""
+
+
+# === Stages ===
+# Each stage runs over a chunk of tickers and returns one result per ticker. They are
+# imported lazily so a worker only loads what its tasks need.
+def stage_fetch(tickers, data_folder, options):
+    from data_fetcher import fetch_and_save_financials
+    return [fetch_and_save_financials(ticker, output_folder=data_folder) for ticker in tickers]
+
+
+def stage_comps(tickers, data_folder, options):
+    from comparable_company_analysis import run_comparable_analysis
+    return [run_comparable_analysis(ticker, options.get("period", "annual"), data_folder) for ticker in tickers]
+
+
+def stage_valuation(tickers, data_folder, options):
+    """Extraction and valuation together, so extracted inputs never cross the queue."""
+    from batch import value_tickers
+    return value_tickers(tickers, options.get("wacc"), data_folder, max_workers=1, as_of=options.get("as_of"),
+                         beta_source=options.get("beta_source", "provider"),
+                         live_quotes=options.get("live_quotes", False))
+
+
+def stage_export(tickers, data_folder, options):
+    from dcfModel import dcf_data
+    results = []
+    for ticker in tickers:
+        dcf_data(ticker, options.get("period", "annual"))
+        results.append(ticker)
+    return results
+
+
+STAGES = {
+    "fetch": stage_fetch,
+    "comps": stage_comps,
+    "valuation": stage_valuation,
+    "export": stage_export,
+}
+
+
+# === Tasks ===
+def _fingerprint(ticker, data_folder):
+    """Size and mtime of a ticker's input files; any rewrite changes the task key."""
+    parts = []
+    for suffix in ("financials", "comparable_analysis"):
+        path = os.path.join(data_folder, f"{ticker}_{suffix}.json")
+        if os.path.exists(path):
+            stat = os.stat(path)
+            parts.append(f"{suffix}:{stat.st_size}:{stat.st_mtime_ns}")
+    return parts
+
+
+def _shared_inputs(stage, tickers, data_folder, options):
+    """
+    Inputs a valuation or export task reads besides the tickers' own files: the market
+    assumptions file in effect (valuation honours options["as_of"], export uses the latest)
+    and, for valuation, the comps store version (repriced on every quote refresh), the
+    quote cache when live quotes are on, and the peer and benchmark charts behind
+    regression betas.
+    """
+    from assumptions import load_assumptions, ASSUMPTIONS_FOLDER
+    version = load_assumptions(options.get("as_of") if stage == "valuation" else None)["version"]
+    stat = os.stat(os.path.join(ASSUMPTIONS_FOLDER, f"{version}.json"))
+    inputs = [f"assumptions:{version}:{stat.st_size}:{stat.st_mtime_ns}"]
+    if stage == "valuation":
+        from comps_store import store_version
+        inputs.append(f"comps:{store_version(data_folder)}")
+        if options.get("live_quotes"):
+            from quote_service import quotes_version
+            inputs.append(f"quotes:{quotes_version(data_folder)}")
+        if options.get("beta_source") == "regression":
+            from comps_store import peer_frame
+            from returns_analytics import BENCHMARK_TICKER
+            peers = sorted({peer for ticker in tickers for peer in peer_frame(ticker, data_folder).index})
+            for peer in peers + [BENCHMARK_TICKER]:
+                path = os.path.join(data_folder, f"{peer}_chart.json")
+                if os.path.exists(path):
+                    stat = os.stat(path)
+                    inputs.append(f"chart:{peer}:{stat.st_size}:{stat.st_mtime_ns}")
+    return inputs
+
+
+def task_key(stage, tickers, data_folder=DATA_FOLDER, options=None):
+    """
+    Idempotent key for (stage, tickers, input hash). Fetch and comps tasks hash the
+    calendar day (one refresh per day); valuation and export hash every input they read
+    (the tickers' files and the shared inputs above), so rerunning over unchanged inputs
+    reuses the stored results.
+    """
+    options = options or {}
+    digest = hashlib.sha1(f"{stage}|{','.join(tickers)}|{os.path.abspath(data_folder)}|".encode())
+    digest.update(repr(sorted(options.items())).encode())
+    if stage in ("fetch", "comps"):
+        digest.update(time.strftime("%Y-%m-%d").encode())
+    else:
+        for ticker in tickers:
+            digest.update("|".join(_fingerprint(ticker, data_folder)).encode())
+        digest.update("|".join(_shared_inputs(stage, tickers, data_folder, options)).encode())
+    return f"{stage}:{tickers[0] if len(tickers) == 1 else len(tickers)}:{digest.hexdigest()[:16]}"
+
+
+def make_tasks(stage, tickers, data_folder=DATA_FOLDER, options=None, chunk_size=None):
+    chunk_size = chunk_size or DEFAULT_CHUNK_SIZE.get(stage, 1)
+    options = options or {}
+    chunks = [tickers[i:i + chunk_size] for i in range(0, len(tickers), chunk_size)]
+    return [{"key": task_key(stage, chunk, data_folder, options), "stage": stage, "tickers": chunk,
+             "data_folder": data_folder, "options": options} for chunk in chunks]
+
+
+def execute_task(task):
+    return STAGES[task["stage"]](task["tickers"], task["data_folder"], task["options"])
+
+
+# === Shared work queue (SQLite) ===
+# submit_tasks / claim_task / complete_task / fail_task / collect_results are the whole
+# queue interface; a Redis-backed queue only has to provide the same five operations.
+def _connect(queue_path):
+    os.makedirs(os.path.dirname(queue_path), exist_ok=True)
+    connection = sqlite3.connect(queue_path, timeout=60, isolation_level=None)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.executescript(QUEUE_SCHEMA)
+    return connection
+
+
+def submit_tasks(tasks, queue_path=QUEUE_PATH):
+    """
+    Enqueues tasks by key. A key that is already queued, running or done is left alone
+    (idempotent resubmission); a failed one is re-queued with a fresh attempt budget.
+    """
+    connection = _connect(queue_path)
+    try:
+        now = time.time()
+        connection.execute("BEGIN IMMEDIATE")
+        connection.executemany("INSERT OR IGNORE INTO tasks (key, stage, task, updated) VALUES (?, ?, ?, ?)",
+                               [(t["key"], t["stage"], pickle.dumps(t), now) for t in tasks])
+        connection.executemany("UPDATE tasks SET status = 'pending', attempts = 0, error = NULL, updated = ? "
+                               "WHERE key = ? AND status = 'failed'", [(now, t["key"]) for t in tasks])
+        connection.execute("COMMIT")
+    finally:
+        connection.close()
+
+
+def claim_task(queue_path=QUEUE_PATH, worker=None, stages=None):
+    """Claims the oldest pending task (or one whose lease expired). Returns the task or None."""
+    connection = _connect(queue_path)
+    try:
+        now = time.time()
+        query = ("SELECT key, task FROM tasks WHERE (status = 'pending' OR (status = 'running' AND lease_until < ?))")
+        params = [now]
+        if stages:
+            query += f" AND stage IN ({','.join('?' * len(stages))})"
+            params += list(stages)
+        connection.execute("BEGIN IMMEDIATE")
+        row = connection.execute(query + " ORDER BY updated LIMIT 1", params).fetchone()
+        if row is None:
+            connection.execute("COMMIT")
+            return None
+        connection.execute("UPDATE tasks SET status = 'running', worker = ?, lease_until = ?, updated = ? WHERE key = ?",
+                           (worker, now + LEASE_SECONDS, now, row[0]))
+        connection.execute("COMMIT")
+        return pickle.loads(row[1])
+    finally:
+        connection.close()
+
+
+def _extend_lease(key, queue_path, worker):
+    connection = _connect(queue_path)
+    try:
+        connection.execute("UPDATE tasks SET lease_until = ? WHERE key = ? AND worker = ? AND status = 'running'",
+                           (time.time() + LEASE_SECONDS, key, worker))
+    finally:
+        connection.close()
+
+
+def complete_task(key, result, queue_path=QUEUE_PATH):
+    connection = _connect(queue_path)
+    try:
+        connection.execute("UPDATE tasks SET status = 'done', result = ?, error = NULL, lease_until = NULL, "
+                           "updated = ? WHERE key = ?", (pickle.dumps(result), time.time(), key))
+    finally:
+        connection.close()
+
+
+def fail_task(key, error, queue_path=QUEUE_PATH):
+    """Returns the task to the queue, or marks it failed after MAX_ATTEMPTS."""
+    connection = _connect(queue_path)
+    try:
+        connection.execute("UPDATE tasks SET attempts = attempts + 1, error = ?, lease_until = NULL, updated = ?, "
+                           "status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END WHERE key = ?",
+                           (error, time.time(), MAX_ATTEMPTS, key))
+    finally:
+        connection.close()
+
+
+def collect_results(keys, queue_path=QUEUE_PATH):
+    """key → {"status", "result", "error"} for the given keys."""
+    connection = _connect(queue_path)
+    try:
+        rows = []
+        for i in range(0, len(keys), 500):  # SQLite caps bound parameters per statement
+            batch = keys[i:i + 500]
+            rows += connection.execute(f"SELECT key, status, result, error FROM tasks WHERE key IN "
+                                       f"({','.join('?' * len(batch))})", batch).fetchall()
+    finally:
+        connection.close()
+    return {key: {"status": status, "result": pickle.loads(result) if result is not None else None, "error": error}
+            for key, status, result, error in rows}
+
+
+def queue_status(queue_path=QUEUE_PATH):
+    """Task counts by (stage, status)."""
+    connection = _connect(queue_path)
+    try:
+        return connection.execute("SELECT stage, status, COUNT(*) FROM tasks GROUP BY stage, status "
+                                  "ORDER BY stage, status").fetchall()
+    finally:
+        connection.close()
+
+
+def run_worker(queue_path=QUEUE_PATH, worker=None, stages=None, idle_exit=None):
+    """
+    Worker loop for one node process: claim a task, run it, store the result, repeat.
+    The lease is renewed while a task runs, so a crashed worker's task is picked up
+    by another node after LEASE_SECONDS. Exits after `idle_exit` idle seconds (None = never).
+    """
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+    idle_since = time.time()
+    while True:
+        task = claim_task(queue_path, worker, stages)
+        if task is None:
+            if idle_exit is not None and time.time() - idle_since > idle_exit:
+                return
+            time.sleep(POLL_SECONDS)
+            continue
+
+        done = threading.Event()
+
+        def heartbeat(key=task["key"]):
+            while not done.wait(LEASE_SECONDS / 3):
+                _extend_lease(key, queue_path, worker)
+
+        threading.Thread(target=heartbeat, daemon=True).start()
+        try:
+            complete_task(task["key"], execute_task(task), queue_path)
+        except Exception as e:
+            print(f"❌ {worker}: {task['key']} failed: {e}")
+            fail_task(task["key"], f"{type(e).__name__}: {e}", queue_path)
+        finally:
+            done.set()
+        idle_since = time.time()
+
+
+def _run_on_queue(tasks, queue_path, local_workers, timeout):
+    submit_tasks(tasks, queue_path)
+    keys = [t["key"] for t in tasks]
+    helpers = [multiprocessing.Process(target=run_worker, args=(queue_path, None, None, 1.0), daemon=True)
+               for _ in range(local_workers)]
+    for helper in helpers:
+        helper.start()
+    started = time.time()
+    try:
+        while True:
+            states = collect_results(keys, queue_path)
+            if all(states[k]["status"] in ("done", "failed") for k in keys):
+                break
+            if timeout is not None and time.time() - started > timeout:
+                raise TimeoutError(f"{sum(s['status'] not in ('done', 'failed') for s in states.values())} "
+                                   f"task(s) still queued after {timeout}s")
+            time.sleep(POLL_SECONDS)
+    finally:
+        for helper in helpers:
+            helper.join(timeout=5)
+    return [states[k] for k in keys]
+
+
+# === Run a stage ===
+def _attempt(task):
+    """Runs one task in-process; failures are returned rather than raised, like queued tasks."""
+    try:
+        return {"status": "done", "result": execute_task(task), "error": None}
+    except Exception as e:
+        return {"status": "failed", "result": None, "error": f"{type(e).__name__}: {e}"}
+
+
+def run_stage(stage, tickers, backend="processes", data_folder=DATA_FOLDER, options=None, chunk_size=None,
+              max_workers=None, queue_path=QUEUE_PATH, local_workers=None, timeout=None):
+    """
+    Runs one pipeline stage over `tickers` on the chosen backend and returns the
+    per-ticker results in order (tickers whose task failed are left out).
+
+    Parameters:
+    - stage: One of STAGES (fetch, comps, valuation, export)
+    - backend: serial | threads | processes | queue
+    - options: Stage options (e.g. {"as_of": "2025-04-20"} for valuation)
+    - chunk_size: Tickers per task (default per stage: DEFAULT_CHUNK_SIZE)
+    - max_workers: Pool size for the threads / processes backends
+    - queue_path: Shared SQLite queue for the queue backend; workers on other nodes
+      run `python executor.py worker --queue=<path>` against the same file and data folder
+    - local_workers: Worker processes this node starts for the queue backend
+      (default: one per CPU; 0 = rely on other nodes)
+    - timeout: Seconds to wait for queued tasks (None = no limit)
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+    if stage not in STAGES:
+        raise ValueError(f"Unknown stage {stage!r}; expected one of {', '.join(STAGES)}")
+    tasks = make_tasks(stage, tickers, data_folder, options, chunk_size)
+    if not tasks:
+        return []
+
+    if backend == "queue":
+        if local_workers is None:
+            local_workers = os.cpu_count() or 1
+        outcomes = _run_on_queue(tasks, queue_path, local_workers, timeout)
+    elif backend == "serial" or len(tasks) == 1:
+        outcomes = [_attempt(task) for task in tasks]
+    else:
+        pool_class = ThreadPoolExecutor if backend == "threads" else ProcessPoolExecutor
+        with pool_class(max_workers=max_workers) as pool:
+            outcomes = list(pool.map(_attempt, tasks))
+
+    results = []
+    for task, outcome in zip(tasks, outcomes):
+        if outcome["status"] == "done":
+            results += outcome["result"]
+        else:
+            print(f"❌ {stage} failed for {', '.join(task['tickers'])}: {outcome['error']}")
+    return results
+
+
+def _option(name, default):
+    """Value of a "--name=value" command-line option."""
+    for arg in sys.argv[1:]:
+        if arg.startswith(f"--{name}="):
+            return arg.split("=", 1)[1]
+    return default
+
+
+# === Entry point when script is called directly ===
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "status"
+    queue_path = _option("queue", QUEUE_PATH)
+    if command == "worker":
+        stages = [s for s in _option("stages", "").split(",") if s] or None
+        idle_exit = _option("idle-exit", None)
+        print(f"👷 Worker {socket.gethostname()}:{os.getpid()} on {queue_path}")
+        run_worker(queue_path, stages=stages, idle_exit=float(idle_exit) if idle_exit else None)
+    elif command == "status":
+        for stage, status, count in queue_status(queue_path):
+            print(f"{stage:<10} {status:<8} {count:>6}")
+    else:
+        print("Usage: python executor.py [worker [--queue=path] [--stages=valuation,...] [--idle-exit=seconds] | status]")
+        sys.exit(1)
@@ -0,0 +1,160 @@
+import os
+import io
+import sys
+import csv
+import json
+from contextlib import redirect_stdout
+import numpy as np
+from schema import partition_tickers
+from batch import value_tickers, available_tickers
+from storage import atomic_write_bytes
+
+DATA_FOLDER = "data"
+FORMATS = ("csv", "jsonl", "parquet")
+ROW_GROUP_SIZE = 500        # rows buffered before a flush / Parquet part
+CHUNK_SIZE = 100            # tickers valued per step
+
+# Fixed column order, so the CSV header and Parquet schema do not depend on the first row
+EXPORT_COLUMNS = [
+    "ticker", "name", "sector", "industry", "status", "fiscal_date",
+    # DCF inputs (latest fiscal year, raw $ / fractions)
+    "price", "market_cap", "revenue", "ebitda", "net_income", "tax_rate", "cost_of_debt",
+    "total_debt", "cash", "shares_outstanding",
+    # Comps multiples (peer medians)
+    "peer_ev_ebitda", "peer_ev_sales", "peer_pe",
+    # Valuation results
+    "wacc", "enterprise_value", "dcf_price", "ev_ebitda_price", "pe_price", "dcf_upside", "peers",
+]
+TEXT_COLUMNS = {"ticker", "name", "sector", "industry", "status", "fiscal_date", "peers"}
+
+
+def _clean(record):
+    """One export row: fixed columns, NaN/inf → None, numpy scalars → Python, peers joined."""
+    row = {}
+    for column in EXPORT_COLUMNS:
+        value = record.get(column)
+        if column == "peers":
+            value = ";".join(value) if value else None
+        elif isinstance(value, (float, np.floating)):
+            value = None if np.isnan(value) or np.isinf(value) else float(value)
+        elif isinstance(value, np.generic):
+            value = value.item()
+        row[column] = value
+    return row
+
+
+# === Producer ===
+def iter_valuations(tickers, data_folder=DATA_FOLDER, chunk_size=CHUNK_SIZE, as_of=None, max_workers=None):
+    """
+    Yields one export row per ticker as each chunk of tickers is valued, so memory is
+    bounded by the chunk and a consumer sees rows long before the universe finishes.
+    Tickers whose files are unusable yield a row with only ticker and status.
+    """
+    for start in range(0, len(tickers), chunk_size):
+        plan = partition_tickers(tickers[start:start + chunk_size], data_folder)
+        for ticker in plan["requeue"] + plan["skip"]:
+            yield _clean({"ticker": ticker, "status": plan["results"][ticker]["status"]})
+        for record in value_tickers(plan["run"], data_folder=data_folder, max_workers=max_workers, as_of=as_of):
+            record["status"] = plan["results"][record["ticker"]]["status"]
+            yield _clean(record)
+
+
+# === Writers ===
+def write_csv(rows, out, row_group_size=ROW_GROUP_SIZE):
+    writer = csv.DictWriter(out, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    count = 0
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % row_group_size == 0:
+            out.flush()
+    out.flush()
+    return count
+
+
+def write_jsonl(rows, out, row_group_size=ROW_GROUP_SIZE):
+    count = 0
+    for count, row in enumerate(rows, 1):
+        out.write(json.dumps(row) + "\n")
+        if count % row_group_size == 0:
+            out.flush()
+    out.flush()
+    return count
+
+
+def write_parquet(rows, folder, row_group_size=ROW_GROUP_SIZE):
+    """
+    Writes a Parquet dataset folder, one part file per row group. Each part is written
+    atomically, so readers of the folder (e.g. pyarrow.dataset) only ever see whole parts.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Parquet export requires pyarrow (pip install pyarrow); use --format=csv or jsonl")
+
+    schema = pa.schema([(c, pa.string() if c in TEXT_COLUMNS else pa.float64()) for c in EXPORT_COLUMNS])
+    os.makedirs(folder, exist_ok=True)
+
+    def flush(buffer, part):
+        table = pa.Table.from_pylist(buffer, schema=schema)
+        sink = io.BytesIO()
+        pq.write_table(table, sink)
+        atomic_write_bytes(os.path.join(folder, f"part-{part:05d}.parquet"), sink.getvalue())
+
+    buffer, part, count = [], 0, 0
+    for row in rows:
+        buffer.append(row)
+        count += 1
+        if len(buffer) == row_group_size:
+            flush(buffer, part)
+            buffer, part = [], part + 1
+    if buffer:
+        flush(buffer, part)
+    return count
+
+
+def export_rows(rows, path="-", fmt=None, row_group_size=ROW_GROUP_SIZE, stdout=None):
+    """
+    Streams rows to `path` ("-" = `stdout`, default sys.stdout) in csv, jsonl or parquet,
+    flushing every `row_group_size` rows. The format defaults to the path's extension
+    (csv for stdout). Returns the number of rows written.
+    """
+    fmt = fmt or (os.path.splitext(path)[1].lstrip(".") if path != "-" else "csv") or "csv"
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}; expected one of {', '.join(FORMATS)}")
+    if fmt == "parquet":
+        if path == "-":
+            raise ValueError("Parquet cannot be streamed to stdout; use csv or jsonl")
+        return write_parquet(rows, path, row_group_size)
+
+    writer = write_csv if fmt == "csv" else write_jsonl
+    if path == "-":
+        return writer(rows, stdout or sys.stdout, row_group_size)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8", newline="") as out:
+        return writer(rows, out, row_group_size)
+
+
+def _option(name, default):
+    """Value of a "--name=value" command-line option."""
+    for arg in sys.argv[1:]:
+        if arg.startswith(f"--{name}="):
+            return arg.split("=", 1)[1]
+    return default
+
+
+# === Entry point when script is called directly ===
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    tickers = [t.upper() for t in args] or available_tickers()
+    path = _option("out", "-")
+    fmt = _option("format", None)
+    row_group_size = int(_option("row-group", ROW_GROUP_SIZE))
+    rows = iter_valuations(tickers, chunk_size=int(_option("chunk", CHUNK_SIZE)), as_of=_option("as-of", None))
+
+    # Progress output goes to stderr so a piped stdout carries only the export
+    stdout = sys.stdout
+    with redirect_stdout(sys.stderr):
+        count = export_rows(rows, path, fmt, row_group_size, stdout)
+    print(f"✅ Exported {count} rows to {'stdout' if path == '-' else path}", file=sys.stderr)
@@ -0,0 +1,180 @@
+import os
+import sys
+import json
+import time
+import numpy as np
+from units import to_float_array
+from valuation import extract_dcf_inputs, stack_inputs, project_fcff, discount_fcff, TERMINAL_GROWTH
+from wacc import peer_table, batch_wacc
+from assumptions import load_assumptions, size_premium
+from projection import load_projected
+
+DATA_FOLDER = "data"
+DEFAULT_WACC = 0.09  # used when the company has no usable peers (as in batch.py)
+
+# Settable inputs of the model. None for revenue_growth / ebit_margin / size_premium
+# means "derive it" (historical average, assumption-table lookup).
+PARAMS = {
+    "financials": None,         # parsed *_financials.json
+    "comp_data": None,          # parsed *_comparable_analysis.json
+    "assumptions": None,        # assumptions.load_assumptions() table
+    "revenue_growth": None,
+    "ebit_margin": None,
+    "terminal_growth": TERMINAL_GROWTH,
+    "size_premium": None,
+}
+
+
+# === Node functions (pure; no file or Excel I/O) ===
+def _inputs(financials):
+    return stack_inputs([extract_dcf_inputs(financials)])
+
+
+def _market(financials):
+    overview = financials.get("overview", {})
+    quote = financials.get("quote", {}).get("Global Quote", {})
+    return {
+        "price": float(to_float_array([quote.get("05. price")])[0]),
+        "market_cap": float(to_float_array([overview.get("MarketCapitalization")])[0]),
+    }
+
+
+def _peers(comp_data):
+    return peer_table(comp_data or {"peers": {}})
+
+
+def _historical(inputs):
+    projection = project_fcff(inputs)
+    return {"revenue_growth": float(projection["revenue_growth"][0]),
+            "ebit_margin": float(projection["ebit_margin"][0])}
+
+
+def _size_premium(override, market, assumptions):
+    if override is not None:
+        return float(override)
+    return float(size_premium([market["market_cap"]], assumptions)[0])
+
+
+def _wacc(peers, inputs, premium, assumptions):
+    result = batch_wacc([peers], inputs["tax_rate"], inputs["cost_of_debt"], premium, assumptions)
+    result = {name: float(values[0]) for name, values in result.items()}
+    if np.isnan(result["wacc"]):
+        result["wacc"] = DEFAULT_WACC
+    return result
+
+
+def _projection(inputs, revenue_growth, ebit_margin):
+    return project_fcff(inputs, revenue_growth, ebit_margin)
+
+
+def _value(projection, inputs, wacc, terminal_growth, market):
+    dcf = discount_fcff(projection, inputs, wacc["wacc"], terminal_growth)
+    value = {name: values[0] for name, values in dcf.items()}
+    price = market["price"]
+    value["upside"] = value["price_per_share"] / price - 1 if price else np.nan
+    return value
+
+
+# node → (dependencies, function); dependencies are params or other nodes
+GRAPH = {
+    "inputs": (("financials",), _inputs),
+    "market": (("financials",), _market),
+    "peers": (("comp_data",), _peers),
+    "historical": (("inputs",), _historical),
+    "size_premium_rate": (("size_premium", "market", "assumptions"), _size_premium),
+    "wacc": (("peers", "inputs", "size_premium_rate", "assumptions"), _wacc),
+    "projection": (("inputs", "revenue_growth", "ebit_margin"), _projection),
+    "value": (("projection", "inputs", "wacc", "terminal_growth", "market"), _value),
+}
+
+
+# === Model ===
+def new_model(financials, comp_data=None, assumptions=None):
+    """
+    A memoized dataflow graph of one company's DCF:
+    statements → inputs → (peers, size premium) → WACC → FCFF projection → value.
+
+    Every param and node carries a version; a node is recomputed only when the version
+    of one of its dependencies changed since it was last evaluated, so moving one
+    assumption re-runs just the nodes downstream of it.
+    """
+    model = {"params": dict(PARAMS), "versions": {}, "memo": {}, "clock": 0, "recomputed": []}
+    set_param(model, "financials", financials)
+    set_param(model, "comp_data", comp_data)
+    set_param(model, "assumptions", assumptions or load_assumptions())
+    return model
+
+
+def set_param(model, name, value):
+    """Sets a param; downstream nodes go stale only if the value actually changed."""
+    if name not in PARAMS:
+        raise KeyError(f"Unknown model param {name!r}; expected one of {', '.join(PARAMS)}")
+    current = model["params"][name]
+    unchanged = current is value or (np.isscalar(current) and np.isscalar(value) and current == value)
+    if name in model["versions"] and unchanged:
+        return
+    model["clock"] += 1
+    model["params"][name] = value
+    model["versions"][name] = model["clock"]
+
+
+def _evaluate(model, name):
+    """(value, version) of a param or node, recomputing stale nodes depth-first."""
+    if name in model["params"]:
+        return model["params"][name], model["versions"].get(name, 0)
+    if name not in GRAPH:
+        raise KeyError(f"Unknown model node {name!r}")
+
+    dependencies, function = GRAPH[name]
+    evaluated = [_evaluate(model, dependency) for dependency in dependencies]
+    dependency_versions = tuple(version for _, version in evaluated)
+    memo = model["memo"].get(name)
+    if memo is not None and memo["dependencies"] == dependency_versions:
+        return memo["value"], memo["version"]
+
+    value = function(*(value for value, _ in evaluated))
+    model["clock"] += 1
+    model["memo"][name] = {"value": value, "version": model["clock"], "dependencies": dependency_versions}
+    model["recomputed"].append(name)
+    return value, model["clock"]
+
+
+def evaluate(model, name="value"):
+    """Current value of a node (or param); model["recomputed"] lists the nodes this call re-ran."""
+    model["recomputed"] = []
+    return _evaluate(model, name)[0]
+
+
+def load_model(ticker, data_folder=DATA_FOLDER, as_of=None):
+    """Reads a ticker's financials and comps once and builds its model graph."""
+    financials = load_projected(os.path.join(data_folder, f"{ticker}_financials.json"), "dcf")
+    comp_path = os.path.join(data_folder, f"{ticker}_comparable_analysis.json")
+    comp_data = None
+    if os.path.exists(comp_path):
+        with open(comp_path, "r") as f:
+            comp_data = json.load(f)
+    return new_model(financials, comp_data, load_assumptions(as_of))
+
+
+# === Entry point when script is called directly ===
+if __name__ == "__main__":
+    # python model_graph.py AAPL   → base value, then one what-if per assumption with timings
+    ticker = sys.argv[1].upper() if len(sys.argv) > 1 else "AAPL"
+    model = load_model(ticker)
+
+    started = time.perf_counter()
+    value = evaluate(model)
+    print(f"⏱️ Full evaluation ({len(model['recomputed'])} nodes) in {(time.perf_counter() - started) * 1000:.2f} ms")
+    print(f"✅ {ticker}: WACC {evaluate(model, 'wacc')['wacc']:.2%}, "
+          f"price per share ${value['price_per_share']:,.2f} ({value['upside']:+.1%})")
+
+    historical = evaluate(model, "historical")
+    for name, new_value in [("revenue_growth", historical["revenue_growth"] + 0.02),
+                            ("ebit_margin", historical["ebit_margin"] - 0.02),
+                            ("terminal_growth", TERMINAL_GROWTH + 0.005),
+                            ("size_premium", 0.01)]:
+        set_param(model, name, new_value)
+        started = time.perf_counter()
+        value = evaluate(model)
+        print(f"🔎 {name} = {new_value:.2%}: ${value['price_per_share']:,.2f} per share, "
+              f"recomputed {', '.join(model['recomputed'])} in {(time.perf_counter() - started) * 1000:.2f} ms")
@@ -0,0 +1,346 @@
+import os
+import io
+import sys
+import json
+import time
+import threading
+import numpy as np
+from returns_analytics import price_matrix, BENCHMARK_TICKER
+from storage import atomic_write_bytes, atomic_write_text, file_lock
+
+DATA_FOLDER = "data"
+WINDOW = 252                    # trailing daily log returns per correlation (1 year)
+MIN_OBSERVATIONS = 120          # tickers with fewer real returns in the window get NaN correlations
+BLOCK = 1024                    # tickers per block in the cross products and neighbour searches
+NEIGHBOURS = 5                  # k of the k-nearest-neighbour clustering
+CLUSTER_MIN_CORRELATION = 0.5   # weaker neighbour links do not join clusters
+WEAK_PEER_CORRELATION = 0.3     # peers correlating less with the target are flagged
+REBUILD_AFTER = 50              # incremental updates before a full recompute (bounds float drift)
+
+POINTER_FILE = "CURRENT"        # names the live version folder; replaced atomically
+KEEP_VERSIONS = 2
+MATRIX_LOCK = "correlation-matrix"
+
+# folder → {"version", "matrix"}; the memory-mapped matrix is shared by every caller in a process
+_loaded = {}
+_load_lock = threading.Lock()
+
+
+def matrix_folder(data_folder=DATA_FOLDER):
+    return os.path.join(data_folder, "cache", "correlation")
+
+
+def universe_tickers(data_folder=DATA_FOLDER):
+    """Every ticker with a stored chart."""
+    return sorted(f.replace("_chart.json", "") for f in os.listdir(data_folder) if f.endswith("_chart.json"))
+
+
+# === Returns and cross products ===
+def log_returns(closes):
+    """Daily log returns along the last axis; NaN where either close is missing or not positive."""
+    closes = np.asarray(closes, dtype=float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.log(closes[..., 1:] / closes[..., :-1])
+
+
+def cross_products(a, b):
+    """a @ b.T of zero-filled return windows, one block of `a` rows at a time."""
+    a, b = np.nan_to_num(a), np.nan_to_num(b)
+    out = np.empty((len(a), len(b)))
+    for start in range(0, len(a), BLOCK):
+        out[start:start + BLOCK] = a[start:start + BLOCK] @ b.T
+    return out
+
+
+def correlations(cross, window):
+    """
+    Correlation matrix from the cross products of zero-filled returns (a missing day
+    counts as no move) and the window itself, computed in row blocks as float32.
+    Tickers with fewer than MIN_OBSERVATIONS returns in the window get NaN.
+    """
+    length = window.shape[1]
+    mean = np.nansum(window, axis=1) / length
+    variance = np.diag(cross) / length - mean ** 2
+    enough = (np.sum(~np.isnan(window), axis=1) >= MIN_OBSERVATIONS) & (variance > 0)
+    scale = np.where(enough, 1 / np.sqrt(np.where(variance > 0, variance, 1)), np.nan)
+
+    corr = np.empty(cross.shape, dtype=np.float32)
+    for start in range(0, len(cross), BLOCK):
+        rows = slice(start, start + BLOCK)
+        covariance = cross[rows] / length - mean[rows, None] * mean[None, :]
+        corr[rows] = np.clip(covariance * scale[rows, None] * scale[None, :], -1, 1)
+    return corr
+
+
+# === Clustering ===
+def nearest_neighbours(corr, k=NEIGHBOURS):
+    """(n × k) indices of each ticker's k most correlated others (NaN and self excluded), blockwise."""
+    n = len(corr)
+    k = min(k, max(n - 1, 0))
+    neighbours = np.zeros((n, k), dtype=np.int64)
+    for start in range(0, n, BLOCK):
+        block = np.array(corr[start:start + BLOCK], dtype=float)
+        block[np.arange(len(block)), np.arange(start, start + len(block))] = -np.inf
+        block = np.where(np.isnan(block), -np.inf, block)
+        top = np.argpartition(-block, k - 1, axis=1)[:, :k] if k else np.zeros((len(block), 0), dtype=np.int64)
+        order = np.argsort(-np.take_along_axis(block, top, axis=1), axis=1)
+        neighbours[start:start + len(block)] = np.take_along_axis(top, order, axis=1)
+    return neighbours
+
+
+def cluster_labels(corr, k=NEIGHBOURS, min_correlation=CLUSTER_MIN_CORRELATION):
+    """
+    k-nearest-neighbour clustering: two tickers are linked when either is among the
+    other's k most correlated and their correlation is at least `min_correlation`;
+    clusters are the connected components of those links (union-find). Returns (n,) labels.
+    """
+    n = len(corr)
+    neighbours = nearest_neighbours(corr, k)
+    parent = np.arange(n)
+
+    def root(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, row in enumerate(neighbours.tolist()):
+        for j in row:
+            if corr[i, j] >= min_correlation:
+                parent[root(i)] = root(j)
+    roots = np.array([root(i) for i in range(n)])
+    return np.unique(roots, return_inverse=True)[1]
+
+
+# === Versioned cache ===
+def _write_version(matrix, data_folder):
+    """Writes a version folder of .npy files plus meta.json, then repoints CURRENT at it."""
+    folder = matrix_folder(data_folder)
+    version = f"corr-{time.time_ns()}"
+    for name in ("tickers", "window", "window_dates", "cross", "corr", "labels"):
+        buffer = io.BytesIO()
+        np.save(buffer, matrix[name])
+        atomic_write_bytes(os.path.join(folder, version, f"{name}.npy"), buffer.getvalue())
+    atomic_write_text(os.path.join(folder, version, "meta.json"), json.dumps(matrix["meta"]))
+    atomic_write_text(os.path.join(folder, POINTER_FILE), version)
+
+    for name in sorted(f for f in os.listdir(folder) if f.startswith("corr-"))[:-KEEP_VERSIONS]:
+        for file_name in os.listdir(os.path.join(folder, name)):
+            try:
+                os.remove(os.path.join(folder, name, file_name))
+            except OSError:
+                pass
+        try:
+            os.rmdir(os.path.join(folder, name))
+        except OSError:
+            pass
+    return version
+
+
+def load_matrix(data_folder=DATA_FOLDER):
+    """
+    The cached matrix ({"tickers", "index", "window", "window_dates", "cross", "corr",
+    "labels", "meta"}) with the big arrays memory-mapped read-only, or None if none is built.
+    Re-mapped only when CURRENT names a new version.
+    """
+    folder = matrix_folder(data_folder)
+    try:
+        with open(os.path.join(folder, POINTER_FILE), "r") as f:
+            version = f.read().strip()
+    except OSError:
+        return None
+
+    cached = _loaded.get(folder)
+    if cached is not None and cached["version"] == version:
+        return cached["matrix"]
+    with _load_lock:
+        cached = _loaded.get(folder)
+        if cached is not None and cached["version"] == version:
+            return cached["matrix"]
+        path = os.path.join(folder, version)
+        try:
+            matrix = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+                      for name in ("tickers", "window", "window_dates", "cross", "corr", "labels")}
+            with open(os.path.join(path, "meta.json"), "r") as f:
+                matrix["meta"] = json.load(f)
+        except (OSError, ValueError):
+            return cached["matrix"] if cached is not None else None
+        matrix["index"] = {t: i for i, t in enumerate(matrix["tickers"].tolist())}
+        _loaded[folder] = {"version": version, "matrix": matrix}
+        return matrix
+
+
+def _incremental_cross(cached, tickers, window, window_dates):
+    """
+    Cross products for the new window from the cached ones, or None when the cached
+    window cannot be rolled forward (different length, no overlap, or restated history).
+    New bars cost a rank-k update (k = new days) and new tickers one row block each.
+    """
+    old_dates = np.asarray(cached["window_dates"])
+    if len(old_dates) != len(window_dates) or cached["meta"]["increments"] >= REBUILD_AFTER:
+        return None
+    shift = int(np.searchsorted(window_dates, old_dates[-1], side="right"))
+    shift = len(window_dates) - shift
+    if shift >= len(window_dates) or not np.array_equal(window_dates[:len(window_dates) - shift], old_dates[shift:]):
+        return None
+
+    index = cached["index"]
+    kept = [t for t in tickers if t in index]
+    old_rows = np.array([index[t] for t in kept], dtype=np.int64)
+    new_rows = np.array([i for i, t in enumerate(tickers) if t in index], dtype=np.int64)
+    old_window = np.asarray(cached["window"])[old_rows]
+    if not np.array_equal(old_window[:, shift:], window[new_rows, :len(window_dates) - shift], equal_nan=True):
+        return None
+
+    cross = np.empty((len(tickers), len(tickers)))
+    kept_cross = np.asarray(cached["cross"])[np.ix_(old_rows, old_rows)]
+    if shift:
+        incoming, outgoing = window[new_rows, -shift:], old_window[:, :shift]
+        kept_cross = kept_cross + cross_products(incoming, incoming) - cross_products(outgoing, outgoing)
+    cross[np.ix_(new_rows, new_rows)] = kept_cross
+
+    added = np.setdiff1d(np.arange(len(tickers)), new_rows)
+    if len(added):
+        added_cross = cross_products(window[added], window)
+        cross[added, :] = added_cross
+        cross[:, added] = added_cross.T
+    return cross
+
+
+def correlation_matrix(data_folder=DATA_FOLDER, window=WINDOW):
+    """
+    The universe's correlation matrix of daily log returns over the trailing `window`,
+    kept current in data/cache/correlation and returned memory-mapped (see load_matrix).
+
+    Prices come from returns_analytics.price_matrix (which re-reads only changed charts).
+    When bars or tickers were added since the cached version, its cross products are
+    rolled forward (subtract the days that left the window, add the new ones, add rows
+    for new tickers) instead of being recomputed; a restated history, a new window length
+    or REBUILD_AFTER increments trigger a full blocked rebuild. Cluster labels are
+    recomputed with the matrix, so peer-set scoring afterwards is pure lookups.
+    """
+    tickers = universe_tickers(data_folder)
+    dates, closes = price_matrix(tickers, data_folder)
+    if len(dates) < 2:
+        raise ValueError(f"No price history in {data_folder}/ (fetch charts with stock_chart.py)")
+    returns = log_returns(closes)
+    window_dates = dates[1:][-window:]
+    window_returns = returns[:, -window:]
+
+    with file_lock(MATRIX_LOCK, data_folder):
+        cached = load_matrix(data_folder)
+        if (cached is not None and cached["tickers"].tolist() == tickers
+                and np.array_equal(cached["window_dates"], window_dates)
+                and np.array_equal(cached["window"], window_returns, equal_nan=True)):
+            return cached
+
+        cross = _incremental_cross(cached, tickers, window_returns, window_dates) if cached is not None else None
+        increments = cached["meta"]["increments"] + 1 if cross is not None else 0
+        if cross is None:
+            cross = cross_products(window_returns, window_returns)
+        corr = correlations(cross, window_returns)
+        matrix = {
+            "tickers": np.array(tickers, dtype="U12"),
+            "window": window_returns,
+            "window_dates": window_dates,
+            "cross": cross,
+            "corr": corr,
+            "labels": cluster_labels(corr),
+            "meta": {"window": window, "end_date": str(window_dates[-1]), "increments": increments},
+        }
+        _write_version(matrix, data_folder)
+    return load_matrix(data_folder)
+
+
+# === Peer-set scoring (lookups only) ===
+def _rows(matrix, tickers):
+    return [matrix["index"][t] for t in tickers if t in matrix["index"]]
+
+
+def score_peer_set(target, peers, matrix=None, data_folder=DATA_FOLDER):
+    """
+    Cohesion of a proposed peer set from the cached matrix:
+    - peer_correlations: each peer's correlation with the target (NaN if no prices)
+    - mean_target_correlation and its percentile among the target's correlations with
+      the whole universe (how much better than random tickers the peers track it)
+    - mean_pairwise: mean correlation among target + peers
+    - same_cluster: share of peers in the target's cluster
+    - weak_peers: peers below WEAK_PEER_CORRELATION; missing: peers without prices
+    """
+    matrix = matrix or load_matrix(data_folder) or correlation_matrix(data_folder)
+    index = matrix["index"]
+    peers = [p for p in dict.fromkeys(peers) if p != target]
+    result = {"target": target, "peer_correlations": {}, "mean_target_correlation": np.nan, "percentile": np.nan,
+              "mean_pairwise": np.nan, "same_cluster": np.nan, "weak_peers": [],
+              "missing": [p for p in peers if p not in index]}
+    if target not in index:
+        result["missing"].insert(0, target)
+        return result
+
+    row = np.asarray(matrix["corr"][index[target]], dtype=float)
+    peer_rows = _rows(matrix, peers)
+    peer_corr = row[peer_rows]
+    result["peer_correlations"] = {p: float(c) for p, c in zip([p for p in peers if p in index], peer_corr)}
+    result["weak_peers"] = [p for p, c in result["peer_correlations"].items() if not c >= WEAK_PEER_CORRELATION]
+    if len(peer_rows) and not np.all(np.isnan(peer_corr)):
+        mean = float(np.nanmean(peer_corr))
+        others = np.delete(row, index[target])
+        others = others[~np.isnan(others)]
+        result["mean_target_correlation"] = mean
+        result["percentile"] = float(np.mean(others < mean)) if len(others) else np.nan
+        members = [index[target]] + peer_rows
+        block = np.asarray(matrix["corr"][np.ix_(members, members)], dtype=float)
+        off_diagonal = block[~np.eye(len(members), dtype=bool)]
+        result["mean_pairwise"] = float(np.nanmean(off_diagonal)) if np.any(~np.isnan(off_diagonal)) else np.nan
+        labels = np.asarray(matrix["labels"])
+        result["same_cluster"] = float(np.mean(labels[peer_rows] == labels[index[target]]))
+    return result
+
+
+def suggest_peers(target, peers=(), k=5, matrix=None, data_folder=DATA_FOLDER, exclude=(BENCHMARK_TICKER,)):
+    """
+    Up to `k` tickers not in the peer set that correlate best, on average, with the
+    target and its current peers, as [(ticker, mean correlation)], best first.
+    """
+    matrix = matrix or load_matrix(data_folder) or correlation_matrix(data_folder)
+    members = _rows(matrix, [target, *peers])
+    if not members:
+        return []
+    with np.errstate(invalid="ignore"):
+        scores = np.nanmean(np.asarray(matrix["corr"][members], dtype=float), axis=0) \
+            if len(members) > 1 else np.asarray(matrix["corr"][members[0]], dtype=float)
+    scores[members] = np.nan
+    scores[_rows(matrix, exclude)] = np.nan
+    order = np.argsort(np.where(np.isnan(scores), np.inf, -scores))
+    tickers = matrix["tickers"]
+    return [(str(tickers[i]), float(scores[i])) for i in order[:k] if not np.isnan(scores[i])]
+
+
+def stored_peers(ticker, data_folder=DATA_FOLDER):
+    """The LLM-proposed peers saved in {ticker}_comparable_analysis.json (via the comps store)."""
+    from comps_store import peer_frame
+    return list(peer_frame(ticker, data_folder).index)
+
+
+# === Entry point when script is called directly ===
+if __name__ == "__main__":
+    # python peer_clustering.py [TICKER ...]   → score each stored peer set (default: every one) and suggest additions
+    started = time.perf_counter()
+    matrix = correlation_matrix()
+    print(f"⏱️ {len(matrix['tickers'])} tickers × {len(matrix['window_dates'])} days up to "
+          f"{matrix['meta']['end_date']} in {time.perf_counter() - started:.2f}s "
+          f"({len(np.unique(matrix['labels']))} clusters)")
+    targets = [t.upper() for t in sys.argv[1:]] or sorted(
+        f.replace("_comparable_analysis.json", "") for f in os.listdir(DATA_FOLDER) if f.endswith("_comparable_analysis.json"))
+    for ticker in targets:
+        peers = stored_peers(ticker)
+        score = score_peer_set(ticker, peers, matrix)
+        print(f"🔎 {ticker}: {len(peers)} peers, mean ρ to target {score['mean_target_correlation']:.2f} "
+              f"(beats {score['percentile']:.0%} of universe), pairwise {score['mean_pairwise']:.2f}")
+        if score["weak_peers"]:
+            print(f"   ⚠️ weak: {', '.join(score['weak_peers'])}")
+        if score["missing"]:
+            print(f"   ⚠️ no prices: {', '.join(score['missing'])}")
+        suggestions = suggest_peers(ticker, peers, matrix=matrix)
+        if suggestions:
+            print("   ➕ " + ", ".join(f"{t} ({c:.2f})" for t, c in suggestions))
@@ -0,0 +1,297 @@
+import os
+import re
+import sys
+import json
+import time
+import tracemalloc
+from valuation import HISTORY_YEARS
+
+DATA_FOLDER = "data"
+STATEMENTS = ("income_statement", "balance_sheet", "cash_flow")
+ANNUAL_REPORTS = HISTORY_YEARS + 1      # one spare year over the DCF history (schema wants ≥ 4)
+TTM_QUARTERS = 4 * ANNUAL_REPORTS       # enough quarters for that many trailing-twelve-month windows
+STREAM_THRESHOLD_BYTES = 4 * 1024 * 1024    # larger payloads are streamed (ijson) rather than parsed whole
+
+# === Projection specs per consumer ===
+# Dotted paths to keep; "*" matches any key and "[:n]" keeps the first n items of a list
+# (providers list reports newest first). Everything else in the payload is skipped.
+_BASE = ["overview", "quote", "*.error", "*.symbol"]
+_ANNUAL = [f"{statement}.annualReports[:{ANNUAL_REPORTS}]" for statement in STATEMENTS]
+_QUARTERLY = [f"{statement}.quarterlyReports[:{TTM_QUARTERS}]" for statement in STATEMENTS]
+
+SPECS = {
+    "dcf": _BASE + _ANNUAL,                             # dcfModel, batch, model_graph
+    "dcf_ttm": _BASE + _ANNUAL + _QUARTERLY,            # ... with period="ttm"
+    "cca": _BASE + ["income_statement.annualReports[:1]", "balance_sheet.annualReports[:1]"],
+    "cca_ttm": _BASE + _ANNUAL + _QUARTERLY,
+    "overview": _BASE + ["income_statement.annualReports[:1]", "balance_sheet.annualReports[:1]"],
+    "validate": _BASE + _ANNUAL,                        # schema.validate_ticker
+}
+
+_SLICE = re.compile(r"^(.*)\[:(\d+)\]$")
+_SKIP = object()
+
+# spec name or tuple of paths → compiled tree
+_spec_cache = {}
+
+
+# === Spec compilation ===
+def _new_node():
+    return {"whole": False, "limit": None, "children": {}}
+
+
+def _merge(target, source):
+    if source["whole"]:
+        target["whole"] = True
+    if source["limit"] is not None:
+        target["limit"] = max(target["limit"] or 0, source["limit"])
+    for key, child in source["children"].items():
+        _merge(target["children"].setdefault(key, _new_node()), child)
+
+
+def _finalize(node):
+    """Wildcard children are merged into their exact-key siblings; whole nodes drop children."""
+    if node["whole"]:
+        node["children"] = {}
+        return
+    wildcard = node["children"].get("*")
+    if wildcard is not None:
+        for key, child in node["children"].items():
+            if key != "*":
+                _merge(child, wildcard)
+    for child in node["children"].values():
+        _finalize(child)
+
+
+def compile_spec(spec):
+    """
+    Compiles a spec (a SPECS name or a list of dotted paths) into a tree of
+    {"whole", "limit", "children"} nodes. Compiled trees are cached.
+    """
+    key = spec if isinstance(spec, str) else tuple(spec)
+    if key in _spec_cache:
+        return _spec_cache[key]
+    paths = SPECS[spec] if isinstance(spec, str) else spec
+
+    root = _new_node()
+    for path in paths:
+        keys = path.split(".")
+        # Quote keys contain dots ("05. price"); rejoin anything after the second segment
+        if keys[0] == "quote" and len(keys) > 2:
+            keys = [keys[0], keys[1], ".".join(keys[2:])]
+        match = _SLICE.match(keys[-1])
+        if match:
+            keys[-1] = match.group(1)
+        node = root
+        for key in keys:
+            node = node["children"].setdefault(key, _new_node())
+        if match:
+            node["limit"] = max(node["limit"] or 0, int(match.group(2)))
+        node["whole"] = True
+
+    _finalize(root)
+    _spec_cache[key] = root
+    return root
+
+
+def _child(node, key):
+    children = node["children"]
+    return children.get(key) or children.get("*")
+
+
+# === Projection over a parsed payload (orjson / json backends) ===
+def project(value, node):
+    """The part of an already-parsed value selected by a compiled spec node."""
+    if isinstance(value, list) and node["limit"] is not None:
+        value = value[:node["limit"]]
+    if node["whole"]:
+        return value
+    if not isinstance(value, dict):
+        return _SKIP
+    projected = {}
+    for key, child in node["children"].items():
+        if key == "*":
+            continue
+        if key in value:
+            result = project(value[key], child)
+            if result is not _SKIP:
+                projected[key] = result
+    wildcard = node["children"].get("*")
+    if wildcard is not None:
+        for key, item in value.items():
+            if key not in node["children"]:
+                result = project(item, wildcard)
+                if result is not _SKIP:
+                    projected[key] = result
+    return projected
+
+
+# === Streaming projection (ijson backend) ===
+def _skip(events, event):
+    """Consumes the rest of a value whose first event was `event`."""
+    if event not in ("start_map", "start_array"):
+        return
+    depth = 1
+    for event, _ in events:
+        if event in ("start_map", "start_array"):
+            depth += 1
+        elif event in ("end_map", "end_array"):
+            depth -= 1
+            if depth == 0:
+                return
+
+
+def _build(events, event, value):
+    """Materializes a whole value from its events."""
+    if event == "start_map":
+        built = {}
+        for event, key in events:
+            if event == "end_map":
+                return built
+            built[key] = _build(events, *next(events))
+    if event == "start_array":
+        built = []
+        for event, item in events:
+            if event == "end_array":
+                return built
+            built.append(_build(events, event, item))
+    return value
+
+
+def _stream(events, event, value, node):
+    """Projects one value straight off the parser events, never building skipped parts."""
+    if node is None:
+        _skip(events, event)
+        return _SKIP
+    if event == "start_array" and node["limit"] is not None:
+        items = []
+        item_node = dict(node, limit=None)
+        for event, item in events:
+            if event == "end_array":
+                return items
+            if len(items) < node["limit"]:
+                result = _stream(events, event, item, item_node)
+                if result is not _SKIP:
+                    items.append(result)
+            else:
+                _skip(events, event)
+    if node["whole"]:
+        return _build(events, event, value)
+    if event != "start_map":
+        _skip(events, event)
+        return _SKIP
+    projected = {}
+    for event, key in events:
+        if event == "end_map":
+            return projected
+        result = _stream(events, *next(events), _child(node, key))
+        if result is not _SKIP:
+            projected[key] = result
+
+
+# === Loader ===
+def _importable(module):
+    try:
+        __import__(module)
+        return True
+    except ImportError:
+        return False
+
+
+def available_backend(size=0):
+    """
+    Parser load_projected uses for a file of `size` bytes: orjson (fastest) for ordinary
+    payloads, ijson streaming (bounded memory) above STREAM_THRESHOLD_BYTES, json otherwise.
+    """
+    preferred = ("ijson", "orjson") if size > STREAM_THRESHOLD_BYTES else ("orjson", "ijson")
+    return next((backend for backend in preferred if _importable(backend)), "json")
+
+
+def load_projected(path, spec, backend=None):
+    """
+    Loads only the parts of a JSON file selected by `spec` (a SPECS name such as "dcf",
+    or a list of dotted paths). Returns the same nested dict/list shapes as json.load,
+    holding just the requested paths.
+
+    With ijson the file is parsed incrementally and unrequested subtrees (decades of
+    quarterlyReports) are never materialized; with orjson it is parsed in one fast pass
+    and projected immediately, so only the projection outlives the call.
+    """
+    node = compile_spec(spec)
+    backend = backend or available_backend(os.path.getsize(path))
+    with open(path, "rb") as f:
+        if backend == "ijson":
+            import ijson
+            try:
+                events = iter(ijson.basic_parse(f, use_float=True))
+                result = _stream(events, *next(events), node)
+            except (ijson.JSONError, StopIteration) as e:
+                # Same contract as json / orjson: malformed input raises ValueError
+                raise ValueError(f"Invalid JSON in {path}: {e}") from e
+        elif backend == "orjson":
+            import orjson
+            result = project(orjson.loads(f.read()), node)
+        else:
+            result = project(json.load(f), node)
+    return {} if result is _SKIP else result
+
+
+def load_financials(ticker, spec, data_folder=DATA_FOLDER, backend=None):
+    """A ticker's *_financials.json projected for one consumer."""
+    return load_projected(os.path.join(data_folder, f"{ticker}_financials.json"), spec, backend)
+
+
+# === Benchmark ===
+def _measure(load, paths, repeat):
+    """
+    (best wall seconds over all files, peak traced bytes during a single load,
+    largest traced bytes still held by a load's result).
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for path in paths:
+            load(path)
+        best = min(best, time.perf_counter() - started)
+    peak = retained = 0
+    for path in paths:
+        tracemalloc.start()
+        result = load(path)
+        current, traced_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peak, retained = max(peak, traced_peak), max(retained, current)
+        del result
+    return best, peak, retained
+
+
+def benchmark_loads(spec="dcf", data_folder=DATA_FOLDER, repeat=5):
+    """
+    Times json.load of every *_financials.json against load_projected(spec) on each
+    available backend. Returns {name: {"seconds", "per_file_ms", "peak_kb", "retained_kb"}}.
+    """
+    paths = sorted(os.path.join(data_folder, f) for f in os.listdir(data_folder) if f.endswith("_financials.json"))
+
+    def full(path):
+        with open(path, "r") as f:
+            return json.load(f)
+
+    loaders = {"json.load (full)": full}
+    for backend in ("ijson", "orjson", "json"):
+        if backend == "json" or _importable(backend):
+            loaders[f"{backend} → {spec}"] = lambda path, backend=backend: load_projected(path, spec, backend)
+
+    results = {}
+    for name, load in loaders.items():
+        seconds, peak, retained = _measure(load, paths, repeat)
+        results[name] = {"seconds": seconds, "per_file_ms": seconds / max(len(paths), 1) * 1000,
+                         "peak_kb": peak / 1024, "retained_kb": retained / 1024}
+    return results
+
+
+# === Entry point when script is called directly ===
+if __name__ == "__main__":
+    spec = sys.argv[1] if len(sys.argv) > 1 else "dcf"
+    print(f"📦 Projection '{spec}' over {DATA_FOLDER}/*_financials.json (default backend: {available_backend()})")
+    for name, result in benchmark_loads(spec).items():
+        print(f"⏱️ {name:<22} {result['per_file_ms']:7.2f} ms/file   peak {result['peak_kb']:8.1f} KB"
+              f"   retained {result['retained_kb']:8.1f} KB")
@@ -0,0 +1,375 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import requests
+from dotenv import load_dotenv
+from schema import UNUSABLE, validate_financials
+
+# === Load API keys from keys.env ===
+load_dotenv("keys.env")
+
+API_KEYS = {
+    "alphavantage": os.getenv("ALPHA_VANTAGE_API_KEY"),
+    "fmp": os.getenv("FMP_API_KEY"),
+}
+
+# Overridable so benchmarks and offline runs can point at replay_server.py
+BASE_URLS = {
+    "alphavantage": os.getenv("ALPHA_VANTAGE_BASE_URL", "https://www.alphavantage.co"),
+    "fmp": os.getenv("FMP_BASE_URL", "https://financialmodelingprep.com"),
+}
+
+DEFAULT_PROVIDERS = ("alphavantage", "fmp", "yfinance")
+REQUEST_TIMEOUT = 30            # seconds per HTTP call
+HISTORY_LIMIT = 5               # annual / quarterly reports requested from FMP
+
+# A provider that throttles or fails is skipped for a while, so later tickers go
+# straight to a healthy one instead of waiting on it again
+COOLDOWN_SECONDS = {"throttle": 60, "error": 15}
+
+# Alpha Vantage function → section of *_financials.json
+ALPHA_VANTAGE_FUNCTIONS = {
+    "balance_sheet": "BALANCE_SHEET",
+    "income_statement": "INCOME_STATEMENT",
+    "cash_flow": "CASH_FLOW",
+    "overview": "OVERVIEW",
+    "quote": "GLOBAL_QUOTE",
+}
+
+# === Unified statement schema ===
+# Every provider is mapped onto the Alpha Vantage layout (*_financials.json), which is
+# what schema, valuation, dcfModel and ccaExcel read. Values are stored as strings,
+# "None" when absent, exactly like Alpha Vantage.
+FMP_FIELDS = {
+    "income_statement": {
+        "totalRevenue": "revenue",
+        "costOfRevenue": "costOfRevenue",
+        "grossProfit": "grossProfit",
+        "operatingExpenses": "operatingExpenses",
+        "depreciationAndAmortization": "depreciationAndAmortization",
+        "ebit": "operatingIncome",
+        "ebitda": "ebitda",
+        "interestExpense": "interestExpense",
+        "incomeBeforeTax": "incomeBeforeTax",
+        "incomeTaxExpense": "incomeTaxExpense",
+        "netIncome": "netIncome",
+    },
+    "balance_sheet": {
+        "totalAssets": "totalAssets",
+        "totalLiabilities": "totalLiabilities",
+        "totalShareholderEquity": "totalStockholdersEquity",
+        "cashAndCashEquivalentsAtCarryingValue": "cashAndCashEquivalents",
+        "currentNetReceivables": "netReceivables",
+        "inventory": "inventory",
+        "otherCurrentAssets": "otherCurrentAssets",
+        "currentAccountsPayable": "accountPayables",
+        "otherCurrentLiabilities": "otherCurrentLiabilities",
+        "shortTermDebt": "shortTermDebt",
+        "longTermDebt": "longTermDebt",
+    },
+    "cash_flow": {
+        "operatingCashflow": "operatingCashFlow",
+        "capitalExpenditures": "capitalExpenditure",
+        "depreciationDepletionAndAmortization": "depreciationAndAmortization",
+        "netIncome": "netIncome",
+    },
+}
+
+YFINANCE_FIELDS = {
+    "income_statement": {
+        "totalRevenue": "Total Revenue",
+        "costOfRevenue": "Cost Of Revenue",
+        "grossProfit": "Gross Profit",
+        "operatingExpenses": "Operating Expense",
+        "depreciationAndAmortization": "Reconciled Depreciation",
+        "ebit": "EBIT",
+        "ebitda": "EBITDA",
+        "interestExpense": "Interest Expense",
+        "incomeBeforeTax": "Pretax Income",
+        "incomeTaxExpense": "Tax Provision",
+        "netIncome": "Net Income",
+    },
+    "balance_sheet": {
+        "totalAssets": "Total Assets",
+        "totalLiabilities": "Total Liabilities Net Minority Interest",
+        "totalShareholderEquity": "Stockholders Equity",
+        "cashAndCashEquivalentsAtCarryingValue": "Cash And Cash Equivalents",
+        "currentNetReceivables": "Accounts Receivable",
+        "inventory": "Inventory",
+        "otherCurrentAssets": "Other Current Assets",
+        "currentAccountsPayable": "Accounts Payable",
+        "otherCurrentLiabilities": "Other Current Liabilities",
+        "shortTermDebt": "Current Debt",
+        "longTermDebt": "Long Term Debt",
+        "commonStockSharesOutstanding": "Ordinary Shares Number",
+    },
+    "cash_flow": {
+        "operatingCashflow": "Operating Cash Flow",
+        "capitalExpenditures": "Capital Expenditure",
+        "depreciationDepletionAndAmortization": "Depreciation And Amortization",
+        "netIncome": "Net Income From Continuing Operations",
+    },
+}
+
+# Fields stored as absolute values (Alpha Vantage reports capex as a positive outflow)
+ABSOLUTE_FIELDS = {"capitalExpenditures"}
+
+# name → {"cooldown_until": monotonic time, "last_seconds": duration of the last call}
+_health = {}
+_health_lock = threading.Lock()
+
+
+def _as_text(value, field=None):
+    if value is None or value == "":
+        return "None"
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return str(value)
+    if number != number:  # NaN
+        return "None"
+    if field in ABSOLUTE_FIELDS:
+        number = abs(number)
+    return str(int(number)) if number.is_integer() else str(number)
+
+
+def _unified_report(record, fields, fiscal_date, currency="USD"):
+    report = {"fiscalDateEnding": fiscal_date, "reportedCurrency": currency or "USD"}
+    for field, source in fields.items():
+        report[field] = _as_text(record.get(source), field)
+    return report
+
+
+def _get_json(url, params):
+    response = requests.get(url, params=params, timeout=REQUEST_TIMEOUT)
+    if response.status_code == 429:
+        return {"error": "Rate limit (HTTP 429)"}
+    if response.status_code != 200:
+        return {"error": "Failed to fetch"}
+    return response.json()
+
+
+# === Providers ===
+# Each returns a payload in the unified layout; failed sections hold {"error": ...}
+# stubs, which schema.validate_financials classifies (and marks throttles retryable).
+def fetch_alpha_vantage(symbol, api_key=None):
+    api_key = api_key or API_KEYS["alphavantage"]
+    financial_data = {}
+
+    for data_type, function in ALPHA_VANTAGE_FUNCTIONS.items():
+        data = _get_json(f"{BASE_URLS['alphavantage']}/query", {"function": function, "symbol": symbol, "apikey": api_key})
+        if "error" in data:
+            print(f"Failed to fetch {data_type} for {symbol}")
+            financial_data[data_type] = data
+        elif "Information" in data or "Note" in data:
+            print(f"⚠️ API limit reached or data unavailable for {symbol} - {data_type}")
+            financial_data[data_type] = {"error": data.get("Information", data.get("Note", "Unknown error"))}
+        else:
+            financial_data[data_type] = data
+
+    return financial_data
+
+
+def fetch_fmp(symbol, api_key=None):
+    api_key = api_key or API_KEYS["fmp"]
+    base_url = f"{BASE_URLS['fmp']}/api/v3"
+    paths = {"income_statement": "income-statement", "balance_sheet": "balance-sheet-statement",
+             "cash_flow": "cash-flow-statement"}
+    financial_data = {}
+
+    shares = {}
+    for section, path in paths.items():
+        reports = {}
+        for period, key in [("annual", "annualReports"), ("quarter", "quarterlyReports")]:
+            data = _get_json(f"{base_url}/{path}/{symbol}", {"period": period, "limit": HISTORY_LIMIT, "apikey": api_key})
+            if isinstance(data, dict):
+                reports = {"error": data.get("error") or data.get("Error Message", "Unknown error")}
+                break
+            reports[key] = [_unified_report(r, FMP_FIELDS[section], r.get("date"), r.get("reportedCurrency"))
+                            for r in data]
+            if section == "income_statement":
+                shares.update({r.get("date"): r.get("weightedAverageShsOut") for r in data})
+        if "error" not in reports:
+            reports["symbol"] = symbol
+        financial_data[section] = reports
+
+    # FMP's balance sheet has no share count; use the period's weighted average shares
+    for report in financial_data["balance_sheet"].get("annualReports", []) + \
+            financial_data["balance_sheet"].get("quarterlyReports", []):
+        report["commonStockSharesOutstanding"] = _as_text(shares.get(report["fiscalDateEnding"]))
+
+    profile = _get_json(f"{base_url}/profile/{symbol}", {"apikey": api_key})
+    if isinstance(profile, list) and profile:
+        profile = profile[0]
+        financial_data["overview"] = {
+            "Symbol": symbol,
+            "Name": profile.get("companyName"),
+            "Exchange": profile.get("exchangeShortName"),
+            "Currency": profile.get("currency"),
+            "Sector": profile.get("sector"),
+            "Industry": profile.get("industry"),
+            "Description": profile.get("description"),
+            "MarketCapitalization": _as_text(profile.get("mktCap")),
+            "Beta": _as_text(profile.get("beta")),
+        }
+        price, change = profile.get("price"), profile.get("changes")
+        previous = price - change if price is not None and change is not None else None
+        financial_data["quote"] = {"Global Quote": {
+            "01. symbol": symbol,
+            "05. price": _as_text(price),
+            "08. previous close": _as_text(previous),
+            "09. change": _as_text(change),
+        }}
+    else:
+        error = profile.get("error") or profile.get("Error Message", "Unknown error") if isinstance(profile, dict) else "Empty profile"
+        financial_data["overview"] = {"error": error}
+        financial_data["quote"] = {"error": error}
+
+    return financial_data
+
+
+def fetch_yfinance(symbol, api_key=None):
+    import yfinance as yf
+    ticker = yf.Ticker(symbol)
+    financial_data = {}
+
+    frames = {
+        "income_statement": (ticker.income_stmt, ticker.quarterly_income_stmt),
+        "balance_sheet": (ticker.balance_sheet, ticker.quarterly_balance_sheet),
+        "cash_flow": (ticker.cashflow, ticker.quarterly_cashflow),
+    }
+    for section, (annual, quarterly) in frames.items():
+        financial_data[section] = {"symbol": symbol}
+        for key, frame in [("annualReports", annual), ("quarterlyReports", quarterly)]:
+            financial_data[section][key] = [
+                _unified_report(frame[column].to_dict(), YFINANCE_FIELDS[section], column.strftime("%Y-%m-%d"))
+                for column in frame.columns
+            ]
+
+    info = ticker.info
+    financial_data["overview"] = {
+        "Symbol": symbol,
+        "Name": info.get("longName") or info.get("shortName"),
+        "Exchange": info.get("exchange"),
+        "Currency": info.get("currency"),
+        "Sector": info.get("sector"),
+        "Industry": info.get("industry"),
+        "Description": info.get("longBusinessSummary"),
+        "MarketCapitalization": _as_text(info.get("marketCap")),
+        "Beta": _as_text(info.get("beta")),
+    }
+    financial_data["quote"] = {"Global Quote": {
+        "01. symbol": symbol,
+        "05. price": _as_text(info.get("currentPrice") or info.get("regularMarketPrice")),
+        "08. previous close": _as_text(info.get("previousClose")),
+    }}
+    return financial_data
+
+
+PROVIDERS = {
+    "alphavantage": fetch_alpha_vantage,
+    "fmp": fetch_fmp,
+    "yfinance": fetch_yfinance,
+}
+
+
+# === Health ===
+def _healthy(name):
+    with _health_lock:
+        return _health.get(name, {}).get("cooldown_until", 0) <= time.monotonic()
+
+
+def _record_outcome(name, validation, seconds):
+    with _health_lock:
+        state = _health.setdefault(name, {})
+        state["last_seconds"] = seconds
+        if validation["status"] == UNUSABLE:
+            reason = "throttle" if validation["retryable"] else "error"
+            state["cooldown_until"] = time.monotonic() + COOLDOWN_SECONDS[reason]
+        else:
+            state["cooldown_until"] = 0
+
+
+def provider_health():
+    """Snapshot of per-provider state: seconds until usable again and last call duration."""
+    now = time.monotonic()
+    with _health_lock:
+        return {name: {"cooldown": max(0.0, state.get("cooldown_until", 0) - now),
+                       "last_seconds": state.get("last_seconds")} for name, state in _health.items()}
+
+
+def _attempt(name, symbol, api_keys):
+    start = time.perf_counter()
+    try:
+        payload = PROVIDERS[name](symbol, api_keys.get(name))
+        validation = validate_financials(payload)
+    except Exception as e:  # network errors, missing yfinance, malformed replies
+        payload = None
+        validation = {"status": UNUSABLE, "missing": ["<payload>"], "missing_optional": [],
+                      "errors": [f"{type(e).__name__}: {e}"], "retryable": False}
+    seconds = time.perf_counter() - start
+    _record_outcome(name, validation, seconds)
+    return {"provider": name, "payload": payload, "validation": validation, "seconds": seconds}
+
+
+# === Failover / hedging ===
+def fetch_financials(symbol, providers=DEFAULT_PROVIDERS, hedge_after=None, api_keys=None):
+    """
+    Fetches one ticker's statements in the unified layout from the first provider that
+    returns a usable payload.
+
+    Parameters:
+    - symbol: Ticker symbol
+    - providers: Provider names in order of preference; cooling-down ones are tried last
+    - hedge_after: Seconds to wait on a provider before also firing the next one (None = plain
+      failover). The first usable reply wins; throttles and errors fail over immediately.
+    - api_keys: Optional {provider: key} overrides
+
+    Returns (payload, attempts). If no provider succeeds, payload is the preferred
+    provider's reply (error stubs included) or None.
+    """
+    api_keys = api_keys or {}
+    ordered = [p for p in providers if _healthy(p)] + [p for p in providers if not _healthy(p)]
+    attempts = []
+
+    if hedge_after is None:
+        for name in ordered:
+            attempt = _attempt(name, symbol, api_keys)
+            attempts.append(attempt)
+            if attempt["validation"]["status"] != UNUSABLE:
+                return attempt["payload"], attempts
+        return _fallback_payload(attempts, ordered), attempts
+
+    queue = iter(ordered)
+    pending = {}
+    pool = ThreadPoolExecutor(max_workers=len(ordered))
+
+    def launch():
+        name = next(queue, None)
+        if name is not None:
+            pending[pool.submit(_attempt, name, symbol, api_keys)] = name
+        return name is not None
+
+    try:
+        more = launch()
+        while pending:
+            done, _ = wait(pending, timeout=hedge_after if more else None, return_when=FIRST_COMPLETED)
+            if not done:
+                more = launch()  # the running provider is slow: hedge with the next one
+                continue
+            for future in done:
+                pending.pop(future)
+                attempt = future.result()
+                attempts.append(attempt)
+                if attempt["validation"]["status"] != UNUSABLE:
+                    return attempt["payload"], attempts
+                more = launch()  # failed outright: fail over without waiting
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return _fallback_payload(attempts, ordered), attempts
+
+
+def _fallback_payload(attempts, ordered):
+    by_provider = {a["provider"]: a["payload"] for a in attempts if a["payload"] is not None}
+    return next((by_provider[name] for name in ordered if name in by_provider), None)
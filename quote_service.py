@@ -0,0 +1,296 @@
+import os
+import sys
+import json
+import time
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import requests
+from providers import API_KEYS, BASE_URLS, REQUEST_TIMEOUT
+from storage import atomic_write_json, file_lock, single_flight
+from units import to_float_array
+
+DATA_FOLDER = "data"
+QUOTE_PROVIDERS = ("fmp", "alphavantage")      # batched endpoints, in order of preference
+BATCH_SIZES = {"fmp": 100, "alphavantage": 100}  # symbols per request (Alpha Vantage caps bulk quotes at 100)
+MAX_CONCURRENT_BATCHES = 4
+MAX_AGE_SECONDS = 15 * 60                       # quotes older than this are refreshed
+REFRESH_INTERVAL_SECONDS = 60                   # scheduler period
+QUOTES_LOCK = "quotes"
+
+# Provider field → quote record field
+FMP_QUOTE_FIELDS = {
+    "price": "price", "open": "open", "high": "dayHigh", "low": "dayLow", "previous_close": "previousClose",
+    "change": "change", "change_percent": "changesPercentage", "volume": "volume", "market_cap": "marketCap",
+}
+ALPHA_VANTAGE_QUOTE_FIELDS = {
+    "price": "close", "open": "open", "high": "high", "low": "low", "previous_close": "previous_close",
+    "change": "change", "change_percent": "change_percent", "volume": "volume",
+}
+
+# data folder → {"version" (quotes file mtime), "quotes": {ticker → record}}; shared by every
+# session and thread in the process, re-read only when another process rewrote the file
+_cache = {}
+_cache_lock = threading.Lock()
+# data folder → stop event of the running scheduler thread
+_refreshers = {}
+
+
+def quotes_path(data_folder=DATA_FOLDER):
+    return os.path.join(data_folder, "cache", "quotes", "quotes.json")
+
+
+# === Batched fetches ===
+def _records(rows, symbol_field, fields, source, fetched_at):
+    """Provider rows → {ticker: quote record}, numbers parsed column by column."""
+    rows = [row for row in rows if isinstance(row, dict) and row.get(symbol_field)]
+    records = {str(row[symbol_field]).upper(): {"symbol": str(row[symbol_field]).upper(), "source": source,
+                                                "fetched_at": fetched_at} for row in rows}
+    for field, source_field in fields.items():
+        for record, value in zip(records.values(), to_float_array([row.get(source_field) for row in rows])):
+            record[field] = float(value)
+    return records
+
+
+def fetch_fmp_quotes(tickers, api_key=None):
+    """One FMP batch quote request (/api/v3/quote/A,B,C) → {ticker: record}."""
+    fetched_at = time.time()
+    response = requests.get(f"{BASE_URLS['fmp']}/api/v3/quote/{','.join(tickers)}",
+                            params={"apikey": api_key or API_KEYS["fmp"]}, timeout=REQUEST_TIMEOUT)
+    rows = response.json() if response.status_code == 200 else None
+    if not isinstance(rows, list):
+        raise ValueError(f"FMP batch quote failed (HTTP {response.status_code})")
+    records = _records(rows, "symbol", FMP_QUOTE_FIELDS, "fmp", fetched_at)
+    for row in rows:
+        record = records.get(str(row.get("symbol", "")).upper())
+        if record is not None and row.get("timestamp"):
+            record["trading_day"] = datetime.datetime.fromtimestamp(row["timestamp"], datetime.timezone.utc).date().isoformat()
+    return records
+
+
+def fetch_alpha_vantage_quotes(tickers, api_key=None):
+    """One Alpha Vantage REALTIME_BULK_QUOTES request → {ticker: record}."""
+    fetched_at = time.time()
+    response = requests.get(f"{BASE_URLS['alphavantage']}/query",
+                            params={"function": "REALTIME_BULK_QUOTES", "symbol": ",".join(tickers),
+                                    "apikey": api_key or API_KEYS["alphavantage"]}, timeout=REQUEST_TIMEOUT)
+    payload = response.json() if response.status_code == 200 else {}
+    rows = payload.get("data") if isinstance(payload, dict) else None
+    if not isinstance(rows, list):
+        message = payload.get("Information") or payload.get("Note") if isinstance(payload, dict) else None
+        raise ValueError(message or f"Alpha Vantage bulk quote failed (HTTP {response.status_code})")
+    records = _records(rows, "symbol", ALPHA_VANTAGE_QUOTE_FIELDS, "alphavantage", fetched_at)
+    for row in rows:
+        record = records.get(str(row.get("symbol", "")).upper())
+        if record is not None and row.get("timestamp"):
+            record["trading_day"] = str(row["timestamp"])[:10]
+    return records
+
+
+QUOTE_FETCHERS = {
+    "fmp": fetch_fmp_quotes,
+    "alphavantage": fetch_alpha_vantage_quotes,
+}
+
+
+def _fetch_batch(tickers, providers, api_keys):
+    """Quotes for one batch; symbols a provider fails on or omits go to the next one."""
+    records, remaining = {}, list(tickers)
+    for name in providers:
+        if not remaining:
+            break
+        try:
+            records.update(QUOTE_FETCHERS[name](remaining, api_keys.get(name)))
+        except (requests.RequestException, ValueError) as e:
+            print(f"⚠️ {name} quotes for {len(remaining)} ticker(s) failed: {e}")
+            continue
+        remaining = [t for t in remaining if t not in records or not np.isfinite(records[t]["price"])]
+    return {t: r for t, r in records.items() if np.isfinite(r["price"])}
+
+
+def fetch_quotes(tickers, providers=QUOTE_PROVIDERS, api_keys=None, max_workers=MAX_CONCURRENT_BATCHES):
+    """
+    Latest quotes for `tickers` in batched requests (BATCH_SIZES symbols each, up to
+    `max_workers` batches in flight), failing over per batch. Returns {ticker: record};
+    tickers no provider could quote are left out.
+    """
+    tickers = list(dict.fromkeys(t.upper() for t in tickers))
+    if not tickers:
+        return {}
+    size = min(BATCH_SIZES[name] for name in providers)
+    batches = [tickers[i:i + size] for i in range(0, len(tickers), size)]
+    records = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(batches)))) as pool:
+        for batch_records in pool.map(lambda batch: _fetch_batch(batch, providers, api_keys or {}), batches):
+            records.update(batch_records)
+    return records
+
+
+# === Shared quote cache ===
+def quotes_version(data_folder=DATA_FOLDER):
+    """mtime of the quotes file (None before the first refresh); changes on every refresh."""
+    try:
+        return os.stat(quotes_path(data_folder)).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _read_quotes(data_folder):
+    try:
+        with open(quotes_path(data_folder), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _current(data_folder):
+    """The process-wide quote dict, re-read only if the file changed since it was loaded."""
+    version = quotes_version(data_folder)
+    cached = _cache.get(data_folder)
+    if cached is not None and cached["version"] == version:
+        return cached["quotes"]
+    with _cache_lock:
+        cached = _cache.get(data_folder)
+        if cached is None or cached["version"] != version:
+            cached = {"version": version, "quotes": _read_quotes(data_folder)}
+            _cache[data_folder] = cached
+        return cached["quotes"]
+
+
+def get_quotes(tickers=None, data_folder=DATA_FOLDER, max_age=None):
+    """
+    Cached quote records {ticker: {"price", "open", "high", "low", "previous_close",
+    "change", "change_percent", "volume", "market_cap", "trading_day", "source",
+    "fetched_at"}} for `tickers` (default: all). With `max_age` (seconds) only
+    quotes fetched within that long are returned.
+    """
+    quotes = _current(data_folder)
+    if tickers is not None:
+        quotes = {t: quotes[t] for t in tickers if t in quotes}
+    if max_age is not None:
+        cutoff = time.time() - max_age
+        quotes = {t: q for t, q in quotes.items() if q["fetched_at"] >= cutoff}
+    return quotes
+
+
+def get_quote(ticker, data_folder=DATA_FOLDER, max_age=None):
+    """One ticker's cached quote record, or None."""
+    return get_quotes([ticker], data_folder, max_age).get(ticker)
+
+
+def store_quotes(records, data_folder=DATA_FOLDER):
+    """Merges fetched records into the quotes file (newest fetch per ticker wins) under the quotes lock."""
+    with file_lock(QUOTES_LOCK, data_folder):
+        quotes = _read_quotes(data_folder)
+        for ticker, record in records.items():
+            if ticker not in quotes or quotes[ticker]["fetched_at"] <= record["fetched_at"]:
+                quotes[ticker] = record
+        atomic_write_json(quotes_path(data_folder), quotes, indent=None)
+    with _cache_lock:
+        _cache[data_folder] = {"version": quotes_version(data_folder), "quotes": quotes}
+    return quotes
+
+
+# === Derived metrics ===
+def repriced_market_cap(market_cap, old_price, price, quoted_market_cap=np.nan):
+    """
+    Market caps after a price move: the quoted market cap where there is one, else the
+    stored one scaled by price / old price; unchanged where neither can be computed.
+    """
+    market_cap = np.asarray(market_cap, dtype=float)
+    quoted_market_cap = np.asarray(quoted_market_cap, dtype=float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        scaled = market_cap * np.asarray(price, dtype=float) / np.asarray(old_price, dtype=float)
+    return np.where(np.isfinite(quoted_market_cap), quoted_market_cap, np.where(np.isfinite(scaled), scaled, market_cap))
+
+
+# === Refresh ===
+def quote_universe(data_folder=DATA_FOLDER):
+    """Every ticker with stored financials plus every peer in the comps store."""
+    from comps_store import load_comps_store, PLACEHOLDER_RANK
+    tickers = {f.replace("_financials.json", "") for f in os.listdir(data_folder) if f.endswith("_financials.json")}
+    rows = load_comps_store(data_folder)
+    if len(rows):
+        tickers.update(np.unique(rows["peer"][rows["rank"] != PLACEHOLDER_RANK]).tolist())
+    return sorted(tickers)
+
+
+def refresh_quotes(tickers=None, data_folder=DATA_FOLDER, max_age=MAX_AGE_SECONDS, providers=QUOTE_PROVIDERS,
+                   api_keys=None):
+    """
+    Refreshes the quotes of `tickers` (default: quote_universe()) that are missing or
+    older than `max_age` seconds, in batched requests, and pushes the new prices into
+    the comps store (peer price, market cap and EV). Statements are never refetched.
+    Concurrent refreshes of the same tickers in this process share one run.
+
+    Returns {"requested", "refreshed", "missing", "seconds"}.
+    """
+    tickers = sorted({t.upper() for t in tickers}) if tickers is not None else quote_universe(data_folder)
+
+    def run():
+        started = time.perf_counter()
+        fresh = get_quotes(tickers, data_folder, max_age)
+        stale = [t for t in tickers if t not in fresh]
+        records = fetch_quotes(stale, providers, api_keys)
+        if records:
+            quotes = store_quotes(records, data_folder)
+            from comps_store import apply_quotes
+            apply_quotes(quotes, data_folder)
+        return {"requested": len(stale), "refreshed": len(records),
+                "missing": [t for t in stale if t not in records], "seconds": time.perf_counter() - started}
+
+    return single_flight(("quotes", os.path.abspath(data_folder), tuple(tickers), max_age), run)
+
+
+def start_refresher(interval=REFRESH_INTERVAL_SECONDS, data_folder=DATA_FOLDER, tickers=None, max_age=None):
+    """
+    Starts (once per data folder and process) a daemon thread that calls refresh_quotes
+    every `interval` seconds; quotes older than `max_age` (default: the interval) are
+    refetched. Returns the threading.Event that stops it.
+    """
+    if data_folder in _refreshers and not _refreshers[data_folder].is_set():
+        return _refreshers[data_folder]
+    stop = _refreshers[data_folder] = threading.Event()
+    max_age = interval if max_age is None else max_age
+
+    def loop():
+        while not stop.is_set():
+            try:
+                result = refresh_quotes(tickers, data_folder, max_age)
+                print(f"📡 Quotes: {result['refreshed']} of {result['requested']} refreshed in {result['seconds']:.2f}s")
+            except Exception as e:  # keep the schedule alive through provider and file errors
+                print(f"⚠️ Quote refresh failed: {e}")
+            stop.wait(interval)
+
+    threading.Thread(target=loop, name=f"quote-refresher-{data_folder}", daemon=True).start()
+    return stop
+
+
+def _option(name, default):
+    """Value of a "--name=value" command-line option."""
+    for arg in sys.argv[1:]:
+        if arg.startswith(f"--{name}="):
+            return arg.split("=", 1)[1]
+    return default
+
+
+# === Entry point when script is called directly ===
+if __name__ == "__main__":
+    # python quote_service.py [TICKER ...] [--interval=60] [--once]
+    tickers = [a.upper() for a in sys.argv[1:] if not a.startswith("--")] or None
+    interval = float(_option("interval", REFRESH_INTERVAL_SECONDS))
+    if "--once" in sys.argv:
+        result = refresh_quotes(tickers, max_age=0)
+        print(f"✅ {result['refreshed']} of {result['requested']} quotes refreshed in {result['seconds']:.2f}s")
+        if result["missing"]:
+            print(f"⚠️ No quote for: {', '.join(result['missing'])}")
+        sys.exit(0)
+
+    stop = start_refresher(interval, tickers=tickers)
+    print(f"⏱️ Refreshing quotes every {interval:.0f}s (Ctrl+C to stop)")
+    try:
+        while not stop.wait(3600):
+            pass
+    except KeyboardInterrupt:
+        stop.set()
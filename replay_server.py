@@ -0,0 +1,483 @@
+import os
+import re
+import sys
+import json
+import gzip
+import time
+import random
+import hashlib
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qsl, urlencode
+import requests
+
+DATA_FOLDER = "data"
+ARCHIVE_PATH = os.path.join(DATA_FOLDER, "replay", "archive.jsonl.gz")
+DEFAULT_PORT = 8765
+
+# Each provider is mounted under /<name> on the local server; fetchers pick it up from
+# the environment variable next to it (see env_settings)
+PROVIDERS = {
+    "alphavantage": ("https://www.alphavantage.co", "ALPHA_VANTAGE_BASE_URL"),
+    "fmp": ("https://financialmodelingprep.com", "FMP_BASE_URL"),
+    "openai": ("https://api.openai.com", "OPENAI_BASE_URL"),
+    "yahoo": ("https://query1.finance.yahoo.com", "YAHOO_BASE_URL"),
+}
+
+# Never part of an archive key (or stored): credentials differ between machines
+SECRET_PARAMS = {"apikey", "api_key", "token"}
+
+# What each provider sends back when it throttles, so callers exercise their real handling
+THROTTLE_RESPONSES = {
+    "alphavantage": (200, {"Note": "Thank you for using Alpha Vantage! Our standard API call frequency is "
+                                   "5 calls per minute and 25 calls per day."}),
+    "fmp": (429, {"Error Message": "Limit Reach. Please upgrade your plan or visit our documentation for more details."}),
+    "openai": (429, {"error": {"message": "Rate limit reached for requests", "type": "requests", "code": "rate_limit_exceeded"}}),
+    "yahoo": (429, {"chart": {"result": None, "error": {"code": "Too Many Requests", "description": "Rate limited"}}}),
+}
+
+DEFAULT_BEHAVIOUR = {
+    "latency": 0.0,         # seconds added before every response
+    "jitter": 0.0,          # ± uniform noise on top of latency, in seconds
+    "error_rate": 0.0,      # share of requests answered with HTTP 503
+    "throttle": 0,          # max requests per provider per minute; 0 = unlimited
+    "seed": 0,              # RNG seed, so error injection is reproducible
+}
+
+# "AAPL_17" (a synthetic universe ticker) falls back to the "AAPL" recording
+_SYNTHETIC_TICKER = re.compile(r"\b([A-Z][A-Z.\-]*)_\d+\b")
+
+
+# === Archive ===
+def archive_key(provider, method, path, query="", body=None):
+    """
+    Stable key for one request: provider, method, path and sorted query without
+    credentials; JSON bodies are canonicalised and hashed.
+    """
+    params = sorted((k, v) for k, v in parse_qsl(query, keep_blank_values=True) if k.lower() not in SECRET_PARAMS)
+    key = f"{provider} {method.upper()} {path}"
+    if params:
+        key += f"?{urlencode(params)}"
+    if body:
+        try:
+            body = json.dumps(json.loads(body), sort_keys=True, separators=(",", ":"))
+        except (ValueError, TypeError):
+            body = body.decode("utf-8", "replace") if isinstance(body, bytes) else str(body)
+        key += f"#{hashlib.sha1(body.encode()).hexdigest()[:16]}"
+    return key
+
+
+def load_archive(path=ARCHIVE_PATH):
+    """{key: {"status", "content_type", "body"}} from a gzip JSON-lines archive."""
+    if not os.path.exists(path):
+        return {}
+    archive = {}
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                archive[entry.pop("key")] = entry
+    return archive
+
+
+def save_archive(archive, path=ARCHIVE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=9) as f:
+        for key in sorted(archive):
+            f.write(json.dumps({"key": key, **archive[key]}) + "\n")
+    os.replace(tmp_path, path)
+    return path
+
+
+def _entry(payload, status=200, content_type="application/json"):
+    return {"status": status, "content_type": content_type,
+            "body": payload if isinstance(payload, str) else json.dumps(payload),
+            "recorded": datetime.now(timezone.utc).isoformat(timespec="seconds")}
+
+
+def _number(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if number == number else None
+
+
+def _fmp_statement(reports, section, ticker, shares):
+    """
+    Alpha Vantage reports rewritten as an FMP statement reply: newest first, at most
+    HISTORY_LIMIT records, FMP field names and numbers (capex negative, as FMP reports it).
+    Income statements carry weightedAverageShsOut from the balance sheet of the same date.
+    """
+    from providers import FMP_FIELDS, HISTORY_LIMIT
+    records = []
+    for report in sorted(reports, key=lambda r: r.get("fiscalDateEnding", ""), reverse=True)[:HISTORY_LIMIT]:
+        date = report.get("fiscalDateEnding")
+        record = {"date": date, "symbol": ticker, "reportedCurrency": report.get("reportedCurrency") or "USD"}
+        for field, source in FMP_FIELDS[section].items():
+            record[source] = _number(report.get(field))
+        if section == "cash_flow" and record["capitalExpenditure"] is not None:
+            record["capitalExpenditure"] = -abs(record["capitalExpenditure"])
+        if section == "income_statement":
+            record["weightedAverageShsOut"] = shares.get(date)
+        records.append(record)
+    return records
+
+
+def _fmp_profile(ticker, financials):
+    """An FMP profile reply built from an Alpha Vantage overview and quote."""
+    overview = financials.get("overview", {})
+    quote = financials.get("quote", {}).get("Global Quote", {})
+    return [{
+        "symbol": ticker,
+        "companyName": overview.get("Name"),
+        "exchangeShortName": overview.get("Exchange"),
+        "currency": overview.get("Currency"),
+        "sector": overview.get("Sector"),
+        "industry": overview.get("Industry"),
+        "description": overview.get("Description"),
+        "mktCap": _number(overview.get("MarketCapitalization")),
+        "beta": _number(overview.get("Beta")),
+        "price": _number(quote.get("05. price")),
+        "changes": _number(quote.get("09. change")),
+    }]
+
+
+def _seed_quotes(archive, ticker, quote, trading_day=None):
+    """
+    Per-ticker quote entries for both batched quote endpoints (FMP /api/v3/quote and
+    Alpha Vantage REALTIME_BULK_QUOTES); _bulk_quote assembles multi-symbol replies from them.
+    `quote` holds price, open, high, low, previous_close, change, change_percent, volume, market_cap.
+    """
+    timestamp = (int(datetime.strptime(trading_day, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp())
+                 if trading_day else None)
+    fmp_row = {"symbol": ticker, "price": quote["price"], "open": quote.get("open"), "dayHigh": quote.get("high"),
+               "dayLow": quote.get("low"), "previousClose": quote.get("previous_close"), "change": quote.get("change"),
+               "changesPercentage": quote.get("change_percent"), "volume": quote.get("volume"),
+               "marketCap": quote.get("market_cap"), "timestamp": timestamp}
+    archive[archive_key("fmp", "GET", f"/api/v3/quote/{ticker}")] = _entry([fmp_row])
+    av_row = {"symbol": ticker, "timestamp": trading_day, "open": quote.get("open"), "high": quote.get("high"),
+              "low": quote.get("low"), "close": quote["price"], "volume": quote.get("volume"),
+              "previous_close": quote.get("previous_close"), "change": quote.get("change"),
+              "change_percent": quote.get("change_percent")}
+    key = archive_key("alphavantage", "GET", "/query", f"function=REALTIME_BULK_QUOTES&symbol={ticker}")
+    archive[key] = _entry({"endpoint": "Realtime Bulk Quotes", "data": [av_row]})
+
+
+def _bulk_quote(archive, provider, path, query):
+    """
+    Reply to a multi-symbol quote request assembled from the per-ticker quote entries,
+    since batches group symbols differently on every run. Symbols without an entry are
+    left out, like the providers do; None if none of them is archived.
+    """
+    params = dict(parse_qsl(query))
+    if provider == "fmp" and path.startswith("/api/v3/quote/"):
+        symbols = path[len("/api/v3/quote/"):].split(",")
+        keys = [archive_key("fmp", "GET", f"/api/v3/quote/{symbol}") for symbol in symbols]
+    elif provider == "alphavantage" and params.get("function") == "REALTIME_BULK_QUOTES":
+        symbols = params.get("symbol", "").split(",")
+        keys = [archive_key("alphavantage", "GET", "/query", f"function=REALTIME_BULK_QUOTES&symbol={symbol}")
+                for symbol in symbols]
+    else:
+        return None
+
+    rows = []
+    for symbol, key in zip(symbols, keys):
+        entry = archive.get(key) or archive.get(_SYNTHETIC_TICKER.sub(r"\1", key))
+        if entry is not None and entry["status"] == 200:
+            body = json.loads(entry["body"])
+            rows += [dict(row, symbol=symbol) for row in (body if provider == "fmp" else body.get("data", []))]
+    if not rows:
+        return None
+    return _entry(rows if provider == "fmp" else {"endpoint": "Realtime Bulk Quotes", "data": rows})
+
+
+def seed_from_fixtures(data_folder=DATA_FOLDER, archive=None):
+    """
+    Builds archive entries from the stored *_financials / *_comparable_analysis /
+    *_chart.json files, so the pipeline can replay without ever having recorded:
+    Alpha Vantage statements; for every *_financials.json ticker the FMP annual and
+    quarterly statements and profile that providers.fetch_fmp requests; FMP annual
+    statements and profiles of comps targets and peers; batched quotes (quote_service.py)
+    of every ticker and peer; the OpenAI peer list for each target and Yahoo daily bars.
+    """
+    from comparable_company_analysis import openai_peer_payload
+    from providers import HISTORY_LIMIT
+    archive = {} if archive is None else archive
+    files = sorted(os.listdir(data_folder))
+
+    av_sections = {"BALANCE_SHEET": "balance_sheet", "INCOME_STATEMENT": "income_statement",
+                   "CASH_FLOW": "cash_flow", "OVERVIEW": "overview", "GLOBAL_QUOTE": "quote"}
+    fmp_paths = {"income_statement": "income-statement", "balance_sheet": "balance-sheet-statement",
+                 "cash_flow": "cash-flow-statement"}
+    quoted = set()      # tickers quoted from their own statements; peers without one use their profile
+    for name in files:
+        if not name.endswith("_financials.json"):
+            continue
+        ticker = name.replace("_financials.json", "")
+        with open(os.path.join(data_folder, name), "r") as f:
+            financials = json.load(f)
+        for function, section in av_sections.items():
+            if section in financials and "error" not in financials[section]:
+                key = archive_key("alphavantage", "GET", "/query", f"function={function}&symbol={ticker}")
+                archive[key] = _entry(financials[section])
+
+        balance = financials.get("balance_sheet", {})
+        shares = {r.get("fiscalDateEnding"): _number(r.get("commonStockSharesOutstanding"))
+                  for r in balance.get("annualReports", []) + balance.get("quarterlyReports", [])}
+        blocks = {section: financials.get(section, {}) for section in fmp_paths}
+        blocks = {section: block for section, block in blocks.items() if "error" not in block}
+        for period, reports in [("annual", "annualReports"), ("quarter", "quarterlyReports")]:
+            # FMP returns the three statements for the same periods; keep the dates all of them cover
+            dates = set.intersection(*({r.get("fiscalDateEnding") for r in block.get(reports, [])}
+                                       for block in blocks.values())) if blocks else set()
+            for section, block in blocks.items():
+                aligned = [r for r in block.get(reports, []) if r.get("fiscalDateEnding") in dates]
+                key = archive_key("fmp", "GET", f"/api/v3/{fmp_paths[section]}/{ticker}",
+                                  f"period={period}&limit={HISTORY_LIMIT}")
+                archive[key] = _entry(_fmp_statement(aligned, section, ticker, shares))
+        if "error" not in financials.get("overview", {"error": None}):
+            archive[archive_key("fmp", "GET", f"/api/v3/profile/{ticker}")] = _entry(_fmp_profile(ticker, financials))
+
+        quote = financials.get("quote", {}).get("Global Quote", {})
+        if _number(quote.get("05. price")) is not None:
+            fields = {"price": "05. price", "open": "02. open", "high": "03. high", "low": "04. low",
+                      "previous_close": "08. previous close", "change": "09. change", "volume": "06. volume"}
+            values = {name: _number(quote.get(field)) for name, field in fields.items()}
+            values["change_percent"] = _number(str(quote.get("10. change percent", "")).rstrip("%"))
+            values["market_cap"] = _number(financials.get("overview", {}).get("MarketCapitalization"))
+            quoted.add(ticker)
+            _seed_quotes(archive, ticker, values, quote.get("07. latest trading day"))
+
+    for name in files:
+        if not name.endswith("_comparable_analysis.json"):
+            continue
+        with open(os.path.join(data_folder, name), "r") as f:
+            comp_data = json.load(f)
+        target = comp_data.get("target", {})
+        companies = {target.get("ticker"): target.get("financials", {})}
+        companies.update({peer: data.get("financials", {}) for peer, data in comp_data.get("peers", {}).items()})
+        for ticker, financials in companies.items():
+            if not ticker or not financials:
+                continue
+            for path, section in [(f"/api/v3/income-statement/{ticker}", "income_statement"),
+                                  (f"/api/v3/balance-sheet-statement/{ticker}", "balance_sheet")]:
+                archive[archive_key("fmp", "GET", path, "limit=1")] = _entry([financials[section]])
+            archive[archive_key("fmp", "GET", f"/api/v3/profile/{ticker}")] = _entry([financials["overview"]])
+            price = _number(financials["overview"].get("price"))
+            if ticker not in quoted and price is not None:
+                change = _number(financials["overview"].get("changes"))
+                _seed_quotes(archive, ticker, {"price": price, "change": change,
+                                               "previous_close": price - change if change is not None else None,
+                                               "market_cap": _number(financials["overview"].get("mktCap"))})
+
+        if target.get("ticker") and target.get("market_cap"):
+            request = json.dumps(openai_peer_payload(target["ticker"], target["market_cap"]))
+            reply = {"object": "chat.completion", "model": "gpt-4o-mini",
+                     "choices": [{"index": 0, "finish_reason": "stop",
+                                  "message": {"role": "assistant", "content": json.dumps(list(comp_data.get("peers", {})))}}]}
+            archive[archive_key("openai", "POST", "/v1/chat/completions", body=request)] = _entry(reply)
+
+    for name in files:
+        if not name.endswith("_chart.json"):
+            continue
+        ticker = name.replace("_chart.json", "")
+        with open(os.path.join(data_folder, name), "r") as f:
+            bars = json.load(f)
+        timestamps = [int(datetime.strptime(bar["Date"], "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp()) for bar in bars]
+        chart = {"chart": {"error": None, "result": [{
+            "meta": {"symbol": ticker, "currency": "USD", "dataGranularity": "1d", "range": "5y"},
+            "timestamp": timestamps,
+            "indicators": {"quote": [{field.lower(): [bar[field] for bar in bars] for field in ["Open", "High", "Low", "Close"]}]},
+        }]}}
+        archive[archive_key("yahoo", "GET", f"/v8/finance/chart/{ticker}", "range=5y&interval=1d")] = _entry(chart)
+
+    return archive
+
+
+# === Server ===
+class _ReplayHandler(BaseHTTPRequestHandler):
+    """Routes /<provider>/... to the archive (replay) or to the real provider (record)."""
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def _handle(self, method):
+        server = self.server
+        parts = urlsplit(self.path)
+        provider, _, path = parts.path.lstrip("/").partition("/")
+        path = "/" + path
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else None
+
+        if provider not in PROVIDERS:
+            return self._send(404, {"error": f"Unknown provider mount: /{provider}"})
+
+        behaviour = server.behaviour
+        delay = behaviour["latency"] + (server.rng.uniform(-1, 1) * behaviour["jitter"] if behaviour["jitter"] else 0)
+        if delay > 0:
+            time.sleep(delay)
+
+        if behaviour["throttle"] and _throttled(server, provider, behaviour["throttle"]):
+            status, payload = THROTTLE_RESPONSES[provider]
+            return self._send(status, payload)
+        with server.lock:
+            fail = behaviour["error_rate"] and server.rng.random() < behaviour["error_rate"]
+        if fail:
+            return self._send(503, {"error": "Injected provider error"})
+
+        key = archive_key(provider, method, path, parts.query, body)
+        # Quotes first: a synthetic ticker must come back under its own symbol, not the recording's
+        entry = (_bulk_quote(server.archive, provider, path, parts.query) or server.archive.get(key)
+                 or server.archive.get(_SYNTHETIC_TICKER.sub(r"\1", key)))
+        if entry is None and server.mode == "record":
+            entry = _record(server, provider, method, path, parts.query, body, key, self.headers)
+        if entry is None:
+            return self._send(404, {"error": f"Not in replay archive: {key}"})
+        self._send(entry["status"], entry["body"], entry.get("content_type", "application/json"))
+
+    def _send(self, status, payload, content_type="application/json"):
+        body = (payload if isinstance(payload, str) else json.dumps(payload)).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def _throttled(server, provider, per_minute):
+    """Sliding one-minute window per provider."""
+    now = time.monotonic()
+    with server.lock:
+        window = server.windows.setdefault(provider, deque())
+        while window and now - window[0] > 60:
+            window.popleft()
+        if len(window) >= per_minute:
+            return True
+        window.append(now)
+        return False
+
+
+def _record(server, provider, method, path, query, body, key, request_headers):
+    """Forwards a request to the real provider and stores the response under `key`."""
+    upstream = PROVIDERS[provider][0]
+    headers = {"User-Agent": "Mozilla/5.0"}
+    for name in ("Authorization", "Content-Type"):
+        if request_headers.get(name):
+            headers[name] = request_headers[name]
+    url = f"{upstream}{path}" + (f"?{query}" if query else "")
+    try:
+        response = requests.request(method, url, data=body, headers=headers, timeout=60)
+    except requests.RequestException as e:
+        print(f"❌ Upstream {provider} request failed: {e}")
+        return None
+
+    entry = _entry(response.text, response.status_code, response.headers.get("Content-Type", "application/json"))
+    # Throttle and error replies are passed through but not archived
+    if response.status_code == 200 and not _is_throttle_payload(response.text):
+        with server.lock:
+            server.archive[key] = entry
+            server.unsaved += 1
+            if server.unsaved >= 25:
+                save_archive(server.archive, server.archive_path)
+                server.unsaved = 0
+        print(f"📼 Recorded {key}")
+    return entry
+
+
+def _is_throttle_payload(text):
+    lowered = text[:500].lower()
+    return any(marker in lowered for marker in ("api call frequency", "rate limit", "limit reach"))
+
+
+def start_replay_server(archive=None, mode="replay", port=0, archive_path=ARCHIVE_PATH, verbose=False, **behaviour):
+    """
+    Starts the stand-in server in a background thread.
+
+    Parameters:
+    - archive: Preloaded archive dict (defaults to the one at archive_path)
+    - mode: "replay" serves only from the archive; "record" forwards misses upstream and stores them
+    - port: 0 picks a free port
+    - behaviour: latency, jitter, error_rate, throttle, seed (see DEFAULT_BEHAVIOUR)
+
+    Returns (server, base_url). Provider base URLs are base_url + "/<provider>".
+    """
+    unknown = set(behaviour) - set(DEFAULT_BEHAVIOUR)
+    if unknown:
+        raise ValueError(f"Unknown replay behaviour option(s): {', '.join(sorted(unknown))}")
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), _ReplayHandler)
+    server.daemon_threads = True
+    server.mode = mode
+    server.archive = load_archive(archive_path) if archive is None else archive
+    server.archive_path = archive_path
+    server.behaviour = {**DEFAULT_BEHAVIOUR, **behaviour}
+    server.rng = random.Random(server.behaviour["seed"])
+    server.lock = threading.Lock()
+    server.windows = {}
+    server.unsaved = 0
+    server.verbose = verbose
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def env_settings(base_url):
+    """Environment variables that point every fetcher at a running replay server."""
+    return {env: f"{base_url}/{provider}" for provider, (_, env) in PROVIDERS.items()}
+
+
+def _option(name, default):
+    """Value of a "--name=value" command-line option."""
+    for arg in sys.argv[2:]:
+        if arg.startswith(f"--{name}="):
+            return arg.split("=", 1)[1]
+    return default
+
+
+# === Entry point when script is called directly ===
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "serve"
+    if command not in ("seed", "record", "serve"):
+        print("Usage: python replay_server.py [seed | record | serve] [--port=8765] [--latency=0.2] "
+              "[--jitter=0.05] [--error-rate=0.01] [--throttle=5] [--seed=0]")
+        sys.exit(1)
+
+    if command == "seed":
+        archive = seed_from_fixtures(archive=load_archive())
+        print(f"✅ {len(archive)} responses written to {save_archive(archive)}")
+        sys.exit(0)
+
+    server, base_url = start_replay_server(
+        mode="record" if command == "record" else "replay",
+        port=int(_option("port", DEFAULT_PORT)),
+        verbose="--verbose" in sys.argv,
+        latency=float(_option("latency", 0)),
+        jitter=float(_option("jitter", 0)),
+        error_rate=float(_option("error-rate", 0)),
+        throttle=int(_option("throttle", 0)),
+        seed=int(_option("seed", 0)),
+    )
+    print(f"✅ {command.capitalize()}ing {len(server.archive)} archived responses on {base_url}")
+    print("Point the fetchers at it with:")
+    for env, url in env_settings(base_url).items():
+        print(f"  {env}={url}")
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        if command == "record":
+            print(f"✅ Archive saved to {save_archive(server.archive, server.archive_path)}")
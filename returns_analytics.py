@@ -0,0 +1,217 @@
+import io
+import os
+import sys
+import warnings
+import numpy as np
+import pandas as pd
+from backtest import load_prices
+from storage import atomic_write_bytes
+
+DATA_FOLDER = "data"
+BENCHMARK_TICKER = "SPY"    # fetched like any ticker: python stock_chart.py SPY
+WINDOW = 252                # trading days in the beta / volatility window (1 year)
+MIN_OBSERVATIONS = 60       # fewer overlapping returns than this → NaN
+TRADING_DAYS = 252
+BLUME_WEIGHT = 2 / 3        # Blume: adjusted β = 2/3 × raw β + 1/3 × 1
+
+# (cache path, version, tickers, benchmark, window, as_of) → analytics frame
+_analytics_cache = {}
+
+
+def cache_path(data_folder=DATA_FOLDER):
+    return os.path.join(data_folder, "cache", "returns", "prices.npz")
+
+
+# === Price matrix (cached, updated per changed chart file) ===
+def _load_cache(path):
+    if not os.path.exists(path):
+        return {"tickers": np.array([], dtype="U12"), "dates": np.array([], dtype="datetime64[D]"),
+                "closes": np.zeros((0, 0)), "mtimes": np.array([], dtype=np.int64)}
+    with np.load(path) as cached:
+        return {name: cached[name] for name in ("tickers", "dates", "closes", "mtimes")}
+
+
+def _save_cache(cache, path):
+    buffer = io.BytesIO()
+    np.savez(buffer, **cache)
+    atomic_write_bytes(path, buffer.getvalue())
+
+
+def price_matrix(tickers, data_folder=DATA_FOLDER):
+    """
+    Daily closes of `tickers` aligned on one date axis, as (dates, closes[len(tickers), T]).
+    The matrix is cached in data/cache/returns; only chart files that changed since the
+    last call are re-read, and new bars extend the date axis. Missing charts give NaN rows.
+    """
+    path = cache_path(data_folder)
+    cache = _load_cache(path)
+    index = {t: i for i, t in enumerate(cache["tickers"].tolist())}
+
+    changed = {}
+    for ticker in dict.fromkeys(tickers):
+        chart = os.path.join(data_folder, f"{ticker}_chart.json")
+        if not os.path.exists(chart):
+            continue
+        mtime = os.stat(chart).st_mtime_ns
+        if ticker not in index or cache["mtimes"][index[ticker]] != mtime:
+            try:
+                changed[ticker] = (mtime, *load_prices(ticker, data_folder))
+            except (OSError, ValueError, KeyError) as e:
+                print(f"⚠️ Skipping prices for {ticker}: {e}")
+
+    if changed:
+        dates = np.unique(np.concatenate([cache["dates"]] + [d for _, d, _ in changed.values()]))
+        new_tickers = [t for t in changed if t not in index]
+        closes = np.full((len(index) + len(new_tickers), len(dates)), np.nan)
+        if len(index):
+            closes[:len(index), np.searchsorted(dates, cache["dates"])] = cache["closes"]
+        for ticker in new_tickers:
+            index[ticker] = len(index)
+        mtimes = np.concatenate([cache["mtimes"], np.zeros(len(new_tickers), dtype=np.int64)])
+        for ticker, (mtime, ticker_dates, ticker_closes) in changed.items():
+            row = index[ticker]
+            closes[row] = np.nan
+            closes[row, np.searchsorted(dates, ticker_dates)] = ticker_closes
+            mtimes[row] = mtime
+        cache = {"tickers": np.array(list(index), dtype="U12"), "dates": dates, "closes": closes, "mtimes": mtimes}
+        _save_cache(cache, path)
+
+    rows = np.full((len(tickers), len(cache["dates"])), np.nan)
+    for i, ticker in enumerate(tickers):
+        if ticker in index:
+            rows[i] = cache["closes"][index[ticker]]
+    return cache["dates"], rows
+
+
+# === Statistics (vectorized over tickers × dates) ===
+def simple_returns(closes):
+    """Daily returns along the last axis; NaN where either close is missing."""
+    closes = np.asarray(closes, dtype=float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return closes[..., 1:] / closes[..., :-1] - 1
+
+
+def _window_sums(values, window):
+    """Trailing `window`-sums along the last axis via cumulative sums (NaN counted as 0)."""
+    cumulative = np.cumsum(np.nan_to_num(values), axis=-1)
+    shifted = np.zeros_like(cumulative)
+    shifted[..., window:] = cumulative[..., :-window]
+    return cumulative - shifted
+
+
+def rolling_stats(returns, market, window=WINDOW):
+    """
+    Rolling OLS beta, R², annualized volatility and observation count of every row of
+    `returns` (n × T) against `market` (T,), for each trailing window, in one pass of
+    cumulative sums. Only dates where both series have a return are used.
+    """
+    returns = np.atleast_2d(returns)
+    valid = ~np.isnan(returns) & ~np.isnan(market)
+    x = np.where(valid, market, 0.0)
+    y = np.where(valid, returns, 0.0)
+
+    n = _window_sums(valid.astype(float), window)
+    sx, sy = _window_sums(x, window), _window_sums(y, window)
+    sxx, syy, sxy = _window_sums(x * x, window), _window_sums(y * y, window), _window_sums(x * y, window)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cov = n * sxy - sx * sy
+        var_x = n * sxx - sx * sx
+        var_y = n * syy - sy * sy
+        beta = cov / var_x
+        r_squared = cov * cov / (var_x * var_y)
+        volatility = np.sqrt(np.maximum(var_y, 0) / (n * (n - 1))) * np.sqrt(TRADING_DAYS)
+    enough = n >= MIN_OBSERVATIONS
+    return {
+        "beta": np.where(enough, beta, np.nan),
+        "r_squared": np.where(enough, r_squared, np.nan),
+        "volatility": np.where(enough, volatility, np.nan),
+        "observations": n,
+    }
+
+
+def blume_adjust(beta):
+    """Blume (1971) mean reversion toward 1: 2/3 × β + 1/3."""
+    return BLUME_WEIGHT * np.asarray(beta, dtype=float) + (1 - BLUME_WEIGHT)
+
+
+def drawdowns(closes):
+    """(maximum drawdown, current drawdown) per row of a closes matrix, as negative fractions."""
+    closes = np.atleast_2d(closes)
+    peaks = np.fmax.accumulate(closes, axis=-1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        drawdown = closes / peaks - 1
+    has_data = ~np.all(np.isnan(closes), axis=-1)
+    max_drawdown = np.where(has_data, np.nanmin(np.where(np.isnan(drawdown), np.inf, drawdown), axis=-1), np.nan)
+    last = np.array([row[~np.isnan(row)][-1] if ok else np.nan for row, ok in zip(drawdown, has_data)])
+    return max_drawdown, last
+
+
+# === Engine ===
+def _market_returns(returns, benchmark_closes, benchmark, data_folder):
+    if not np.all(np.isnan(benchmark_closes)):
+        return simple_returns(benchmark_closes)
+    print(f"⚠️ No {benchmark} chart in {data_folder}/; using an equal-weighted index of the tickers as the market")
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # dates where no ticker has a bar → NaN
+        return np.nanmean(returns, axis=0)
+
+
+def returns_analytics(tickers, benchmark=BENCHMARK_TICKER, window=WINDOW, data_folder=DATA_FOLDER, as_of=None):
+    """
+    Beta, Blume-adjusted beta, R², volatility and drawdowns for every ticker from its
+    stored OHLC history, as a DataFrame indexed by ticker (latest window, or the window
+    ending on `as_of` with later bars ignored).
+
+    The benchmark is `benchmark`'s chart; if that has not been fetched, an equal-weighted
+    index of the requested tickers stands in (with a warning). Results are cached per
+    price-matrix version, so repeated calls over unchanged charts cost nothing.
+    """
+    tickers = list(tickers)
+    dates, closes = price_matrix(tickers + [benchmark], data_folder)
+    path = cache_path(data_folder)
+    version = os.stat(path).st_mtime_ns if os.path.exists(path) else 0
+    as_of = str(as_of)[:10] if as_of is not None else None
+    key = (path, version, tuple(tickers), benchmark, window, as_of)
+    if key in _analytics_cache:
+        return _analytics_cache[key]
+    if as_of is not None:
+        keep = dates <= np.datetime64(as_of)
+        dates, closes = dates[keep], closes[:, keep]
+
+    columns = ["beta", "adjusted_beta", "r_squared", "volatility", "observations", "max_drawdown", "current_drawdown"]
+    frame = pd.DataFrame(np.nan, index=pd.Index(tickers, name="ticker"), columns=columns)
+    if len(dates) > 1 and tickers:
+        closes, benchmark_closes = closes[:-1], closes[-1]
+        returns = simple_returns(closes)
+        stats = rolling_stats(returns, _market_returns(returns, benchmark_closes, benchmark, data_folder), window)
+        frame["beta"] = stats["beta"][:, -1]
+        frame["adjusted_beta"] = blume_adjust(stats["beta"][:, -1])
+        frame["r_squared"] = stats["r_squared"][:, -1]
+        frame["volatility"] = stats["volatility"][:, -1]
+        frame["observations"] = stats["observations"][:, -1]
+        frame["max_drawdown"], frame["current_drawdown"] = drawdowns(closes)
+    frame["as_of"] = str(dates[-1]) if len(dates) else None
+    _analytics_cache[key] = frame
+    return frame
+
+
+def rolling_beta(tickers, benchmark=BENCHMARK_TICKER, window=WINDOW, data_folder=DATA_FOLDER, adjusted=False):
+    """Full rolling-beta history as a DataFrame (dates × tickers), Blume-adjusted if `adjusted`."""
+    tickers = list(tickers)
+    dates, closes = price_matrix(tickers + [benchmark], data_folder)
+    returns = simple_returns(closes[:-1])
+    beta = rolling_stats(returns, _market_returns(returns, closes[-1], benchmark, data_folder), window)["beta"]
+    beta = blume_adjust(beta) if adjusted else beta
+    return pd.DataFrame(beta.T, index=pd.Index(dates[1:], name="date"), columns=tickers)
+
+
+# === Entry point when script is called directly ===
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    tickers = [t.upper() for t in args] or sorted(
+        f.replace("_chart.json", "") for f in os.listdir(DATA_FOLDER)
+        if f.endswith("_chart.json") and f != f"{BENCHMARK_TICKER}_chart.json")
+    analytics = returns_analytics(tickers)
+    with pd.option_context("display.width", 160, "display.float_format", "{:.3f}".format):
+        print(analytics)
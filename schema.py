@@ -0,0 +1,205 @@
+import os
+import json
+import numpy as np
+from projection import load_projected
+
+DATA_FOLDER = "data"
+
+# === Classification ===
+VALID = "valid"          # every field the pipeline reads is present
+PARTIAL = "partial"      # runs, but some optional inputs fall back to 0 / blank
+UNUSABLE = "unusable"    # a required input is missing; skip before any expensive stage
+
+THROTTLE_MARKERS = ("rate limit", "api call frequency", "premium", "requests per", "Failed to fetch")
+
+# === Schema for *_financials.json (Alpha Vantage) ===
+# (path, check, required). Paths starting with "latest:<statement>" read the most
+# recent annual report; "reports:<statement>" checks the annual report list itself.
+FINANCIALS_SCHEMA = [
+    ("reports:income_statement", "min_reports:4", True),
+    ("reports:balance_sheet", "min_reports:1", True),
+    ("reports:cash_flow", "min_reports:1", True),
+    ("latest:income_statement.totalRevenue", "number", True),
+    ("latest:income_statement.incomeBeforeTax", "number", True),
+    ("latest:income_statement.incomeTaxExpense", "number", True),
+    ("latest:income_statement.ebit", "number", True),
+    ("latest:income_statement.ebitda", "number", True),
+    ("latest:balance_sheet.commonStockSharesOutstanding", "number", True),
+    ("overview.Name", "present", True),
+    ("latest:income_statement.costOfRevenue", "number", False),
+    ("latest:income_statement.operatingExpenses", "number", False),
+    ("latest:income_statement.depreciationAndAmortization", "number", False),
+    ("latest:income_statement.interestExpense", "number", False),
+    ("latest:balance_sheet.longTermDebt", "number", False),
+    ("latest:balance_sheet.shortTermDebt", "number", False),
+    ("latest:balance_sheet.cashAndCashEquivalentsAtCarryingValue", "number", False),
+    ("latest:cash_flow.capitalExpenditures", "number", False),
+    ("overview.MarketCapitalization", "number", False),
+    ("quote.Global Quote.05. price", "number", False),
+    ("quote.Global Quote.08. previous close", "number", False),
+]
+
+# === Schema for *_comparable_analysis.json ===
+COMPARABLE_SCHEMA = [
+    ("target.financial_metrics", "present", True),
+    ("peers", "min_items:1", True),
+]
+
+
+def _is_number(value):
+    if value is None or isinstance(value, bool):
+        return False
+    if isinstance(value, (int, float)):
+        return not np.isnan(value)
+    try:
+        float(str(value).replace(",", ""))
+        return str(value).strip().lower() not in ("none", "nan", "")
+    except ValueError:
+        return False
+
+
+def _compile_path(path):
+    """Turns a schema path into a getter over a payload (None when absent)."""
+    if path.startswith("reports:"):
+        statement = path.split(":", 1)[1]
+        return lambda payload, latest: (payload.get(statement) or {}).get("annualReports") \
+            if isinstance(payload.get(statement), dict) else None
+
+    if path.startswith("latest:"):
+        statement, field = path.split(":", 1)[1].split(".", 1)
+        return lambda payload, latest: latest.get(statement, {}).get(field)
+
+    keys = path.split(".")
+    # Quote keys contain dots ("05. price"); rejoin anything after the second segment
+    if keys[0] == "quote" and len(keys) > 2:
+        keys = [keys[0], keys[1], ".".join(keys[2:])]
+
+    def getter(payload, latest):
+        node = payload
+        for key in keys:
+            if not isinstance(node, dict):
+                return None
+            node = node.get(key)
+        return node
+    return getter
+
+
+def _compile_check(check):
+    if check == "present":
+        return lambda value: value not in (None, "", "None")
+    if check == "number":
+        return _is_number
+    if check.startswith("min_reports:") or check.startswith("min_items:"):
+        minimum = int(check.split(":", 1)[1])
+        return lambda value: isinstance(value, (list, dict)) and len(value) >= minimum
+    raise ValueError(f"Unknown schema check: {check}")
+
+
+def compile_schema(schema):
+    """
+    Compiles a schema into a validator that makes a single pass over a payload and
+    returns {"status", "missing", "missing_optional", "errors", "retryable"}.
+    """
+    compiled = [(path, _compile_path(path), _compile_check(check), required) for path, check, required in schema]
+
+    def validate(payload):
+        if not isinstance(payload, dict):
+            return {"status": UNUSABLE, "missing": ["<payload>"], "missing_optional": [],
+                    "errors": ["Payload is not a JSON object"], "retryable": False}
+
+        # Provider error stubs ({"error": ...}) written in place of a statement
+        errors = []
+        for section, block in payload.items():
+            if isinstance(block, dict) and "error" in block:
+                errors.append(f"{section}: {block['error']}")
+        retryable = any(marker.lower() in error.lower() for error in errors for marker in THROTTLE_MARKERS)
+
+        # Most recent annual report per statement, found once
+        latest = {}
+        for section, block in payload.items():
+            if isinstance(block, dict) and isinstance(block.get("annualReports"), list) and block["annualReports"]:
+                latest[section] = max(block["annualReports"], key=lambda r: r.get("fiscalDateEnding", ""))
+
+        missing, missing_optional = [], []
+        for path, getter, check, required in compiled:
+            if not check(getter(payload, latest)):
+                (missing if required else missing_optional).append(path)
+
+        if missing:
+            status = UNUSABLE
+        elif missing_optional or errors:
+            status = PARTIAL
+        else:
+            status = VALID
+        return {"status": status, "missing": missing, "missing_optional": missing_optional,
+                "errors": errors, "retryable": retryable and status == UNUSABLE}
+
+    return validate
+
+
+validate_financials = compile_schema(FINANCIALS_SCHEMA)
+validate_comparable = compile_schema(COMPARABLE_SCHEMA)
+
+
+def validate_ticker(ticker, data_folder=DATA_FOLDER):
+    """Validates the stored files for one ticker and merges the results."""
+    result = {"ticker": ticker}
+    financials_path = os.path.join(data_folder, f"{ticker}_financials.json")
+    comp_path = os.path.join(data_folder, f"{ticker}_comparable_analysis.json")
+
+    try:
+        financials = load_projected(financials_path, "validate")
+        result.update(validate_financials(financials))
+    except (OSError, ValueError) as e:
+        result.update({"status": UNUSABLE, "missing": ["financials"], "missing_optional": [],
+                       "errors": [str(e)], "retryable": isinstance(e, FileNotFoundError)})
+        return result
+
+    if os.path.exists(comp_path):
+        try:
+            with open(comp_path, "r") as f:
+                comp_result = validate_comparable(json.load(f))
+        except ValueError as e:
+            comp_result = {"status": UNUSABLE, "missing": ["comparable_analysis"], "errors": [str(e)]}
+        if comp_result["status"] == UNUSABLE:
+            # DCF still runs without peers; the peer/beta section is left blank
+            result["missing_optional"] = result["missing_optional"] + ["comparable_analysis"]
+            result["errors"] = result["errors"] + comp_result["errors"]
+            if result["status"] == VALID:
+                result["status"] = PARTIAL
+    else:
+        result["missing_optional"] = result["missing_optional"] + ["comparable_analysis"]
+        if result["status"] == VALID:
+            result["status"] = PARTIAL
+    return result
+
+
+def partition_tickers(tickers, data_folder=DATA_FOLDER):
+    """
+    Validates each ticker once and sorts them for the scheduler:
+    {"run": [...valid and partial], "requeue": [...throttled, worth refetching],
+     "skip": [...unusable], "results": {ticker: validation result}}
+    """
+    plan = {"run": [], "requeue": [], "skip": [], "results": {}}
+    for ticker in tickers:
+        result = validate_ticker(ticker, data_folder)
+        plan["results"][ticker] = result
+        if result["status"] != UNUSABLE:
+            plan["run"].append(ticker)
+        elif result["retryable"]:
+            plan["requeue"].append(ticker)
+        else:
+            plan["skip"].append(ticker)
+    return plan
+
+
+def describe(result):
+    """One-line human readable summary of a validation result."""
+    text = f"{result.get('ticker', '')} {result['status'].upper()}".strip()
+    if result["missing"]:
+        text += f" — missing: {', '.join(result['missing'])}"
+    if result["missing_optional"]:
+        text += f" — optional missing: {', '.join(result['missing_optional'])}"
+    if result["errors"]:
+        text += f" — provider errors: {len(result['errors'])}"
+    return text
@@ -0,0 +1,183 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+from contextlib import contextmanager
+from units import to_float_array
+from projection import load_projected
+
+DATA_FOLDER = "data"
+QUERY_CHUNK = 500       # tickers per IN (...) query; SQLite caps bound parameters
+
+# Column → (section of *_financials.json, source field); sections "income" and "balance"
+# are the latest annual report of that statement
+TEXT_FIELDS = {
+    "name": ("overview", "Name"),
+    "exchange": ("overview", "Exchange"),
+    "sector": ("overview", "Sector"),
+    "industry": ("overview", "Industry"),
+    "currency": ("overview", "Currency"),
+    "trading_day": ("quote", "07. latest trading day"),
+    "fiscal_date": ("income", "fiscalDateEnding"),
+}
+NUMBER_FIELDS = {
+    "price": ("quote", "05. price"),
+    "open": ("quote", "02. open"),
+    "high": ("quote", "03. high"),
+    "low": ("quote", "04. low"),
+    "previous_close": ("quote", "08. previous close"),
+    "change": ("quote", "09. change"),
+    "change_percent": ("quote", "10. change percent"),    # percentage points
+    "volume": ("quote", "06. volume"),
+    "market_cap": ("overview", "MarketCapitalization"),
+    "revenue": ("income", "totalRevenue"),
+    "net_income": ("income", "netIncome"),
+    "shares_outstanding": ("balance", "commonStockSharesOutstanding"),
+}
+COLUMNS = ["ticker", *TEXT_FIELDS, *NUMBER_FIELDS, "source_mtime"]
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS snapshots (
+    ticker TEXT PRIMARY KEY,
+    {", ".join(f"{name} TEXT" for name in TEXT_FIELDS)},
+    {", ".join(f"{name} REAL" for name in NUMBER_FIELDS)},
+    source_mtime REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS snapshot_sector ON snapshots (sector);
+"""
+
+
+def snapshot_path(data_folder=DATA_FOLDER):
+    return os.path.join(data_folder, "cache", "snapshots", "snapshots.sqlite")
+
+
+@contextmanager
+def _connect(data_folder):
+    """One transaction on the snapshot store; committed on success and always closed."""
+    path = snapshot_path(data_folder)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    connection = sqlite3.connect(path, timeout=30)
+    try:
+        connection.execute("PRAGMA journal_mode=WAL")   # readers do not block the writer
+        connection.executescript(SCHEMA)
+        with connection:
+            yield connection
+    finally:
+        connection.close()
+
+
+# === Materialization ===
+def snapshot_row(ticker, financials, source_mtime=0.0):
+    """
+    The overview record of one financials payload: names, quote fields and the latest
+    annual revenue / net income / shares, with numbers parsed once (NaN → NULL).
+    """
+    sections = {
+        "overview": financials.get("overview", {}),
+        "quote": financials.get("quote", {}).get("Global Quote", {}),
+        "income": (financials.get("income_statement", {}).get("annualReports") or [{}])[0],
+        "balance": (financials.get("balance_sheet", {}).get("annualReports") or [{}])[0],
+    }
+    sections = {name: section if isinstance(section, dict) else {} for name, section in sections.items()}
+    row = {"ticker": ticker, "source_mtime": source_mtime}
+    for name, (section, field) in TEXT_FIELDS.items():
+        value = sections[section].get(field)
+        row[name] = value if isinstance(value, str) and value not in ("", "None") else None
+    numbers = to_float_array([sections[section].get(field) for section, field in NUMBER_FIELDS.values()])
+    for name, value in zip(NUMBER_FIELDS, numbers):
+        row[name] = float(value) if value == value else None
+    return row
+
+
+def store_snapshots(rows, data_folder=DATA_FOLDER):
+    """Upserts snapshot rows in one transaction."""
+    if not rows:
+        return 0
+    placeholders = ", ".join(f":{name}" for name in COLUMNS)
+    with _connect(data_folder) as connection:
+        connection.executemany(f"INSERT OR REPLACE INTO snapshots ({', '.join(COLUMNS)}) VALUES ({placeholders})", rows)
+    return len(rows)
+
+
+def write_snapshot(ticker, financials, data_folder=DATA_FOLDER):
+    """Snapshot of a payload just written to data/{TICKER}_financials.json (no re-read)."""
+    path = os.path.join(data_folder, f"{ticker}_financials.json")
+    store_snapshots([snapshot_row(ticker, financials, os.stat(path).st_mtime)], data_folder)
+
+
+def materialize(tickers=None, data_folder=DATA_FOLDER):
+    """(Re)builds the snapshots of `tickers` (default: every *_financials.json) from their files."""
+    if tickers is None:
+        tickers = sorted(f.replace("_financials.json", "") for f in os.listdir(data_folder) if f.endswith("_financials.json"))
+    rows = []
+    for ticker in tickers:
+        path = os.path.join(data_folder, f"{ticker}_financials.json")
+        try:
+            mtime = os.stat(path).st_mtime
+            rows.append(snapshot_row(ticker, load_projected(path, "overview"), mtime))
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Skipping snapshot for {ticker}: {e}")
+    return store_snapshots(rows, data_folder)
+
+
+# === Read ===
+def _query(connection, tickers):
+    connection.row_factory = sqlite3.Row
+    if tickers is None:
+        return [dict(row) for row in connection.execute("SELECT * FROM snapshots ORDER BY ticker")]
+    rows = []
+    for start in range(0, len(tickers), QUERY_CHUNK):
+        chunk = tickers[start:start + QUERY_CHUNK]
+        rows += [dict(row) for row in connection.execute(
+            f"SELECT * FROM snapshots WHERE ticker IN ({', '.join('?' * len(chunk))})", chunk)]
+    return rows
+
+
+def load_snapshots(tickers=None, data_folder=DATA_FOLDER, refresh=True):
+    """
+    Snapshot records {ticker: {column: value}} of `tickers` (default: all) in one query.
+    With `refresh`, tickers whose financials file is newer than their snapshot (or
+    that have none) are materialized first, so files written by any path are picked up.
+    Missing numbers are None.
+    """
+    tickers = list(dict.fromkeys(tickers)) if tickers is not None else None
+    with _connect(data_folder) as connection:
+        snapshots = {row["ticker"]: row for row in _query(connection, tickers)}
+    if refresh and tickers is not None:
+        stale = []
+        for ticker in tickers:
+            path = os.path.join(data_folder, f"{ticker}_financials.json")
+            if os.path.exists(path) and (ticker not in snapshots
+                                         or snapshots[ticker]["source_mtime"] < os.stat(path).st_mtime):
+                stale.append(ticker)
+        if stale:
+            materialize(stale, data_folder)
+            with _connect(data_folder) as connection:
+                snapshots.update({row["ticker"]: row for row in _query(connection, stale)})
+    return snapshots
+
+
+def load_snapshot(ticker, data_folder=DATA_FOLDER):
+    """One ticker's snapshot record, or None if it has no financials."""
+    return load_snapshots([ticker], data_folder).get(ticker)
+
+
+# === Entry point when script is called directly ===
+if __name__ == "__main__":
+    # python snapshots.py [TICKER ...]   → rebuild snapshots and compare reads with parsing the files
+    tickers = [t.upper() for t in sys.argv[1:]] or None
+    started = time.perf_counter()
+    count = materialize(tickers)
+    print(f"✅ {count} snapshots written to {snapshot_path()} in {time.perf_counter() - started:.2f}s")
+
+    snapshots = load_snapshots(tickers, refresh=False)
+    started = time.perf_counter()
+    for ticker in snapshots:
+        with open(os.path.join(DATA_FOLDER, f"{ticker}_financials.json"), "r") as f:
+            json.load(f)
+    parse_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    load_snapshots(list(snapshots))
+    print(f"⏱️ {len(snapshots)} overviews: {parse_ms:.1f} ms parsing the files, "
+          f"{(time.perf_counter() - started) * 1000:.1f} ms from snapshots")
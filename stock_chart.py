@@ -1,11 +1,41 @@
 import yfinance as yf
 import pandas as pd
+import requests
 import json
 import os
 import sys
+from storage import atomic_write_json, fetch_once
+from archive import archive_payload
+
+# When set (e.g. to replay_server.py's /yahoo mount), bars come from this Yahoo chart API
+# endpoint instead of yfinance
+yahoo_base_url = os.getenv("YAHOO_BASE_URL")
+
+def download_from_chart_api(ticker, base_url):
+    """Five years of daily bars from a Yahoo /v8/finance/chart endpoint, shaped like yf.download."""
+    response = requests.get(f"{base_url}/v8/finance/chart/{ticker}", params={"range": "5y", "interval": "1d"},
+                            headers={"User-Agent": "Mozilla/5.0"})
+    response.raise_for_status()
+    result = response.json()["chart"]["result"][0]
+    quote = result["indicators"]["quote"][0]
+    dates = pd.to_datetime(result["timestamp"], unit="s").normalize()
+    return pd.DataFrame({
+        "Open": quote["open"],
+        "High": quote["high"],
+        "Low": quote["low"],
+        "Close": quote["close"],
+    }, index=pd.Index(dates, name="Date"))
 
 def fetch_ohlc_to_json(ticker):
-    df = yf.download(ticker, period="5y", interval="1d", auto_adjust=False)
+    """Saves five years of daily OHLC bars to data/{ticker}_chart.json; concurrent calls share one download."""
+    file_path = f"data/{ticker}_chart.json"
+    return fetch_once(ticker, "chart", file_path, lambda: _download_ohlc(ticker, file_path))
+
+def _download_ohlc(ticker, file_path):
+    if yahoo_base_url:
+        df = download_from_chart_api(ticker, yahoo_base_url)
+    else:
+        df = yf.download(ticker, period="5y", interval="1d", auto_adjust=False)
 
     # Reset index and flatten columns
     df.reset_index(inplace=True)
@@ -23,11 +53,12 @@ def fetch_ohlc_to_json(ticker):
     os.makedirs("data", exist_ok=True)
 
     # Save to JSON
-    file_path = f"data/{ticker}_chart.json"
-    with open(file_path, "w") as f:
-        json.dump(ohlc_df.to_dict(orient="records"), f, indent=4)
+    records = ohlc_df.to_dict(orient="records")
+    atomic_write_json(file_path, records)
+    archive_payload(ticker, "chart", records)
 
     print(f"Saved OHLC data for {ticker} to {file_path}")
+    return file_path
 
 # === Entry point when script is called directly ===
 if __name__ == "__main__":
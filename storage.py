@@ -0,0 +1,146 @@
+import os
+import json
+import time
+import tempfile
+import threading
+from contextlib import contextmanager
+
+DATA_FOLDER = "data"
+LOCK_FOLDER = os.path.join("cache", "locks")   # inside the data folder
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+# === Atomic writes ===
+def _fsync_directory(folder):
+    """Makes the rename itself durable (POSIX only; Windows has no directory handles)."""
+    if os.name != "posix":
+        return
+    fd = os.open(folder, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write_bytes(path, data):
+    """
+    Writes `data` to a temp file in the same folder, fsyncs it and renames it over `path`.
+    Readers see either the old file or the complete new one, never a partial write.
+    """
+    folder = os.path.dirname(path) or "."
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    _fsync_directory(folder)
+    return path
+
+
+def atomic_write_text(path, text, encoding="utf-8"):
+    return atomic_write_bytes(path, text.encode(encoding))
+
+
+def atomic_write_json(path, data, indent=4):
+    return atomic_write_text(path, json.dumps(data, indent=indent))
+
+
+# === Advisory locks ===
+@contextmanager
+def file_lock(name, data_folder=DATA_FOLDER):
+    """
+    Exclusive advisory lock shared by every process using the same data folder
+    (flock on POSIX, msvcrt on Windows). Held for the duration of the `with` block.
+    """
+    folder = os.path.join(data_folder, LOCK_FOLDER)
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, f"{name}.lock"), "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:  # LK_LOCK gives up after ~10s; keep waiting
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def ticker_lock(ticker, data_folder=DATA_FOLDER):
+    """Per-ticker lock serialising every writer of data/{TICKER}_*.json."""
+    return file_lock(ticker.upper(), data_folder)
+
+
+# === Single-flight ===
+# key → {"event", "result", "error"} for calls currently running in this process
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def single_flight(key, fn):
+    """
+    Runs fn() once per key at a time within the process: concurrent callers with the
+    same key wait for the running call and share its result (or exception).
+    """
+    with _inflight_lock:
+        call = _inflight.get(key)
+        leader = call is None
+        if leader:
+            call = _inflight[key] = {"event": threading.Event(), "result": None, "error": None}
+
+    if not leader:
+        call["event"].wait()
+        if call["error"] is not None:
+            raise call["error"]
+        return call["result"]
+
+    try:
+        call["result"] = fn()
+        return call["result"]
+    except BaseException as e:
+        call["error"] = e
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+        call["event"].set()
+
+
+def fetch_once(ticker, kind, path, fetch, data_folder=DATA_FOLDER):
+    """
+    Coalesces refreshes of one ticker file. Callers in this process share one call
+    (single_flight); across processes the ticker lock serialises them, and a caller that
+    finds `path` rewritten while it waited returns that file instead of fetching again.
+    """
+    requested = time.time()
+
+    def run():
+        with ticker_lock(ticker, data_folder):
+            if os.path.exists(path) and os.stat(path).st_mtime >= requested:
+                return path
+            return fetch()
+
+    return single_flight((kind, ticker.upper(), os.path.abspath(path)), run)
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The modules are flat scripts at the repository root
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
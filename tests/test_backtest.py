@@ -0,0 +1,57 @@
+import os
+import json
+import numpy as np
+import pytest
+import backtest
+from conftest import REPO_ROOT
+
+DATA_FOLDER = os.path.join(REPO_ROOT, "data")
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(backtest, "CACHE_FOLDER", str(tmp_path / "backtest"))
+
+
+def _financials(ticker):
+    with open(os.path.join(DATA_FOLDER, f"{ticker}_financials.json"), "r") as f:
+        return json.load(f)
+
+
+def test_split_factors_from_share_counts():
+    financials = {"balance_sheet": {"quarterlyReports": [
+        {"fiscalDateEnding": "2021-12-31", "commonStockSharesOutstanding": "1000"},
+        {"fiscalDateEnding": "2022-03-31", "commonStockSharesOutstanding": "990"},      # buyback
+        {"fiscalDateEnding": "2022-06-30", "commonStockSharesOutstanding": "19700"},    # 20:1
+        {"fiscalDateEnding": "2022-09-30", "commonStockSharesOutstanding": "None"},
+        {"fiscalDateEnding": "2022-12-31", "commonStockSharesOutstanding": "1950"},     # 1:10
+    ]}}
+    fiscal = np.array(["2021-12-31", "2022-03-31", "2022-06-30", "2022-12-31"], dtype="datetime64[D]")
+    np.testing.assert_allclose(backtest.split_factors(financials, fiscal), [2.0, 2.0, 0.1, 1.0])
+
+
+def test_split_factors_fixtures():
+    googl = _financials("GOOGL")
+    fiscal, _ = backtest.filing_epochs(googl)
+    factors = backtest.split_factors(googl, fiscal)
+    assert set(factors[fiscal < np.datetime64("2022-06-30")]) == {20.0}
+    assert set(factors[fiscal >= np.datetime64("2022-06-30")]) == {1.0}
+
+    meta = _financials("META")
+    fiscal, _ = backtest.filing_epochs(meta)
+    assert set(backtest.split_factors(meta, fiscal)) == {1.0}
+
+
+def test_backtest_values_on_chart_split_basis():
+    # GOOGL split 20:1 in July 2022; per-share values before and after must be comparable
+    frame = backtest.backtest_ticker("GOOGL", data_folder=DATA_FOLDER)
+    ratio = frame["dcf_price"] / frame["price"]
+    assert ratio.between(0.2, 5).all(), frame[["date", "price", "dcf_price"]]
+    pre_split = frame["date"] < np.datetime64("2022-07-01")
+    assert frame.loc[pre_split, "dcf_upside"].abs().max() < 2
+
+
+def test_rebalance_dates_skip_partial_period():
+    price_dates = np.arange(np.datetime64("2024-10-01"), np.datetime64("2025-04-05"))
+    dates = backtest.rebalance_dates(price_dates, "QE")
+    assert list(dates.astype(str)) == ["2024-12-31", "2025-03-31"]
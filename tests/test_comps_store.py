@@ -0,0 +1,57 @@
+import os
+import json
+import shutil
+import pytest
+import comps_store
+from conftest import REPO_ROOT
+
+
+@pytest.fixture
+def data_folder(tmp_path):
+    for ticker in ("AAPL", "SNAP"):
+        shutil.copy(os.path.join(REPO_ROOT, "data", f"{ticker}_comparable_analysis.json"), tmp_path)
+    return str(tmp_path)
+
+
+def _write_comps(data_folder, ticker, comp_data):
+    with open(os.path.join(data_folder, f"{ticker}_comparable_analysis.json"), "w") as f:
+        json.dump(comp_data, f)
+
+
+def test_long_text_is_stored_whole(data_folder):
+    name = "Very Long Holdings International Consolidated Industries and Subsidiaries Group Incorporated"
+    image = "https://images.example.com/" + "logo/" * 40 + "LONGPEER.png"
+    assert len(name) > 80 and len(image) > 160
+    _write_comps(data_folder, "LONGTICKERNAME", {"target": {"ticker": "LONGTICKERNAME"}, "peers": {
+        "LONGPEER.EXCHANGE": {"financial_metrics": {"Market Cap ($M)": 1e9},
+                              "overview": {"companyName": name, "image": image, "industry": "Widgets"}}}})
+    comps_store.build_comps_store(data_folder)
+    frame = comps_store.peer_frame("LONGTICKERNAME", data_folder)
+    assert list(frame.index) == ["LONGPEER.EXCHANGE"]
+    assert frame.loc["LONGPEER.EXCHANGE", "name"] == name
+    assert frame.loc["LONGPEER.EXCHANGE", "image"] == image
+
+    # Updating another target with narrower text keeps the wide rows intact
+    os.utime(os.path.join(data_folder, "AAPL_comparable_analysis.json"))
+    assert comps_store.ensure_comps_store(["AAPL"], data_folder) == ["AAPL"]
+    assert comps_store.peer_frame("LONGTICKERNAME", data_folder).loc["LONGPEER.EXCHANGE", "image"] == image
+    assert list(comps_store.peer_frame("AAPL", data_folder).index) == ["MSFT", "GOOGL", "AMZN", "TSLA", "NVDA"]
+
+
+def test_target_without_peers_is_not_rebuilt(data_folder):
+    _write_comps(data_folder, "LONER", {"target": {"ticker": "LONER"}, "peers": {}})
+    assert sorted(comps_store.ensure_comps_store(["AAPL", "SNAP", "LONER"], data_folder)) == ["AAPL", "LONER", "SNAP"]
+    version = comps_store.store_version(data_folder)
+    assert comps_store.ensure_comps_store(["AAPL", "SNAP", "LONER"], data_folder) == []
+    assert comps_store.peer_frame("LONER", data_folder).empty
+    assert comps_store.store_version(data_folder) == version
+
+    # The placeholder never shows up as a peer
+    from quote_service import quote_universe
+    assert "" not in quote_universe(data_folder)
+
+
+def test_no_target_has_no_peers(data_folder):
+    comps_store.build_comps_store(data_folder)
+    for ticker in (None, ""):
+        assert comps_store.peer_frame(ticker, data_folder).empty
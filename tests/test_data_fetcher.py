@@ -0,0 +1,29 @@
+import os
+import pytest
+import data_fetcher
+from schema import UNUSABLE, validate_ticker
+
+
+def _failed(provider, error, payload=None):
+    validation = {"status": UNUSABLE, "missing": ["<payload>"], "missing_optional": [], "errors": [error],
+                  "retryable": False}
+    return {"provider": provider, "payload": payload, "validation": validation, "seconds": 0.0}
+
+
+def test_no_reply_writes_nothing(tmp_path, monkeypatch):
+    attempts = [_failed("alphavantage", "ConnectionError: timed out"), _failed("fmp", "ConnectionError: refused")]
+    monkeypatch.setattr(data_fetcher, "fetch_financials", lambda *args: (None, attempts))
+    with pytest.raises(ValueError, match="timed out"):
+        data_fetcher.fetch_and_save_financials("ZZZZ", api_key="test", output_folder=str(tmp_path))
+    assert not os.path.exists(tmp_path / "ZZZZ_financials.json")
+    # A missing file is re-queued by the batch scheduler
+    assert validate_ticker("ZZZZ", str(tmp_path))["retryable"]
+
+
+def test_throttled_reply_keeps_error_stubs(tmp_path, monkeypatch):
+    stub = {"overview": {"error": "Our standard API rate limit is 25 requests per day."}}
+    attempts = [_failed("alphavantage", "overview: rate limit", stub)]
+    monkeypatch.setattr(data_fetcher, "fetch_financials", lambda *args: (stub, attempts))
+    data_fetcher.fetch_and_save_financials("ZZZZ", api_key="test", output_folder=str(tmp_path))
+    result = validate_ticker("ZZZZ", str(tmp_path))
+    assert result["status"] == UNUSABLE and result["retryable"]
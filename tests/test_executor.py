@@ -0,0 +1,71 @@
+import os
+import shutil
+import pytest
+import executor
+from conftest import REPO_ROOT
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    """A data folder with one ticker and a copy of the assumptions, as the working directory."""
+    shutil.copytree(os.path.join(REPO_ROOT, "assumptions"), tmp_path / "assumptions")
+    (tmp_path / "data").mkdir()
+    for name in ("AAPL_financials.json", "AAPL_comparable_analysis.json", "MSFT_chart.json"):
+        shutil.copy(os.path.join(REPO_ROOT, "data", name), tmp_path / "data")
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def _touch(path, offset_ns):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + offset_ns))
+
+
+def test_valuation_key_follows_ticker_files(workspace):
+    key = executor.task_key("valuation", ["AAPL"], "data")
+    assert executor.task_key("valuation", ["AAPL"], "data") == key
+    _touch(workspace / "data" / "AAPL_financials.json", 10 ** 9)
+    assert executor.task_key("valuation", ["AAPL"], "data") != key
+
+
+@pytest.mark.parametrize("stage", ["valuation", "export"])
+def test_key_follows_assumptions(workspace, stage):
+    key = executor.task_key(stage, ["AAPL"], "data")
+    version = sorted(os.listdir(workspace / "assumptions"))[-1]
+    _touch(workspace / "assumptions" / version, 10 ** 9)
+    assert executor.task_key(stage, ["AAPL"], "data") != key
+
+    # A newer version only changes the key of runs it is in effect for
+    key = executor.task_key(stage, ["AAPL"], "data")
+    past = executor.task_key("valuation", ["AAPL"], "data", {"as_of": "2000-01-01"})
+    shutil.copy(workspace / "assumptions" / version, workspace / "assumptions" / "2999-01-01.json")
+    assert executor.task_key(stage, ["AAPL"], "data") != key
+    assert executor.task_key("valuation", ["AAPL"], "data", {"as_of": "2000-01-01"}) == past
+
+
+def test_valuation_key_follows_quotes_only_when_live(workspace):
+    from quote_service import quotes_path
+    live = {"live_quotes": True}
+    keys = (executor.task_key("valuation", ["AAPL"], "data"), executor.task_key("valuation", ["AAPL"], "data", live))
+    os.makedirs(os.path.dirname(quotes_path("data")), exist_ok=True)
+    with open(quotes_path("data"), "w") as f:
+        f.write("{}")
+    assert executor.task_key("valuation", ["AAPL"], "data") == keys[0]
+    assert executor.task_key("valuation", ["AAPL"], "data", live) != keys[1]
+
+
+def test_valuation_key_follows_comps_store(workspace):
+    from comps_store import build_comps_store
+    key = executor.task_key("valuation", ["AAPL"], "data")
+    build_comps_store("data")
+    assert executor.task_key("valuation", ["AAPL"], "data") != key
+
+
+def test_regression_key_follows_peer_charts(workspace):
+    from comps_store import build_comps_store
+    build_comps_store("data")
+    regression = {"beta_source": "regression"}
+    keys = (executor.task_key("valuation", ["AAPL"], "data"), executor.task_key("valuation", ["AAPL"], "data", regression))
+    _touch(workspace / "data" / "MSFT_chart.json", 10 ** 9)
+    assert executor.task_key("valuation", ["AAPL"], "data") == keys[0]
+    assert executor.task_key("valuation", ["AAPL"], "data", regression) != keys[1]
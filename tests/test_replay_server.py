@@ -0,0 +1,63 @@
+import os
+import json
+import pytest
+import providers
+from replay_server import start_replay_server, seed_from_fixtures
+from schema import UNUSABLE
+from conftest import REPO_ROOT
+
+DATA_FOLDER = os.path.join(REPO_ROOT, "data")
+FIXTURES = ["AAPL", "GOOGL", "META", "MSFT", "SNAP", "TSLA"]
+
+
+@pytest.fixture(scope="module")
+def replay_url():
+    server, base_url = start_replay_server(seed_from_fixtures(DATA_FOLDER))
+    yield base_url
+    server.shutdown()
+
+
+@pytest.fixture
+def offline_fmp(replay_url, monkeypatch):
+    monkeypatch.setitem(providers.BASE_URLS, "fmp", f"{replay_url}/fmp")
+    return replay_url
+
+
+@pytest.mark.parametrize("ticker", FIXTURES)
+def test_fmp_failover_replays_offline(offline_fmp, ticker):
+    payload, attempts = providers.fetch_financials(ticker, providers=("fmp",), api_keys={"fmp": "test"})
+    assert attempts[0]["validation"]["status"] != UNUSABLE, attempts[0]["validation"]
+    assert not attempts[0]["validation"]["errors"]
+
+    with open(os.path.join(DATA_FOLDER, f"{ticker}_financials.json"), "r") as f:
+        fixture = json.load(f)
+    sections = ("income_statement", "balance_sheet", "cash_flow")
+    for reports in ("annualReports", "quarterlyReports"):
+        # The statements of each period the fixture covers in full, newest first
+        dates = set.intersection(*({r["fiscalDateEnding"] for r in fixture[s][reports]} for s in sections))
+        expected = sorted(dates, reverse=True)[:providers.HISTORY_LIMIT]
+        for section in sections:
+            assert [r["fiscalDateEnding"] for r in payload[section][reports]] == expected
+
+    latest = payload["income_statement"]["annualReports"][0]
+    fixture_report = next(r for r in fixture["income_statement"]["annualReports"]
+                          if r["fiscalDateEnding"] == latest["fiscalDateEnding"])
+    assert float(latest["totalRevenue"]) == float(fixture_report["totalRevenue"])
+    assert payload["overview"]["Name"]
+    assert float(payload["cash_flow"]["annualReports"][0]["capitalExpenditures"]) >= 0
+
+
+@pytest.mark.parametrize("provider", ["fmp", "alphavantage"])
+def test_batched_quotes_replay_offline(replay_url, monkeypatch, provider):
+    import quote_service
+    monkeypatch.setitem(providers.BASE_URLS, provider, f"{replay_url}/{provider}")
+    monkeypatch.setitem(quote_service.BATCH_SIZES, provider, 3)
+    tickers = ["AAPL", "MSFT", "NVDA", "AAPL_17", "SNAP", "NOPE"]     # NVDA is only stored as a peer
+    quotes = quote_service.fetch_quotes(tickers, providers=(provider,), api_keys={provider: "test"})
+    assert sorted(quotes) == sorted(set(tickers) - {"NOPE"})
+    assert quotes["AAPL"]["price"] == quotes["AAPL_17"]["price"] == 188.38
+    assert quotes["AAPL"]["trading_day"] == "2025-04-04"
+    assert quotes["NVDA"]["price"] > 0
+    assert all(quote["source"] == provider for quote in quotes.values())
+    if provider == "fmp":
+        assert quotes["AAPL"]["market_cap"] > 1e12
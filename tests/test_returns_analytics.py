@@ -0,0 +1,30 @@
+import os
+import shutil
+import numpy as np
+import pytest
+import returns_analytics
+from conftest import REPO_ROOT
+
+TICKERS = ["AAPL", "MSFT", "GOOGL"]
+
+
+@pytest.fixture
+def data_folder(tmp_path):
+    for ticker in TICKERS:
+        shutil.copy(os.path.join(REPO_ROOT, "data", f"{ticker}_chart.json"), tmp_path)
+    return str(tmp_path)
+
+
+def test_as_of_ignores_later_bars(data_folder):
+    latest = returns_analytics.returns_analytics(TICKERS, data_folder=data_folder)
+    past = returns_analytics.returns_analytics(TICKERS, data_folder=data_folder, as_of="2023-06-30")
+    assert past["as_of"].iloc[0] <= "2023-06-30" < latest["as_of"].iloc[0]
+    assert not np.allclose(past["beta"], latest["beta"])
+
+    # Same window computed from charts that end on the as-of date
+    dates, closes = returns_analytics.price_matrix(TICKERS, data_folder)
+    keep = dates <= np.datetime64("2023-06-30")
+    returns = returns_analytics.simple_returns(closes[:, keep])
+    market = np.nanmean(returns, axis=0)
+    beta = returns_analytics.rolling_stats(returns, market)["beta"][:, -1]
+    np.testing.assert_allclose(past["beta"].to_numpy(), beta)
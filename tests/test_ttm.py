@@ -0,0 +1,65 @@
+import os
+import copy
+import json
+import numpy as np
+import pytest
+import ttm
+from conftest import REPO_ROOT
+
+DATA_FOLDER = os.path.join(REPO_ROOT, "data")
+
+
+def _financials(ticker="AAPL"):
+    with open(os.path.join(DATA_FOLDER, f"{ticker}_financials.json"), "r") as f:
+        return json.load(f)
+
+
+def _revenue_ttm(series):
+    return series["ttm"][:, series["fields"].index("totalRevenue")]
+
+
+@pytest.fixture(autouse=True)
+def _empty_cache():
+    ttm._ttm_cache.clear()
+    yield
+    ttm._ttm_cache.clear()
+
+
+def test_restated_quarter_rebuilds_the_series():
+    financials = _financials()
+    before = _revenue_ttm(ttm.ttm_series(financials)).copy()
+
+    # Same report count and latest date, one restated value
+    restated = copy.deepcopy(financials)
+    latest = max(restated["income_statement"]["quarterlyReports"], key=lambda r: r["fiscalDateEnding"])
+    latest["totalRevenue"] = str(int(latest["totalRevenue"]) + 1_000_000)
+
+    after = _revenue_ttm(ttm.ttm_series(restated))
+    assert after[-1] == pytest.approx(before[-1] + 1_000_000)
+    np.testing.assert_array_equal(after[:-4], before[:-4])
+
+
+def test_symbol_less_payloads_get_their_own_series():
+    first, second = _financials("AAPL"), _financials("MSFT")
+    for payload in (first, second):
+        payload["income_statement"].pop("symbol", None)
+
+    first_ttm = _revenue_ttm(ttm.ttm_series(first)).copy()
+    second_ttm = _revenue_ttm(ttm.ttm_series(second))
+    assert second_ttm[-1] != first_ttm[-1]
+    np.testing.assert_array_equal(_revenue_ttm(ttm.ttm_series(first)), first_ttm)
+
+
+def test_new_quarter_folds_into_the_cached_series():
+    financials = _financials()
+    reports = sorted(financials["income_statement"]["quarterlyReports"], key=lambda r: r["fiscalDateEnding"])
+    older = copy.deepcopy(financials)
+    older["income_statement"]["quarterlyReports"] = reports[:-1]
+    ttm.ttm_series(older)
+
+    folded = ttm.ttm_series(financials)
+    assert folded["dates"][-1] == np.datetime64(reports[-1]["fiscalDateEnding"], "D")
+    np.testing.assert_allclose(_revenue_ttm(folded), _revenue_ttm(ttm._build_series(
+        reports, "income_statement", financials["income_statement"].get("annualReports"))), equal_nan=True)
+    # A repeat read of the folded payload is a cache hit
+    assert ttm.ttm_series(financials) is folded
@@ -0,0 +1,89 @@
+import os
+import json
+import numpy as np
+import pytest
+from units import (COMPS_METRICS, LEGACY_COMPS_LABELS, MILLIONS, PERCENT, build_fixture_corpus,
+                   check_fixture_corpus, comps_metrics_frame, metric_value, to_float_array)
+from conftest import REPO_ROOT
+
+DATA_FOLDER = os.path.join(REPO_ROOT, "data")
+FIXTURES = ["AAPL", "GOOGL", "META", "MSFT", "SNAP", "TSLA"]
+
+
+def _comps(ticker):
+    with open(os.path.join(DATA_FOLDER, f"{ticker}_comparable_analysis.json"), "r") as f:
+        return json.load(f)
+
+
+def test_to_float_array_parses_provider_values():
+    values = to_float_array(["12345", "None", "$1,234", 12.5, None, "-", " 7 "])
+    np.testing.assert_array_equal(values, [12345.0, np.nan, 1234.0, 12.5, np.nan, np.nan, 7.0])
+    np.testing.assert_allclose(to_float_array(["1.5", "25"], MILLIONS), [1.5e6, 25e6])
+    np.testing.assert_allclose(to_float_array(["12.5%"], PERCENT), [0.125])
+
+
+@pytest.mark.parametrize("ticker", FIXTURES)
+def test_comps_frame_reads_legacy_labels_as_raw_dollars(ticker):
+    # The fixtures predate the label fix: "($M)" columns hold raw FMP dollars
+    comp_data = _comps(ticker)
+    frame = comps_metrics_frame(comp_data, include_target=True)
+    entries = {comp_data["target"]["ticker"]: comp_data["target"], **comp_data["peers"]}
+    assert list(frame.index) == list(entries)
+    for peer, entry in entries.items():
+        metrics = entry["financial_metrics"]
+        assert frame.loc[peer, "price"] == metrics["Price ($/share)"]
+        for name, (legacy_label, _) in LEGACY_COMPS_LABELS.items():
+            assert frame.loc[peer, name] == float(metrics[legacy_label]), (peer, name)
+    # Raw dollars: every market cap is between $1B and $10T, not millions of millions
+    market_caps = frame["market_cap"].dropna()
+    assert ((market_caps > 1e9) & (market_caps < 1e13)).all(), market_caps
+
+
+def test_comps_frame_hand_computed_values():
+    frame = comps_metrics_frame(_comps("AAPL"), include_target=True)
+    assert frame.loc["AAPL", "market_cap"] == 2_695_415_403_000
+    assert frame.loc["AAPL", "enterprise_value"] == 2_784_531_403_000
+    assert frame.loc["MSFT", "sales"] == 245_122_000_000
+    assert frame.loc["MSFT", "earnings"] == 88_136_000_000
+
+    snap = comps_metrics_frame(_comps("SNAP"), include_target=True)
+    assert snap.loc["SNAP", "price"] == 7.8991
+    assert snap.loc["SNAP", "ebitda"] == -492_600_000
+    assert snap.loc["PINS", "ebit"] == 179_817_000
+
+    assert "SNAP" not in comps_metrics_frame(_comps("SNAP")).index
+    assert frame.attrs["units"]["price"] == "USD/share" and frame.attrs["units"]["sales"] == "USD"
+
+
+def test_current_labels_take_precedence_over_legacy():
+    comp_data = {"peers": {
+        "NEW": {"financial_metrics": {"Market Cap ($)": "2,000,000,000", "Sales ($M)": 999.0}},
+        "OLD": {"financial_metrics": {"Market Cap ($M)": 3e9, "Sales ($)": "None"}},
+        "BOTH": {"financial_metrics": {"Market Cap ($)": 4e9, "Market Cap ($M)": 1.0}},
+    }}
+    frame = comps_metrics_frame(comp_data)
+    np.testing.assert_array_equal(frame["market_cap"], [2e9, 3e9, 4e9])
+    np.testing.assert_array_equal(frame["sales"], [999.0, np.nan, np.nan])
+    assert set(frame.columns) == set(COMPS_METRICS)
+
+    assert metric_value({"EBIT ($M)": "5"}, "ebit") == 5.0
+    assert metric_value({"EBIT ($)": "6", "EBIT ($M)": "5"}, "ebit") == 6.0
+    assert np.isnan(metric_value({}, "ebit"))
+
+
+def test_fixture_corpus_agrees_across_providers():
+    corpus = build_fixture_corpus(DATA_FOLDER)
+    assert list(corpus.index) == FIXTURES
+    # Alpha Vantage statements and FMP comps report the same AAPL FY2024 figures
+    assert corpus.loc["AAPL", "av_sales"] == corpus.loc["AAPL", "fmp_sales"] == 391_035_000_000
+    assert corpus.loc["SNAP", "av_earnings"] == corpus.loc["SNAP", "fmp_earnings"] == -697_856_000
+    assert check_fixture_corpus(corpus) == []
+
+
+def test_fixture_corpus_flags_scale_errors():
+    corpus = build_fixture_corpus(DATA_FOLDER)
+    # Reading the "($M)" columns as millions would inflate FMP figures 1e6×
+    corpus["fmp_sales"] = corpus["fmp_sales"] * MILLIONS
+    problems = check_fixture_corpus(corpus)
+    assert sorted(ticker for ticker, metric, _ in problems) == FIXTURES
+    assert {metric for _, metric, _ in problems} == {"sales"}
@@ -0,0 +1,259 @@
+import copy
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+from units import statement_frame
+
+# Income and cash-flow lines are flows (summed over 4 quarters); balance-sheet lines
+# are point-in-time and taken from the latest quarter of each window.
+FLOW_STATEMENTS = ("income_statement", "cash_flow")
+STOCK_STATEMENTS = ("balance_sheet",)
+NON_NUMERIC_FIELDS = {"fiscalDateEnding", "reportedCurrency", "date", "symbol", "cik",
+                      "fillingDate", "acceptedDate", "calendarYear", "period", "link", "finalLink"}
+# FMP flow statements also carry ratios and share counts, which are not summed.
+FMP_POINT_IN_TIME_FIELDS = {"weightedAverageShsOut", "weightedAverageShsOutDil"}
+
+WINDOW = 4
+MAX_WINDOW_SPAN_DAYS = 300  # 4 consecutive quarter-ends span ~273 days; more means a gap
+
+# === Per-ticker cache of quarterly / TTM arrays ===
+# (symbol, statement) → {"dates", "fields", "quarterly", "ttm", "source_count", "digest"};
+# "digest" hashes the quarterly reports the series was built from, so restated or
+# unrelated (symbol-less) payloads never get another payload's series
+_ttm_cache = {}
+
+
+def rolling_sum(values, window=WINDOW):
+    """
+    Trailing `window`-row sums of a (quarters × fields) array in one cumulative-sum pass.
+    Rows without a full window, or with any missing value inside it, are NaN.
+    """
+    values = np.asarray(values, dtype=float)
+    out = np.full_like(values, np.nan)
+    if len(values) < window:
+        return out
+
+    missing = np.isnan(values)
+    filled = np.where(missing, 0.0, values)
+    zeros = np.zeros((1,) + values.shape[1:])
+    sums = np.concatenate([zeros, np.cumsum(filled, axis=0)])
+    gaps = np.concatenate([zeros, np.cumsum(missing, axis=0)])
+
+    window_sums = sums[window:] - sums[:-window]
+    window_gaps = gaps[window:] - gaps[:-window]
+    out[window - 1:] = np.where(window_gaps > 0, np.nan, window_sums)
+    return out
+
+
+def _contiguous_windows(dates, window=WINDOW):
+    """Boolean mask: True where the trailing window covers consecutive quarters."""
+    mask = np.zeros(len(dates), dtype=bool)
+    if len(dates) >= window:
+        span = (dates[window - 1:] - dates[:-(window - 1)]).astype("timedelta64[D]").astype(int)
+        mask[window - 1:] = span <= MAX_WINDOW_SPAN_DAYS
+    return mask
+
+
+def _numeric_fields(reports):
+    fields = []
+    for report in reports:
+        for key in report:
+            if key not in NON_NUMERIC_FIELDS and key not in fields:
+                fields.append(key)
+    return fields
+
+
+def _fill_from_annual(frame, annual_reports):
+    """
+    Alpha Vantage often omits the fiscal Q4 report (it is only filed in the 10-K).
+    Derive it as the annual figure minus the three quarters before it.
+    """
+    if not annual_reports:
+        return frame
+    annual = statement_frame(annual_reports, list(frame.columns))
+    quarter_dates = np.array(frame.index, dtype="datetime64[D]")
+    derived = {}
+    for date, values in annual.iterrows():
+        if date in frame.index:
+            continue
+        end = np.datetime64(date, "D")
+        prior = (quarter_dates < end) & (quarter_dates > end - np.timedelta64(MAX_WINDOW_SPAN_DAYS, "D"))
+        if prior.sum() == WINDOW - 1:
+            derived[date] = values - frame[prior].sum(axis=0, skipna=False)
+    if not derived:
+        return frame
+    filled = frame.reindex(frame.index.append(pd.Index(list(derived))))
+    for date, values in derived.items():
+        filled.loc[date] = values
+    return filled.sort_index()
+
+
+def _digests(reports):
+    """
+    (digest of all quarterly reports, digest of all but the newest), over the reports in
+    date order: the second one matches a cached series that the newest quarter extends.
+    """
+    ordered = sorted(reports, key=lambda r: r.get("fiscalDateEnding", ""))
+    digest = hashlib.sha1()
+    for report in ordered[:-1]:
+        digest.update(json.dumps(report, sort_keys=True).encode())
+    previous = digest.hexdigest()
+    digest.update(json.dumps(ordered[-1], sort_keys=True).encode())
+    return digest.hexdigest(), previous
+
+
+def _build_series(reports, statement, annual_reports=None):
+    fields = _numeric_fields(reports)
+    frame = statement_frame(reports, fields).iloc[::-1]  # oldest first
+    frame = frame[~frame.index.duplicated(keep="last")]
+    if statement in FLOW_STATEMENTS:
+        frame = _fill_from_annual(frame, annual_reports)
+    dates = np.array(frame.index, dtype="datetime64[D]")
+    quarterly = frame.to_numpy(dtype=float)
+
+    if statement in FLOW_STATEMENTS:
+        ttm = rolling_sum(quarterly)
+        ttm[~_contiguous_windows(dates)] = np.nan
+    else:
+        ttm = quarterly.copy()
+
+    return {"dates": dates, "fields": fields, "quarterly": quarterly, "ttm": ttm,
+            "source_count": len(reports), "digest": None}
+
+
+def ttm_series(financials, statement="income_statement"):
+    """
+    Returns cached quarterly and trailing-twelve-month arrays for one statement:
+    {"dates": datetime64[D] (oldest first), "fields": [...], "quarterly": (n × f), "ttm": (n × f)}.
+
+    The cache is keyed by ticker and checked against a digest of the quarterly reports,
+    so a restated quarter rebuilds the series; when the payload only adds one newer
+    quarter to the cached reports, it is folded in without recomputing history.
+    """
+    block = financials.get(statement, {})
+    symbol = block.get("symbol")
+    reports = block.get("quarterlyReports", [])
+    if not reports:
+        return {"dates": np.array([], dtype="datetime64[D]"), "fields": [],
+                "quarterly": np.empty((0, 0)), "ttm": np.empty((0, 0)), "source_count": 0, "digest": None}
+
+    key = (symbol, statement)
+    latest = np.datetime64(max(r["fiscalDateEnding"] for r in reports), "D")
+    digest, previous_digest = _digests(reports)
+    cached = _ttm_cache.get(key)
+
+    if cached is not None and cached["digest"] == digest:
+        return cached
+
+    if cached is not None and cached["digest"] == previous_digest and latest > cached["dates"][-1]:
+        newest = max(reports, key=lambda r: r["fiscalDateEnding"])
+        series = fold_quarter(symbol, statement, newest)
+    else:
+        series = _build_series(reports, statement, block.get("annualReports"))
+        _ttm_cache[key] = series
+    series["digest"] = digest
+    return series
+
+
+def fold_quarter(symbol, statement, report):
+    """
+    Appends one new quarterly report to the cached series for (symbol, statement).
+    The new TTM row is the previous TTM plus the new quarter minus the quarter that
+    dropped out of the window — O(fields), independent of history length.
+    """
+    key = (symbol, statement)
+    cached = _ttm_cache.get(key)
+    if cached is None or not len(cached["dates"]):
+        series = _build_series([report], statement)
+        _ttm_cache[key] = series
+        return series
+
+    fields = cached["fields"]
+    new_row = statement_frame([report], fields).to_numpy(dtype=float)
+    new_date = np.datetime64(report["fiscalDateEnding"], "D")
+
+    dates = np.append(cached["dates"], new_date)
+    quarterly = np.vstack([cached["quarterly"], new_row])
+
+    if statement in FLOW_STATEMENTS:
+        if len(quarterly) > WINDOW:
+            new_ttm = cached["ttm"][-1] + new_row[0] - quarterly[-WINDOW - 1]
+        else:
+            new_ttm = rolling_sum(quarterly[-WINDOW:])[-1]
+        # Fall back to a direct window sum where the running value is unavailable
+        direct = quarterly[-WINDOW:].sum(axis=0) if len(quarterly) >= WINDOW else np.full(len(fields), np.nan)
+        new_ttm = np.where(np.isnan(new_ttm), direct, new_ttm)
+        if not _contiguous_windows(dates[-WINDOW:])[-1]:
+            new_ttm = np.full(len(fields), np.nan)
+    else:
+        new_ttm = new_row[0]
+
+    series = {"dates": dates, "fields": fields, "quarterly": quarterly,
+              "ttm": np.vstack([cached["ttm"], new_ttm]), "source_count": cached["source_count"] + 1,
+              "digest": None}
+    _ttm_cache[key] = series
+    return series
+
+
+def _format_value(value):
+    return "None" if np.isnan(value) else str(int(round(value)))
+
+
+def ttm_reports(financials, statement="income_statement", periods=None):
+    """
+    Builds Alpha Vantage-shaped reports (most recent first) where each report is a
+    trailing-twelve-month window ending at a quarter, stepped back one year at a time.
+    These can stand in for "annualReports" anywhere the annual schema is expected.
+    """
+    series = ttm_series(financials, statement)
+    rows = np.arange(len(series["dates"]) - 1, -1, -WINDOW)
+    currency = next((r.get("reportedCurrency") for r in financials.get(statement, {}).get("quarterlyReports", [])), "USD")
+
+    reports = []
+    for row in rows:
+        values = series["ttm"][row]
+        if np.isnan(values).all():
+            continue
+        report = {"fiscalDateEnding": str(series["dates"][row]), "reportedCurrency": currency}
+        report.update({field: _format_value(v) for field, v in zip(series["fields"], values)})
+        reports.append(report)
+        if periods and len(reports) >= periods:
+            break
+    return reports
+
+
+def with_ttm_reports(financials):
+    """
+    Returns a copy of a *_financials.json payload whose annualReports are replaced by
+    TTM windows, so run_dcf_model and the CCA writer can run on trailing figures.
+    """
+    ttm_financials = copy.copy(financials)
+    for statement in FLOW_STATEMENTS + STOCK_STATEMENTS:
+        block = financials.get(statement)
+        if not isinstance(block, dict) or not block.get("quarterlyReports"):
+            continue
+        ttm_financials[statement] = dict(block, annualReports=ttm_reports(financials, statement))
+    return ttm_financials
+
+
+def fmp_ttm_statement(quarterly_statements, statement="income_statement"):
+    """
+    Collapses up to four FMP quarterly statements (newest first, as returned by
+    `?period=quarter&limit=4`) into a single TTM statement with the FMP schema.
+    """
+    if not quarterly_statements:
+        return {}
+    latest = dict(quarterly_statements[0])
+    if statement not in FLOW_STATEMENTS:
+        return latest
+
+    window = quarterly_statements[:WINDOW]
+    for key, value in latest.items():
+        if key in NON_NUMERIC_FIELDS or not isinstance(value, (int, float)) or isinstance(value, bool):
+            continue
+        if key.lower().endswith("ratio") or key in FMP_POINT_IN_TIME_FIELDS:
+            continue
+        latest[key] = sum(q.get(key, 0) or 0 for q in window)
+    latest["period"] = "TTM"
+    return latest
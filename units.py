@@ -0,0 +1,171 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+
+# === Scales (multiplier that converts a value into canonical units) ===
+# Canonical units: raw USD for money, plain fractions for rates.
+DOLLARS = 1.0
+THOUSANDS = 1e3
+MILLIONS = 1e6
+BILLIONS = 1e9
+FRACTION = 1.0
+PERCENT = 0.01  # percentage points → fraction
+
+DATA_FOLDER = "data"
+
+# === Comparable-analysis metric labels ===
+# Canonical column name → (label written by calculate_financial_metrics, scale of the stored value).
+COMPS_METRICS = {
+    "price": ("Price ($/share)", DOLLARS),
+    "market_cap": ("Market Cap ($)", DOLLARS),
+    "enterprise_value": ("Enterprise Value ($)", DOLLARS),
+    "sales": ("Sales ($)", DOLLARS),
+    "ebitda": ("EBITDA ($)", DOLLARS),
+    "ebit": ("EBIT ($)", DOLLARS),
+    "earnings": ("Earnings ($)", DOLLARS),
+}
+
+# Files written before the labels were fixed say "($M)" but hold raw FMP dollars.
+LEGACY_COMPS_LABELS = {
+    "market_cap": ("Market Cap ($M)", DOLLARS),
+    "enterprise_value": ("Enterprise Value ($M)", DOLLARS),
+    "sales": ("Sales ($M)", DOLLARS),
+    "ebitda": ("EBITDA ($M)", DOLLARS),
+    "ebit": ("EBIT ($M)", DOLLARS),
+    "earnings": ("Earnings ($M)", DOLLARS),
+}
+
+
+def to_float_array(values, scale=DOLLARS):
+    """
+    Parses provider values ("12345", "None", "$1,234", 12.5, None) into a float64
+    array in canonical units. Unparseable entries become NaN.
+
+    Parameters:
+    - values: Iterable of raw provider values
+    - scale: Scale the raw values are expressed in (e.g. MILLIONS, PERCENT)
+    """
+    text = pd.Series(list(values), dtype="object").astype(str)
+    text = text.str.replace(r"[,$%\s]", "", regex=True)
+    array = pd.to_numeric(text, errors="coerce").to_numpy(dtype=float)
+    if scale != 1.0:
+        array = array * scale
+    return array
+
+
+def rescale(values, from_scale, to_scale=DOLLARS):
+    """Converts an array (or scalar) between two scales in one vectorized operation."""
+    return np.asarray(values, dtype=float) * (from_scale / to_scale)
+
+
+def metric_value(metrics, name):
+    """Reads one canonical comps metric from a financial_metrics dict, accepting legacy labels."""
+    label, scale = COMPS_METRICS[name]
+    if label in metrics:
+        return to_float_array([metrics[label]], scale)[0]
+    legacy_label, legacy_scale = LEGACY_COMPS_LABELS.get(name, (None, None))
+    if legacy_label in metrics:
+        return to_float_array([metrics[legacy_label]], legacy_scale)[0]
+    return np.nan
+
+
+def comps_metrics_frame(comp_data, include_target=False):
+    """
+    Builds a DataFrame of peer metrics (one row per ticker) in canonical units from a
+    *_comparable_analysis.json payload. Each column is converted once, as a whole.
+    """
+    entries = {}
+    if include_target and "target" in comp_data:
+        target = comp_data["target"]
+        entries[target.get("ticker", "TARGET")] = target.get("financial_metrics", {})
+    for peer_ticker, peer in comp_data.get("peers", {}).items():
+        entries[peer_ticker] = peer.get("financial_metrics", {})
+
+    columns = {}
+    for name, (label, scale) in COMPS_METRICS.items():
+        legacy_label, legacy_scale = LEGACY_COMPS_LABELS.get(name, (label, scale))
+        current = to_float_array([m.get(label) for m in entries.values()], scale)
+        legacy = to_float_array([m.get(legacy_label) for m in entries.values()], legacy_scale)
+        columns[name] = np.where(np.isnan(current), legacy, current)
+
+    frame = pd.DataFrame(columns, index=pd.Index(list(entries), name="ticker"))
+    frame.attrs["units"] = {name: "USD" for name in COMPS_METRICS}
+    frame.attrs["units"]["price"] = "USD/share"
+    return frame
+
+
+def statement_frame(reports, fields, scale=DOLLARS):
+    """
+    Converts a list of Alpha Vantage statement reports into a float DataFrame indexed by
+    fiscalDateEnding (most recent first). "None" and missing values become NaN.
+    """
+    ordered = sorted(reports, key=lambda r: r.get("fiscalDateEnding", ""), reverse=True)
+    index = pd.Index([r.get("fiscalDateEnding") for r in ordered], name="fiscalDateEnding")
+    columns = {field: to_float_array([r.get(field) for r in ordered], scale) for field in fields}
+    return pd.DataFrame(columns, index=index)
+
+
+# === Fixture corpus ===
+def build_fixture_corpus(data_folder=DATA_FOLDER):
+    """
+    Builds a per-ticker corpus from the bundled data/ fixtures, putting the same
+    quantity from each provider side by side in canonical units:
+    Alpha Vantage overview/statements vs. the FMP figures stored in the comps file.
+    """
+    rows = []
+    for file_name in sorted(os.listdir(data_folder)):
+        if not file_name.endswith("_financials.json"):
+            continue
+        ticker = file_name.replace("_financials.json", "")
+        comp_path = os.path.join(data_folder, f"{ticker}_comparable_analysis.json")
+        if not os.path.exists(comp_path):
+            continue
+
+        with open(os.path.join(data_folder, file_name), "r") as f:
+            financials = json.load(f)
+        with open(comp_path, "r") as f:
+            comp_data = json.load(f)
+
+        overview = financials.get("overview", {})
+        income = statement_frame(
+            financials.get("income_statement", {}).get("annualReports", []),
+            ["totalRevenue", "ebitda", "netIncome"],
+        )
+        target_metrics = comp_data.get("target", {}).get("financial_metrics", {})
+
+        rows.append({
+            "ticker": ticker,
+            "av_market_cap": to_float_array([overview.get("MarketCapitalization")])[0],
+            "fmp_market_cap": metric_value(target_metrics, "market_cap"),
+            "av_sales": income["totalRevenue"].iloc[0] if len(income) else np.nan,
+            "fmp_sales": metric_value(target_metrics, "sales"),
+            "av_earnings": income["netIncome"].iloc[0] if len(income) else np.nan,
+            "fmp_earnings": metric_value(target_metrics, "earnings"),
+        })
+
+    return pd.DataFrame(rows).set_index("ticker") if rows else pd.DataFrame()
+
+
+def check_fixture_corpus(corpus, tolerance=10.0):
+    """
+    Returns the (ticker, metric, ratio) triples where two providers disagree by more
+    than `tolerance`× — a sign that one side is in the wrong scale.
+    """
+    problems = []
+    for metric in ["market_cap", "sales", "earnings"]:
+        ratio = (corpus[f"av_{metric}"] / corpus[f"fmp_{metric}"]).abs()
+        bad = ratio[(ratio > tolerance) | (ratio < 1 / tolerance)]
+        problems.extend((ticker, metric, value) for ticker, value in bad.items())
+    return problems
+
+
+if __name__ == "__main__":
+    corpus = build_fixture_corpus()
+    print(corpus)
+    problems = check_fixture_corpus(corpus)
+    if problems:
+        for ticker, metric, ratio in problems:
+            print(f"⚠️ {ticker} {metric}: providers differ by {ratio:,.1f}x")
+    else:
+        print("✅ All fixtures agree on units across providers.")
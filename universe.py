@@ -0,0 +1,120 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+from quote_service import get_quotes, quotes_version, repriced_market_cap
+
+DATA_FOLDER = "data"
+RESULTS_PATH = os.path.join(DATA_FOLDER, "batch_results.json")  # written by batch.save_results
+
+# Columns sent to the browser, in display order (lists such as peers/missing stay server-side)
+DISPLAY_COLUMNS = ["ticker", "name", "sector", "industry", "status", "price", "market_cap", "wacc",
+                   "dcf_price", "ev_ebitda_price", "pe_price", "dcf_upside"]
+SORT_COLUMNS = {
+    "DCF Upside": "dcf_upside",
+    "Market Cap": "market_cap",
+    "Price": "price",
+    "DCF Price": "dcf_price",
+    "WACC": "wacc",
+    "Ticker": "ticker",
+}
+
+# path → {"mtime", "quotes" (quotes file version), "frame", "orders": {(column, ascending): row order}}
+_universe_cache = {}
+
+
+def load_universe(path=RESULTS_PATH):
+    """
+    batch_results.json as a DataFrame, parsed once per file version and shared by every
+    session in the process. Returns an empty frame if the batch has not been run.
+    """
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=DISPLAY_COLUMNS)
+    mtime = os.stat(path).st_mtime_ns
+    data_folder = os.path.dirname(path) or "."
+    version = quotes_version(data_folder)
+    cached = _universe_cache.get(path)
+    if cached is None or cached["mtime"] != mtime or cached["quotes"] != version:
+        with open(path, "r", encoding="utf-8") as f:
+            frame = pd.DataFrame(json.load(f))
+        for column in DISPLAY_COLUMNS:
+            if column not in frame:
+                frame[column] = np.nan
+        numeric = [c for c in DISPLAY_COLUMNS if c not in ("ticker", "name", "sector", "industry", "status")]
+        frame[numeric] = frame[numeric].apply(pd.to_numeric, errors="coerce")
+        frame = apply_quotes(frame, get_quotes(data_folder=data_folder), since=mtime / 1e9)
+        cached = {"mtime": mtime, "quotes": version, "frame": frame.reset_index(drop=True), "orders": {}}
+        _universe_cache[path] = cached
+    return cached["frame"]
+
+
+def apply_quotes(frame, quotes, since=0.0):
+    """
+    Reprices universe rows from quote_service records fetched after `since` (epoch
+    seconds, the batch run): price, market cap and DCF upside. The DCF and multiples
+    prices themselves do not depend on the company's own share price.
+    """
+    fresh = {t: q for t, q in quotes.items() if q["fetched_at"] > since}
+    if not fresh or frame.empty:
+        return frame
+    prices = frame["ticker"].map(lambda t: fresh[t]["price"] if t in fresh else np.nan).to_numpy(dtype=float)
+    quoted = frame["ticker"].map(lambda t: fresh[t].get("market_cap", np.nan) if t in fresh else np.nan).to_numpy(dtype=float)
+    changed = np.isfinite(prices)
+    frame = frame.copy()
+    frame.loc[changed, "market_cap"] = repriced_market_cap(frame["market_cap"], frame["price"], prices, quoted)[changed]
+    frame.loc[changed, "price"] = prices[changed]
+    frame.loc[changed, "dcf_upside"] = frame.loc[changed, "dcf_price"] / prices[changed] - 1
+    return frame
+
+
+def _sort_order(path, frame, column, ascending):
+    """Row order for one sort key, computed once per results version (NaN last)."""
+    cached = _universe_cache.get(path)
+    key = (column, ascending)
+    if cached is not None and cached["frame"] is frame and key in cached["orders"]:
+        return cached["orders"][key]
+    values = frame[column]
+    order = values.sort_values(ascending=ascending, na_position="last", kind="stable").index.to_numpy()
+    if cached is not None and cached["frame"] is frame:
+        cached["orders"][key] = order
+    return order
+
+
+def query_universe(frame, search="", sectors=None, min_upside=None, sort_by="dcf_upside", ascending=False,
+                   page=1, page_size=50, path=RESULTS_PATH):
+    """
+    Server-side filter, sort and pagination over the universe. Only the requested page
+    is materialised, so what is rendered does not grow with the universe.
+
+    Parameters:
+    - search: Case-insensitive substring of ticker or name
+    - sectors: Sectors to keep (None / empty = all)
+    - min_upside: Minimum DCF upside as a fraction (None = no limit)
+    - sort_by, ascending: Column and direction; NaN values sort last
+    - page, page_size: 1-based page number and rows per page
+
+    Returns (page_frame, total_matches, page_count).
+    """
+    if frame.empty:
+        return frame[DISPLAY_COLUMNS] if set(DISPLAY_COLUMNS) <= set(frame) else frame, 0, 1
+
+    mask = np.ones(len(frame), dtype=bool)
+    if search:
+        mask &= (frame["ticker"].str.contains(search, case=False, regex=False, na=False)
+                 | frame["name"].astype(str).str.contains(search, case=False, regex=False, na=False)).to_numpy()
+    if sectors:
+        mask &= frame["sector"].isin(sectors).to_numpy()
+    if min_upside is not None:
+        mask &= (frame["dcf_upside"] >= min_upside).to_numpy()
+
+    order = _sort_order(path, frame, sort_by, ascending)
+    matches = order[mask[order]]
+    total = len(matches)
+    page_count = max(1, -(-total // page_size))
+    page = min(max(1, page), page_count)
+    visible = matches[(page - 1) * page_size: page * page_size]
+    return frame.iloc[visible][DISPLAY_COLUMNS], total, page_count
+
+
+def universe_sectors(frame):
+    return sorted(s for s in frame["sector"].dropna().unique() if s) if "sector" in frame else []
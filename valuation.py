@@ -0,0 +1,235 @@
+import numpy as np
+from units import statement_frame
+
+# === Model defaults (mirror the assumption cells of the DCF template) ===
+FORECAST_YEARS = 5
+HISTORY_YEARS = 4
+TERMINAL_GROWTH = 0.02      # DCF!F6 perpetuity growth rate
+GROWTH_STEP_DOWN = 0.01     # DCF!H12: growth fades 1pt per forecast year
+
+INCOME_FIELDS = ["totalRevenue", "costOfRevenue", "operatingExpenses", "depreciationAndAmortization",
+                 "ebit", "ebitda", "incomeBeforeTax", "incomeTaxExpense", "interestExpense", "netIncome"]
+BALANCE_FIELDS = ["shortTermDebt", "longTermDebt", "cashAndCashEquivalentsAtCarryingValue",
+                  "commonStockSharesOutstanding", "currentNetReceivables", "inventory",
+                  "otherCurrentAssets", "currentAccountsPayable", "otherCurrentLiabilities"]
+CASH_FLOW_FIELDS = ["capitalExpenditures", "depreciationDepletionAndAmortization"]
+
+
+def _history(frame, field, years):
+    """Last `years` values of a column, oldest first, NaN-padded on the left."""
+    values = frame[field].to_numpy(dtype=float)[:years][::-1] if field in frame else np.array([])
+    return np.concatenate([np.full(years - len(values), np.nan), values])
+
+
+def _zero_if_nan(values):
+    return np.where(np.isnan(values), 0.0, values)
+
+
+def extract_dcf_inputs(financials, years=HISTORY_YEARS, latest_fiscal_date=None):
+    """
+    Pulls the DCF inputs run_dcf_model writes to the template out of a *_financials.json
+    payload as float arrays (history oldest → latest, length `years`).
+
+    Parameters:
+    - financials: Parsed *_financials.json
+    - years: Number of historical fiscal years to keep
+    - latest_fiscal_date: Ignore reports ending after this "YYYY-MM-DD" (point-in-time use)
+    """
+    def reports(statement):
+        annual = financials.get(statement, {}).get("annualReports", [])
+        if latest_fiscal_date is not None:
+            annual = [r for r in annual if r.get("fiscalDateEnding", "") <= latest_fiscal_date]
+        return annual
+
+    income = statement_frame(reports("income_statement"), INCOME_FIELDS)
+    balance = statement_frame(reports("balance_sheet"), BALANCE_FIELDS)
+    cash_flow = statement_frame(reports("cash_flow"), CASH_FLOW_FIELDS)
+
+    owc = (_zero_if_nan(_history(balance, "currentNetReceivables", years))
+           + _zero_if_nan(_history(balance, "inventory", years))
+           + _zero_if_nan(_history(balance, "otherCurrentAssets", years))
+           - _zero_if_nan(_history(balance, "currentAccountsPayable", years))
+           - _zero_if_nan(_history(balance, "otherCurrentLiabilities", years)))
+    owc[np.isnan(_history(balance, "currentNetReceivables", years))] = np.nan
+
+    # The cash-flow add-back is complete; the income-statement D&A line is often partial
+    depreciation = _history(cash_flow, "depreciationDepletionAndAmortization", years)
+    depreciation = np.where(np.isnan(depreciation), _history(income, "depreciationAndAmortization", years), depreciation)
+
+    latest_income = income.iloc[0] if len(income) else None
+    latest_balance = balance.iloc[0] if len(balance) else None
+
+    tax_rate = np.nan
+    if latest_income is not None and latest_income["incomeBeforeTax"] > 0:
+        tax_rate = latest_income["incomeTaxExpense"] / latest_income["incomeBeforeTax"]
+    elif latest_income is not None and latest_income["incomeBeforeTax"] <= 0:
+        tax_rate = 0.0
+
+    def latest(field):
+        return float(latest_balance[field]) if latest_balance is not None else np.nan
+
+    # Cost of debt = interest expense / long-term debt, as in run_dcf_model
+    interest = float(latest_income["interestExpense"]) if latest_income is not None else np.nan
+    long_term_debt = latest("longTermDebt")
+    cost_of_debt = interest / long_term_debt if long_term_debt > 0 and not np.isnan(interest) else 0.0
+
+    return {
+        "fiscal_date": income.index[0] if len(income) else None,
+        "revenue": _history(income, "totalRevenue", years),
+        "cogs": _history(income, "costOfRevenue", years),
+        "opex": _history(income, "operatingExpenses", years),
+        "depreciation": depreciation,
+        "ebit": _history(income, "ebit", years),
+        "ebitda": _history(income, "ebitda", years),
+        "net_income": _history(income, "netIncome", years),
+        "interest_expense": _history(income, "interestExpense", years),
+        "capex": _history(cash_flow, "capitalExpenditures", years),
+        "owc": owc,
+        "tax_rate": tax_rate,
+        "cost_of_debt": cost_of_debt,
+        "total_debt": float(np.nansum([latest("shortTermDebt"), latest("longTermDebt")])),
+        "cash": latest("cashAndCashEquivalentsAtCarryingValue"),
+        "shares_outstanding": latest("commonStockSharesOutstanding"),
+    }
+
+
+def stack_inputs(inputs_list):
+    """Stacks a list of extract_dcf_inputs() dicts into one dict of (n, ...) arrays."""
+    keys = [k for k in inputs_list[0] if k != "fiscal_date"]
+    stacked = {k: np.array([inputs[k] for inputs in inputs_list], dtype=float) for k in keys}
+    stacked["fiscal_date"] = np.array([inputs["fiscal_date"] for inputs in inputs_list], dtype=object)
+    return stacked
+
+
+def _nanmean_rows(values):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        counts = np.sum(~np.isnan(values), axis=-1)
+        return np.where(counts > 0, np.nansum(values, axis=-1) / np.maximum(counts, 1), np.nan)
+
+
+def project_fcff(inputs, revenue_growth=None, ebit_margin=None, forecast_years=FORECAST_YEARS):
+    """
+    Forecast half of dcf_value(): drivers from history (or the overrides) and the
+    five-year FCFF projection. Returns a dict of (n,) drivers and (n, forecast_years)
+    forecasts; does not depend on the discount rate.
+    """
+    revenue = np.atleast_2d(inputs["revenue"])
+    ebit_history = np.atleast_2d(inputs["ebit"])
+    depreciation = np.atleast_2d(inputs["depreciation"])
+    capex = np.abs(np.atleast_2d(inputs["capex"]))
+    owc = np.atleast_2d(inputs["owc"])
+    tax_rate = np.nan_to_num(np.atleast_1d(inputs["tax_rate"]).astype(float), nan=0.0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        hist_growth = _nanmean_rows(revenue[:, 1:] / revenue[:, :-1] - 1)
+        margin = _nanmean_rows(ebit_history / revenue)
+        da_pct = _nanmean_rows(depreciation / revenue)
+        capex_pct = _nanmean_rows(capex[:, 1:] / revenue[:, 1:])
+        owc_pct = owc[:, -1] / revenue[:, -1]
+
+    if revenue_growth is not None:
+        hist_growth = np.broadcast_to(np.asarray(revenue_growth, dtype=float), hist_growth.shape)
+    if ebit_margin is not None:
+        margin = np.broadcast_to(np.asarray(ebit_margin, dtype=float), margin.shape)
+
+    da_pct = np.nan_to_num(da_pct, nan=0.0)
+    capex_pct = np.nan_to_num(capex_pct, nan=0.0)
+    owc_pct = np.nan_to_num(owc_pct, nan=0.0)
+
+    step = np.arange(forecast_years)
+    growth = hist_growth[:, None] - GROWTH_STEP_DOWN * step
+    forecast_revenue = revenue[:, -1:] * np.cumprod(1 + growth, axis=1)
+
+    ebit = forecast_revenue * margin[:, None]
+    ebitda = ebit + forecast_revenue * da_pct[:, None]
+    taxes = np.maximum(ebit, 0) * tax_rate[:, None]
+    forecast_capex = forecast_revenue * capex_pct[:, None]
+    forecast_owc = forecast_revenue * owc_pct[:, None]
+    previous_owc = np.concatenate([(revenue[:, -1] * owc_pct)[:, None], forecast_owc[:, :-1]], axis=1)
+    fcff = ebitda - taxes - forecast_capex - (forecast_owc - previous_owc)
+
+    return {
+        "revenue_growth": hist_growth,
+        "ebit_margin": margin,
+        "revenue": forecast_revenue,
+        "ebit": ebit,
+        "ebitda": ebitda,
+        "fcff": fcff,
+    }
+
+
+def discount_fcff(projection, inputs, wacc, terminal_growth=TERMINAL_GROWTH):
+    """
+    Valuation half of dcf_value(): discounts a project_fcff() forecast, adds the
+    mid-year-discounted Gordon terminal value and bridges EV to a price per share.
+    """
+    fcff = projection["fcff"]
+    forecast_years = fcff.shape[1]
+    wacc = np.broadcast_to(np.asarray(wacc, dtype=float), fcff.shape[:1])
+
+    periods = np.arange(1, forecast_years + 1)
+    discount = 1 / (1 + wacc[:, None]) ** periods
+    pv_fcff = np.sum(fcff * discount, axis=1)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        terminal_value = fcff[:, -1] * (1 + terminal_growth) / (wacc - terminal_growth)
+        pv_terminal = terminal_value / (1 + wacc) ** (forecast_years + 0.5)
+        enterprise_value = pv_fcff + pv_terminal
+        net_debt = np.nan_to_num(np.atleast_1d(inputs["total_debt"]).astype(float)) \
+            - np.nan_to_num(np.atleast_1d(inputs["cash"]).astype(float))
+        equity_value = enterprise_value - net_debt
+        price = equity_value / np.atleast_1d(inputs["shares_outstanding"]).astype(float)
+
+    return {
+        "fcff": fcff,
+        "pv_fcff": pv_fcff,
+        "terminal_value": terminal_value,
+        "enterprise_value": enterprise_value,
+        "equity_value": equity_value,
+        "price_per_share": price,
+    }
+
+
+def dcf_value(inputs, wacc, terminal_growth=TERMINAL_GROWTH, forecast_years=FORECAST_YEARS,
+              revenue_growth=None, ebit_margin=None):
+    """
+    Vectorized five-year FCFF DCF following the template's forecast logic:
+    revenue growth = historical average fading 1pt/yr, D&A and capex as % of sales,
+    OWC % of sales held flat, terminal value with the Gordon growth model discounted
+    at a mid-year period. Operating margin is held at its historical average (rather
+    than the template's COGS/OPEX lines, whose split varies between providers).
+
+    `inputs` holds arrays shaped (n, years) for histories and (n,) for scalars (see
+    stack_inputs); `wacc` and the optional overrides broadcast against n.
+    Returns a dict of (n,) arrays.
+    """
+    projection = project_fcff(inputs, revenue_growth, ebit_margin, forecast_years)
+    return discount_fcff(projection, inputs, wacc, terminal_growth)
+
+
+def peer_multiples(peer_frame):
+    """
+    EV/EBITDA, EV/Sales and P/E medians from a units.comps_metrics_frame() peer table
+    (the same multiples the CCA template takes the median of).
+    """
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ev_ebitda = peer_frame["enterprise_value"] / peer_frame["ebitda"]
+        ev_sales = peer_frame["enterprise_value"] / peer_frame["sales"]
+        pe = peer_frame["market_cap"] / peer_frame["earnings"]
+    return {
+        "ev_ebitda": float(np.nanmedian(ev_ebitda[ev_ebitda > 0])) if (ev_ebitda > 0).any() else np.nan,
+        "ev_sales": float(np.nanmedian(ev_sales[ev_sales > 0])) if (ev_sales > 0).any() else np.nan,
+        "pe": float(np.nanmedian(pe[pe > 0])) if (pe > 0).any() else np.nan,
+    }
+
+
+def multiples_value(ebitda, earnings, net_debt, shares, ev_ebitda, pe):
+    """
+    Implied share prices from peer multiples, vectorized over targets / dates:
+    EV/EBITDA route (EV → equity via net debt) and the template's P/E route.
+    """
+    ebitda, earnings, net_debt, shares = (np.asarray(x, dtype=float) for x in (ebitda, earnings, net_debt, shares))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ev_ebitda_price = (np.asarray(ev_ebitda, dtype=float) * ebitda - net_debt) / shares
+        pe_price = np.asarray(pe, dtype=float) * earnings / shares
+    return {"ev_ebitda_price": ev_ebitda_price, "pe_price": pe_price}
@@ -0,0 +1,159 @@
+import hashlib
+import warnings
+import numpy as np
+import pandas as pd
+from units import comps_metrics_frame, to_float_array
+from assumptions import load_assumptions
+
+# Market assumptions (risk-free rate, ERP, marginal tax rate, size premium) live in the
+# dated assumptions/ tables; see assumptions.py
+
+# (peer-set hash, marginal tax rate) → summary statistics of the set (see peer_set_stats)
+_peer_stats_cache = {}
+
+
+def peer_table(comp_data):
+    """
+    Peer inputs for beta unlevering from a *_comparable_analysis.json payload, one row
+    per peer: levered beta, market value of debt and equity (raw $), effective tax rate.
+    Debt is EV − market cap, the same simplification run_dcf_model uses.
+    """
+    metrics = comps_metrics_frame(comp_data)
+    peers = comp_data.get("peers", {})
+    tickers = list(metrics.index)
+    income = [peers[t].get("financials", {}).get("income_statement", {}) for t in tickers]
+
+    metrics["beta"] = to_float_array([peers[t].get("overview", {}).get("beta") for t in tickers])
+    metrics["pretax_income"] = to_float_array([i.get("incomeBeforeTax") for i in income])
+    metrics["tax_expense"] = to_float_array([i.get("incomeTaxExpense") for i in income])
+    return peer_table_from_frame(metrics)
+
+
+def peer_table_from_frame(frame):
+    """
+    peer_table() from an already projected peer frame (comps_store.peer_frame or
+    comps_metrics_frame plus beta / pretax_income / tax_expense columns).
+    """
+    pretax = frame["pretax_income"].to_numpy(dtype=float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        tax_rate = np.where(pretax > 0, frame["tax_expense"].to_numpy(dtype=float) / pretax, np.nan)
+
+    return pd.DataFrame({
+        "beta": frame["beta"].to_numpy(dtype=float),
+        "debt": frame["enterprise_value"].to_numpy(dtype=float) - frame["market_cap"].to_numpy(dtype=float),
+        "equity": frame["market_cap"].to_numpy(dtype=float),
+        "tax_rate": tax_rate,
+    }, index=pd.Index(list(frame.index), name="ticker"))
+
+
+def with_betas(table, betas):
+    """peer_table() with levered betas replaced wherever `betas` (ticker → β) has a value."""
+    override = pd.Series(betas, dtype=float).reindex(table.index)
+    return table.assign(beta=override.fillna(table["beta"]))
+
+
+def unlever_beta(beta, debt_to_equity, tax_rate):
+    """Hamada: βu = βl / (1 + (1 − t) · D/E). Vectorized."""
+    return np.asarray(beta, dtype=float) / (1 + (1 - np.asarray(tax_rate, dtype=float)) * np.asarray(debt_to_equity, dtype=float))
+
+
+def relever_beta(unlevered_beta, debt_to_equity, tax_rate):
+    """Hamada: βl = βu · (1 + (1 − t) · D/E). Vectorized."""
+    return np.asarray(unlevered_beta, dtype=float) * (1 + (1 - np.asarray(tax_rate, dtype=float)) * np.asarray(debt_to_equity, dtype=float))
+
+
+def _padded(peer_tables, column):
+    """Stacks one column of several peer tables into a NaN-padded (targets × max_peers) array."""
+    width = max((len(t) for t in peer_tables), default=0)
+    out = np.full((len(peer_tables), width), np.nan)
+    for i, table in enumerate(peer_tables):
+        out[i, :len(table)] = table[column].to_numpy(dtype=float)
+    return out
+
+
+def peer_set_key(table):
+    """Stable hash of a peer set and its inputs; identical peer sets share cached stats."""
+    ordered = table.sort_index()
+    digest = hashlib.sha1("|".join(ordered.index).encode())
+    digest.update(np.round(ordered.to_numpy(dtype=float), 6).tobytes())
+    return digest.hexdigest()
+
+
+def peer_set_stats(peer_tables, marginal_tax_rate=None):
+    """
+    Unlevered-beta statistics for many peer sets at once, as (n,) arrays:
+    median/mean unlevered beta, mean D/E and mean E/(D+E) (the template's rows 36–37).
+    Peers without an effective tax rate use `marginal_tax_rate` (default: latest assumptions).
+    Each distinct peer set is computed once per tax rate; repeats are served from the cache.
+    """
+    if marginal_tax_rate is None:
+        marginal_tax_rate = load_assumptions()["marginal_tax_rate"]
+    keys = [(peer_set_key(table), marginal_tax_rate) for table in peer_tables]
+    todo = list(dict.fromkeys(k for k in keys if k not in _peer_stats_cache))
+
+    if todo:
+        first = {}
+        for table, key in zip(peer_tables, keys):
+            first.setdefault(key, table)
+        tables = [first[k] for k in todo]
+        beta = _padded(tables, "beta")
+        debt = _padded(tables, "debt")
+        equity = _padded(tables, "equity")
+        tax = _padded(tables, "tax_rate")
+        tax = np.where(np.isnan(tax) & ~np.isnan(beta), marginal_tax_rate, np.clip(tax, 0, 1))
+
+        with np.errstate(invalid="ignore", divide="ignore"), warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # empty peer sets → NaN
+            debt_to_equity = np.maximum(debt, 0) / equity
+            equity_weight = equity / (np.maximum(debt, 0) + equity)
+            unlevered = unlever_beta(beta, debt_to_equity, tax)
+            stats = {
+                "median_unlevered_beta": np.nanmedian(unlevered, axis=1),
+                "mean_unlevered_beta": np.nanmean(unlevered, axis=1),
+                "mean_debt_to_equity": np.nanmean(debt_to_equity, axis=1),
+                "mean_equity_weight": np.nanmean(equity_weight, axis=1),
+                "peer_count": np.sum(~np.isnan(unlevered), axis=1),
+            }
+        for i, key in enumerate(todo):
+            _peer_stats_cache[key] = {name: values[i] for name, values in stats.items()}
+
+    return {name: np.array([_peer_stats_cache[k][name] for k in keys], dtype=float)
+            for name in ["median_unlevered_beta", "mean_unlevered_beta", "mean_debt_to_equity",
+                         "mean_equity_weight", "peer_count"]}
+
+
+def batch_wacc(peer_tables, target_tax_rate, cost_of_debt, size_premium=0.0, assumptions=None):
+    """
+    WACC for many targets in one set of array operations, following the template:
+    relevered β = mean βu × (1 + (1 − t) × mean D/E), Re = rf + β × ERP + size premium,
+    WACC = Rd (1 − t) × D/V + Re × E/V with E/V = the peers' mean equity weight.
+
+    Parameters:
+    - peer_tables: One peer_table() per target (any number of peers each)
+    - target_tax_rate, cost_of_debt, size_premium: Scalars or (n,) arrays, as fractions
+      (see assumptions.size_premium for the market-cap lookup)
+    - assumptions: A load_assumptions() table (default: latest)
+    """
+    assumptions = assumptions or load_assumptions()
+    risk_free_rate = assumptions["risk_free_rate"]
+    equity_risk_premium = assumptions["equity_risk_premium"]
+    stats = peer_set_stats(peer_tables, assumptions["marginal_tax_rate"])
+    n = len(peer_tables)
+    tax = np.nan_to_num(np.broadcast_to(np.asarray(target_tax_rate, dtype=float), (n,)), nan=0.0)
+    cost_of_debt = np.nan_to_num(np.broadcast_to(np.asarray(cost_of_debt, dtype=float), (n,)), nan=0.0)
+    size_premium = np.broadcast_to(np.asarray(size_premium, dtype=float), (n,))
+
+    relevered = relever_beta(stats["mean_unlevered_beta"], stats["mean_debt_to_equity"], tax)
+    cost_of_equity = risk_free_rate + relevered * equity_risk_premium + size_premium
+    equity_weight = np.clip(np.nan_to_num(stats["mean_equity_weight"], nan=1.0), 0, 1)
+    after_tax_cost_of_debt = cost_of_debt * (1 - tax)
+    wacc = after_tax_cost_of_debt * (1 - equity_weight) + cost_of_equity * equity_weight
+
+    return {**stats, "relevered_beta": relevered, "cost_of_equity": cost_of_equity,
+            "after_tax_cost_of_debt": after_tax_cost_of_debt, "equity_weight": equity_weight, "wacc": wacc}
+
+
+def compute_wacc(comp_data, target_tax_rate, cost_of_debt, size_premium=0.0, assumptions=None):
+    """Single-target convenience wrapper around batch_wacc; returns plain floats."""
+    result = batch_wacc([peer_table(comp_data)], target_tax_rate, cost_of_debt, size_premium, assumptions)
+    return {name: float(values[0]) for name, values in result.items()}